@@ -5,11 +5,13 @@ from rllab.sampler.base import BaseSampler
 import rllab.misc.logger as logger
 import rllab.plotter as plotter
 from rllab.policies.base import Policy
+from rllab.misc import background_diagnostics
+from rllab.misc import compile_cache
 from rllab.misc import ext
 import numpy as np
 from sandbox.snn4hrl.envs.mujoco.ant_env import AntEnv
 from sandbox.snn4hrl.sampler.low_sampler import LowSampler
-from sandbox.snn4hrl.sampler.utils import process_path
+from sandbox.snn4hrl.sampler.utils import process_path, low_level_paths
 #import psutil
 import os
 import pickle
@@ -25,6 +27,14 @@ class BatchSampler(BaseSampler):
         :type algo: BatchPolopt
         """
         self.algo = algo
+        # (itr, policy version, AsyncSamplePaths) of the paths collected in the background
+        self._pending = None
+
+    def __getstate__(self):
+        # saved with the algo in the snapshots, without the paths being collected
+        d = dict(self.__dict__)
+        d["_pending"] = None
+        return d
 
     def start_worker(self):
         try:
@@ -33,34 +43,76 @@ class BatchSampler(BaseSampler):
             parallel_sampler.populate_task(self.algo.env, self.algo.policy)
 
     def shutdown_worker(self):
+        if self._pending is not None:
+            self._pending[2].result()
+            self._pending = None
         parallel_sampler.terminate_task(scope=self.algo.scope)
 
-    def obtain_samples(self, itr):
-        # print("obtain samples in batch_polopt")
-        cur_params = self.algo.policy.get_param_values()  # a list of numbers
+    def _sample_args(self):
+        """
+        :return: args of parallel_sampler.sample_paths, with the current params of the policies and sizes of the batch
+        """
+        args = dict(
+            policy_params=self.algo.policy.get_param_values(),  # a list of numbers
+            max_samples=self.algo.batch_size,
+            max_path_length=self.algo.max_path_length,
+            scope=self.algo.scope,
+        )
+        lockstep_envs = getattr(self.algo, "lockstep_envs", 1)  # not set in the algos pickled before it existed
+        if lockstep_envs > 1:
+            args["n_lockstep_envs"] = lockstep_envs
         try:
             cur_low_params = self.algo.low_policy.get_param_values()
             # env_params = cur_low_params if self.algo.train_low else None # need to reset low policy only when training low!
-            paths = parallel_sampler.sample_paths(
-                policy_params=cur_params,
+            if self.algo.train_low_with_v_gradient:  # the workers need the algo (and its current baseline) in the env
+                env_params = [self.algo.env.time_steps_agg, self.algo]
+            else:  # plain numbers go through the shared param channel, without pickling the algo for every worker
+                env_params = np.array([self.algo.env.time_steps_agg])
+            args.update(
                 low_policy_params=cur_low_params,  # low policy params as env params!
-                env_params=[self.algo.env.time_steps_agg, self.algo],  # the parameters to recover for env!
-                max_samples=self.algo.batch_size,
-                max_path_length=self.algo.max_path_length,
-                scope=self.algo.scope,
+                env_params=env_params,  # the parameters to recover for env!
             )
         except AttributeError:
-            paths = parallel_sampler.sample_paths(
-                policy_params=cur_params,
-                max_samples=self.algo.batch_size,
-                max_path_length=self.algo.max_path_length,
-                scope=self.algo.scope,
-            )
-        if self.algo.whole_paths:  # this line is run (whole path)
-            return paths
+            pass
+        return args
+
+    def start_obtain_samples(self, itr):
+        """
+        Start collecting the paths of iteration itr in the background, with the current params of the policies
+        (obtain_samples(itr) returns them). Not done if the workers would need objects that change until then (the
+        algo, with train_low_with_v_gradient): obtain_samples collects them itself.
+        """
+        args = self._sample_args()
+        if not isinstance(args.get("env_params"), (type(None), np.ndarray)):
+            logger.log("The env params cannot be sent in the background: sampling synchronously")
+            return
+        self._pending = (itr, self.algo.policy_version,
+                         parallel_sampler.AsyncSamplePaths(sample_fn=self.sample_paths, **args))
+
+    def sample_paths(self, show_prog_bar=True, **kwargs):
+        """
+        Collect the paths with the workers (the subclasses collecting them differently override this and _sample_args)
+        :param kwargs: _sample_args
+        """
+        return parallel_sampler.sample_paths(show_prog_bar=show_prog_bar, **kwargs)
+
+    def obtain_samples(self, itr):
+        # print("obtain samples in batch_polopt")
+        pending, self._pending = self._pending, None
+        if pending is not None and pending[0] == itr:
+            _, policy_version, async_paths = pending
+            paths = async_paths.result()
         else:
-            paths_truncated = parallel_sampler.truncate_paths(paths, self.algo.batch_size)
-            return paths_truncated
+            if pending is not None:  # not the paths of this iteration
+                pending[2].result()
+            policy_version = self.algo.policy_version
+            paths = self.sample_paths(**self._sample_args())
+        if not self.algo.whole_paths:
+            paths = parallel_sampler.truncate_paths(paths, self.algo.batch_size)
+        # the version of the params of the policies the paths were collected with
+        for path in paths:
+            path["policy_version"] = policy_version
+        return paths
 
 
 class BatchPolopt(RLAlgorithm):
@@ -108,6 +160,10 @@ class BatchPolopt(RLAlgorithm):
             transfer_high=False,
             itr_delay=0,
             warm_path=None,
+            async_sampling=False,
+            diagnostics_in_background=False,
+            diagnostics_plot_every=1,
+            lockstep_envs=1,
             **kwargs
     ):
         """
@@ -129,6 +185,17 @@ class BatchPolopt(RLAlgorithm):
         :param positive_adv: Whether to shift the advantages so that they are always positive. When used in
         conjunction with center_adv the advantages will be standardized before shifting.
         :param store_paths: Whether to save all paths data to the snapshot.
+        :param async_sampling: Whether to collect the paths of the next iteration while optimizing with the ones of
+        the current iteration (with several workers only). The paths are then collected with the policies of the
+        previous iteration, which is corrected by importance sampling.
+        :param diagnostics_in_background: Whether to compute the diagnostics that support it (e.g. the visitation
+        plots) in a separate process, during the optimization. Their tabular stats still land in the row of their
+        iteration.
+        :param diagnostics_plot_every: With diagnostics_in_background, draw the diagnostic plots every that many
+        iterations only.
+        :param lockstep_envs: If more than 1, every sampler worker collects that many paths at once, stepping copies of
+        its env in lockstep, with one call of the policy per step for all of them (and, for a HierarchizedSnnEnv, one
+        call of the low-level policy per low-level step).
         """
         self.env = env
         self.policy = policy
@@ -167,7 +234,9 @@ class BatchPolopt(RLAlgorithm):
         self.train_low_with_external = train_low_with_external
         if self.train_low:
             self.low_policy = self.env.low_policy
-            self.low_sampler = LowSampler() # WHAT IS THE USE OF THIS? process low samples
+            self.low_sampler = LowSampler(  # WHAT IS THE USE OF THIS? process low samples
+                self.low_policy, baseline_name=baselinename,
+                baseline_forget_factor=getattr(baseline, 'forget_factor', 0.))
             self.low_sampler.discount = self.discount_low
             self.env.wrapped_env.wrapped_env.set_algo(self)  # add the algorithm to the inner env!
         self.step_anneal = time_step_agg_anneal # specify if the number of low steps in a single high step anneals!
@@ -178,6 +247,13 @@ class BatchPolopt(RLAlgorithm):
         self.transfer = transfer
         self.transfer_high = transfer_high
         self.warm_path = warm_path
+        self.async_sampling = async_sampling
+        self.diagnostics_in_background = diagnostics_in_background
+        self.diagnostics_plot_every = diagnostics_plot_every
+        self.lockstep_envs = lockstep_envs
+        # number of the iteration whose updates the current params of the policies follow (see the policy_version
+        # of the paths)
+        self.policy_version = start_itr
         global opt_algorithm
         opt_algorithm = self
 
@@ -193,11 +269,14 @@ class BatchPolopt(RLAlgorithm):
 
     def start_worker(self):
         self.sampler.start_worker()
+        if self.diagnostics_in_background:
+            background_diagnostics.init_worker(plot_every=self.diagnostics_plot_every)
         if self.plot:
             plotter.init_plot(self.env, self.policy)
 
     def shutdown_worker(self):
         self.sampler.shutdown_worker()
+        background_diagnostics.shutdown_worker()
 
     def test(self, dir): # Rui: just run and render
         self.start_worker()
@@ -221,7 +300,7 @@ class BatchPolopt(RLAlgorithm):
             distance_record = np.concatenate(distance_record)
             pos = np.concatenate(pos)
             # print("distance_record", distance_record)
-            high_baselines = [self.baseline.predict(path) for path in paths]
+            high_baselines = self.baseline.predict_n(paths)
             high_baselines = np.concatenate(high_baselines)
             # print("high_baselines", high_baselines)
             with open(dir + "high_values.pkl", 'wb') as f:
@@ -235,6 +314,7 @@ class BatchPolopt(RLAlgorithm):
             self.env.log_diagnostics(paths)
             self.policy.log_diagnostics(paths)
             self.baseline.log_diagnostics(paths)
+            background_diagnostics.collect()
             logger.dump_tabular(with_prefix=False)
             self.shutdown_worker()
 
@@ -258,6 +338,47 @@ class BatchPolopt(RLAlgorithm):
         del warm_params
         del data
 
+    def start_next_samples(self, itr):
+        """
+        Start collecting the paths of iteration itr in the background, with the current params of the policies (the
+        ones before the updates of this iteration), if there are several workers to do it. Only for the samplers
+        whose obtain_samples is the one of BatchSampler, which takes the paths collected in the background
+        """
+        if parallel_sampler.singleton_pool.n_parallel <= 1 or not isinstance(self.sampler, BatchSampler):
+            return
+        if type(self.sampler).obtain_samples is not BatchSampler.obtain_samples:
+            logger.log("%s collects its paths itself: sampling synchronously" % type(self.sampler).__name__)
+            return
+        if self.step_anneal:
+            self.anneal_step_num(itr)  # the lengths of the paths of that iteration
+        self.sampler.start_obtain_samples(itr)
+        if self.step_anneal:
+            self.anneal_step_num(itr - 1)
+
+    def correct_stale_samples(self, samples_data, policy, policy_version):
+        """
+        Importance sampling of samples collected with older params of the policy than the current ones (see
+        async_sampling): the advantages are weighted by the likelihood ratios of the actions under the current and the
+        old policy, and the old dist infos (the reference of the surrogate loss and of the KL constraint) are replaced
+        by the ones of the current policy.
+        :param policy_version: policy_version of the paths of the samples
+        :return: the importance weights, already applied to the advantages (ones if the samples are not stale)
+        """
+        if policy_version == self.policy_version:
+            return np.ones_like(samples_data["advantages"])
+        assert not policy.recurrent
+        dist = policy.distribution
+        actions = samples_data["actions"]
+        agent_infos = samples_data["agent_infos"]
+        cur_dist_info = policy.dist_info(samples_data["observations"], agent_infos)
+        weights = np.exp(dist.log_likelihood(actions, cur_dist_info) - dist.log_likelihood(actions, agent_infos))
+        logger.log("importance weights of the samples of version %d: mean %.3f, max %.3f" %
+                   (policy_version, np.mean(weights), np.max(weights)))
+        samples_data["advantages"] = samples_data["advantages"] * weights
+        for k in dist.dist_info_keys:
+            agent_infos[k] = cur_dist_info[k]
+        return weights
+
     def train(self):
         self.start_worker()
         self.init_opt()
@@ -274,11 +395,23 @@ class BatchPolopt(RLAlgorithm):
                 self.warm_start()
 
             with logger.prefix('itr #%d | ' % itr):
+                self.policy_version = itr
+                background_diagnostics.set_iteration(itr)
                 if self.step_anneal:
                     self.anneal_step_num(itr) # update the step length
                 paths = self.sampler.obtain_samples(itr)
+                paths_version = paths[0].get("policy_version", itr) if paths else itr
+                if itr == start_i:
+                    # before the workers start collecting the paths of the next iteration
+                    worker_compile_stats = parallel_sampler.worker_compile_stats()
+                if self.async_sampling:
+                    logger.record_tabular('PolicyVersionLag', itr - paths_version)
+                    if itr + 1 < self.n_itr:
+                        self.start_next_samples(itr + 1)
                 self.discount = self.discount_high # change discount every time we train high-level policy!
                 samples_data = self.sampler.process_samples(itr, paths)
+                samples_data["importance_weights"] = self.correct_stale_samples(
+                    samples_data, self.policy, paths_version)
                 self.log_diagnostics(paths)
 
                 if self.train_high == True: # train the high level policy
@@ -324,93 +457,52 @@ class BatchPolopt(RLAlgorithm):
 
                 elif self.train_low_with_external:
                     print("training low policy with external rewards only")
-                    paths_low = []
-                    for idx, path in enumerate(paths):
-                        last_low_step_num = len(path["env_infos"]["full_path"]["rewards"][-1])
-
-                        path_low = dict(
-                            observations=np.concatenate(path['env_infos']["full_path"]["observations"]),
-                            actions=np.concatenate(path['env_infos']["full_path"]["actions"]),
-                            rewards=np.concatenate(path['env_infos']["full_path"]["rewards"]),
-                        )
-
-                        # WR: trim the observation
-                        path_low['observations'] = path_low['observations'][:, :self.low_policy.obs_robot_dim]
-                        agent_info_low = dict()
-                        for key in path['env_infos']["full_path"]['agent_infos']:
-                            agent_info_low[key] = np.concatenate(path['env_infos']["full_path"]['agent_infos'][key])
-                        path_low["agent_infos"] = agent_info_low
-                        env_info_low = dict()
-                        for key in path['env_infos']["full_path"]['env_infos']:
-                            # print(key, path)
-                            env_info_low[key] = np.concatenate(path['env_infos']["full_path"]["env_infos"][key])
-                        path_low["env_infos"] = env_info_low
-
-                        paths_low.append(path_low)
+                    paths_low = low_level_paths(paths, self.low_policy.obs_robot_dim)
                     real_samples = ext.extract_dict(
                         self.low_sampler.process_samples(itr, paths_low),
                         # I don't need to process the hallucinated samples: the R, A,.. same!
                         "observations", "actions", "advantages", "env_infos", "agent_infos"
                     )
-                    real_samples["importance_weights"] = np.ones_like(real_samples["advantages"])
+                    real_samples["importance_weights"] = self.correct_stale_samples(
+                        real_samples, self.low_policy, paths_version)
                     self.optimize_policy_low(itr, real_samples)
 
                 elif self.train_low_with_v_split:
                     print("training low policy with HAAR")
                     # self.discount = self.discount_low
-                    paths_low = []
-                    for idx, path in enumerate(paths):
-                        last_low_step_num = len(path["env_infos"]["full_path"]["rewards"][-1])
-                        V_high = self.baseline.predict(path)
-                        diff_V = np.diff(V_high)/self.env.time_steps_agg # here we are neglecting gamma in the definition
-                        # of Advantage (gamma is close to 1), making the expression essentially the difference in V.
-                        # Using the precise definition of A will yield very similar learning curves and does not affect
-                        # the outcome of experiments.
-
-                        for i in range(len(diff_V)):
-                            # path["env_infos"]["full_path"]["rewards"][i] \
-                            #     += np.ones(len(path["env_infos"]["full_path"]["rewards"][i]))*diff_V[i]
-                            path["env_infos"]["full_path"]["rewards"][i] \
-                                = np.ones(len(path["env_infos"]["full_path"]["rewards"][i])) * diff_V[i]
-
-                        path_low = dict(
-                            observations=np.concatenate(path['env_infos']["full_path"]["observations"]),
-                            actions=np.concatenate(path['env_infos']["full_path"]["actions"]),
-                            rewards=np.concatenate(path['env_infos']["full_path"]["rewards"]),
-                        )
-
-
+                    diff_Vs = []
+                    for V_high in self.baseline.predict_n(paths):
+                        diff_Vs.append(np.diff(V_high)/self.env.time_steps_agg) # here we are neglecting gamma in the
+                        # definition of Advantage (gamma is close to 1), making the expression essentially the
+                        # difference in V. Using the precise definition of A will yield very similar learning curves
+                        # and does not affect the outcome of experiments.
+                    if hasattr(self.baseline, 'clear_features'):
+                        self.baseline.clear_features(paths)
+                    # every low-level step of the i-th high-level step is rewarded with diff_V[i]
+                    paths_low = low_level_paths(paths, self.low_policy.obs_robot_dim, high_step_rewards=diff_Vs)
+                    for path, path_low in zip(paths, paths_low):
                         # cancel the winning rewards for low level!
                         if np.sum(path['env_infos']["full_path"]['env_infos'][
                                       'inner_rew']) == 1:  # the episode was successful
                             # the last step should minus the reward of reaching the goal (outer reward)
                             path_low['rewards'][-1] -= self.env.wrapped_env.wrapped_env.goal_rew
-
-                        # WR: trim the observation
-                        path_low['observations'] = path_low['observations'][:, :self.low_policy.obs_robot_dim]
-                        agent_info_low = dict()
-                        for key in path['env_infos']["full_path"]['agent_infos']:
-                            agent_info_low[key] = np.concatenate(path['env_infos']["full_path"]['agent_infos'][key])
-                        path_low["agent_infos"] = agent_info_low
-                        env_info_low = dict()
-                        for key in path['env_infos']["full_path"]['env_infos']:
-                            # print(key, path)
-                            env_info_low[key] = np.concatenate(path['env_infos']["full_path"]["env_infos"][key])
-                        path_low["env_infos"] = env_info_low
-
-                        paths_low.append(path_low)
                     real_samples = ext.extract_dict(
                         self.low_sampler.process_samples(itr, paths_low),
                         # I don't need to process the hallucinated samples: the R, A,.. same!
                         "observations", "actions", "advantages", "env_infos", "agent_infos"
                     )
-                    real_samples["importance_weights"] = np.ones_like(real_samples["advantages"])
+                    real_samples["importance_weights"] = self.correct_stale_samples(
+                        real_samples, self.low_policy, paths_version)
                     self.optimize_policy_low(itr, real_samples)
 
 
                 else:
                     print('ERROR! Unknown training mode. See batch_polopt.py for details.')
 
+                if itr == start_i:
+                    # all the functions are compiled by now, including the lazy ones of the optimizers
+                    compile_cache.log_compile_stats(worker_compile_stats)
+
                 logger.log("saving snapshot...")
                 params = self.get_itr_snapshot(itr, samples_data)
                 self.current_itr = itr + 1
@@ -423,6 +515,7 @@ class BatchPolopt(RLAlgorithm):
                     params["paths"] = samples_data["paths"]
                 logger.save_itr_params(itr, params)
                 logger.log("saved")
+                background_diagnostics.collect()
                 logger.dump_tabular(with_prefix=False)
                 # to prevent memory leakage
                 # info = psutil.virtual_memory()
@@ -265,7 +265,7 @@ class NPO(BatchPolopt):
         mean_kl_before = self.optimizer_low.constraint_val(all_input_values)
         logger.record_tabular('MeanKL_Before_low', mean_kl_before)
 
-        with logger.prefix(' Low_PolicyOptimize | '):
+        with logger.prefix(' Low_PolicyOptimize | '), logger.tabular_prefix('Low_'):
             self.optimizer_low.optimize(all_input_values)
 
         mean_kl = self.optimizer_low.constraint_val(all_input_values)
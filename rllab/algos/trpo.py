@@ -13,10 +13,17 @@ class TRPO(NPO):
             optimizer=None,
             optimizer_args=None,
             optimizer_low=None,
+            optimizer_low_args=None,
             **kwargs):
+        """
+        :param optimizer_low_args: args of the optimizer of the low policy (default: optimizer_args), e.g. to adapt
+        its subsampling and slicing to the size of the low-level batch
+        """
         if optimizer is None:
             if optimizer_args is None:
                 optimizer_args = dict()
+            if optimizer_low_args is None:
+                optimizer_low_args = optimizer_args
             optimizer = ConjugateGradientOptimizer(**optimizer_args)
-            optimizer_low = ConjugateGradientOptimizer(**optimizer_args)
+            optimizer_low = ConjugateGradientOptimizer(**optimizer_low_args)
         super(TRPO, self).__init__(optimizer=optimizer,optimizer_low=optimizer_low, **kwargs)
@@ -1,3 +1,5 @@
+import numpy as np
+
 from rllab.misc import autoargs
 
 
@@ -22,6 +24,20 @@ class Baseline(object):
     def predict(self, path):
         raise NotImplementedError
 
+    def predict_n(self, paths):
+        """
+        Predict the values of all the paths at once
+        :return: list of the predictions of the paths
+        """
+        return [self.predict(path) for path in paths]
+
+    def predict_observations(self, observations):
+        """
+        Predict the value of every observation as the first step of its own path (e.g. the observations after
+        virtual steps)
+        """
+        return np.array([self.predict(dict(observations=[obs], rewards=[0]))[0] for obs in observations])
+
     @classmethod
     @autoargs.add_args
     def add_args(cls, parser):
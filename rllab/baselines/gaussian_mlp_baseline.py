@@ -3,6 +3,7 @@ import numpy as np
 from rllab.core.serializable import Serializable
 from rllab.core.parameterized import Parameterized
 from rllab.baselines.base import Baseline
+from rllab.misc import tensor_utils
 from rllab.misc.overrides import overrides
 from rllab.regressors.gaussian_mlp_regressor import GaussianMLPRegressor
 
@@ -38,6 +39,17 @@ class GaussianMLPBaseline(Baseline, Parameterized):
     def predict(self, path):
         return self._regressor.predict(path["observations"]).flatten()
 
+    @overrides
+    def predict_n(self, paths):
+        # a single forward pass of the regressor on all the observations
+        observations = tensor_utils.concat_tensor_list([p["observations"] for p in paths])
+        return tensor_utils.split_tensor_list(self._regressor.predict(observations).flatten(),
+                                              [len(p["observations"]) for p in paths])
+
+    @overrides
+    def predict_observations(self, observations):
+        return self._regressor.predict(observations).flatten()
+
     @overrides
     def get_param_values(self, **tags):
         return self._regressor.get_param_values(**tags)
@@ -1,4 +1,5 @@
 from rllab.baselines.base import Baseline
+from rllab.misc import tensor_utils
 from rllab.misc.overrides import overrides
 import numpy as np
 
@@ -25,6 +26,16 @@ class LinearFeatureBaseline(Baseline):
         # print("al", al.shape)
         return np.concatenate([o, o ** 2, al, al ** 2, al ** 3, np.ones((l, 1))], axis=1)
 
+    def _features_n(self, paths):
+        """
+        :return: features of all the paths, concatenated (the same as the ones of _features path by path), and the
+        lengths of the paths
+        """
+        lengths = [len(path["rewards"]) for path in paths]
+        o = np.clip(tensor_utils.concat_tensor_list([path["observations"] for path in paths]), -10, 10)
+        al = np.concatenate([np.arange(l) for l in lengths]).reshape(-1, 1) / 100.0
+        return np.concatenate([o, o ** 2, al, al ** 2, al ** 3, np.ones((len(al), 1))], axis=1), lengths
+
     @overrides
     def fit(self, paths):
         featmat = np.concatenate([self._features(path) for path in paths])
@@ -47,3 +58,19 @@ class LinearFeatureBaseline(Baseline):
         # print("features", self._features(path).shape)
         # print("coeff", self._coeffs.shape)
         return self._features(path).dot(self._coeffs)
+
+    @overrides
+    def predict_n(self, paths):
+        if self._coeffs is None:
+            return [np.zeros(len(path["rewards"])) for path in paths]
+        featmat, lengths = self._features_n(paths)
+        return tensor_utils.split_tensor_list(featmat.dot(self._coeffs), lengths)
+
+    @overrides
+    def predict_observations(self, observations):
+        if self._coeffs is None:
+            return np.zeros(len(observations))
+        # one-step paths: all the time features are the ones of time 0
+        o = np.clip(observations, -10, 10)
+        l = len(observations)
+        return np.concatenate([o, o ** 2, np.zeros((l, 3)), np.ones((l, 1))], axis=1).dot(self._coeffs)
@@ -0,0 +1,105 @@
+import numpy as np
+import scipy.linalg
+
+from rllab.baselines.linear_feature_baseline import LinearFeatureBaseline
+from rllab.misc import tensor_utils
+from rllab.misc.overrides import overrides
+
+
+class StreamingLinearFeatureBaseline(LinearFeatureBaseline):
+    """
+    Same linear regression on the features of LinearFeatureBaseline, fitted from the sums X^T X and X^T y accumulated
+    path by path (no matrix of the features of the whole batch) and solved by Cholesky. The sums of the previous
+    iterations can be kept with an exponential forgetting.
+
+    The features of a path are cached in the path, so that they are computed once for predict and fit. The samplers
+    remove them with clear_features once the baseline is fitted, not to keep them in the stored paths.
+    """
+
+    def __init__(self, env_spec, reg_coeff=1e-5, forget_factor=0.):
+        """
+        :param reg_coeff: regularization coefficient of the ridge regression (increased up to 5 times if the system
+        cannot be solved)
+        :param forget_factor: weight of the sums of the previous fits in the new one (0: only the current paths are
+        fitted, as in LinearFeatureBaseline)
+        """
+        super(StreamingLinearFeatureBaseline, self).__init__(env_spec, reg_coeff=reg_coeff)
+        assert 0 <= forget_factor <= 1
+        self._forget_factor = forget_factor
+        self._xtx = None
+        self._xty = None
+
+    @property
+    def forget_factor(self):
+        return self._forget_factor
+
+    @staticmethod
+    def clear_features(paths):
+        """
+        Remove the features cached in the paths
+        """
+        for path in paths:
+            path.pop("baseline_features", None)
+
+    @staticmethod
+    def _is_cached(path):
+        # kept with the observations they are computed from: paths made from other ones (e.g. the low-level paths)
+        # may share the dict entries but not the observations
+        cached = path.get("baseline_features")
+        return cached is not None and cached[0] is path["observations"]
+
+    def _cached_features(self, path):
+        if not self._is_cached(path):
+            path["baseline_features"] = (path["observations"], self._features(path))
+        return path["baseline_features"][1]
+
+    @overrides
+    def fit(self, paths):
+        xtx = xty = None
+        for path in paths:
+            features = self._cached_features(path)
+            if xtx is None:
+                xtx = features.T.dot(features)
+                xty = features.T.dot(path["returns"])
+            else:
+                xtx += features.T.dot(features)
+                xty += features.T.dot(path["returns"])
+        if xtx is None:
+            return
+        if self._xtx is not None and self._forget_factor > 0 and self._xtx.shape == xtx.shape:
+            xtx += self._forget_factor * self._xtx
+            xty += self._forget_factor * self._xty
+        self._xtx, self._xty = xtx, xty
+
+        reg_coeff = self._reg_coeff
+        identity = np.identity(len(xtx))
+        for _ in range(5):
+            try:
+                coeffs = scipy.linalg.cho_solve(scipy.linalg.cho_factor(xtx + reg_coeff * identity), xty)
+                if not np.any(np.isnan(coeffs)):
+                    self._coeffs = coeffs
+                    break
+            except np.linalg.LinAlgError:  # not positive definite in floating point
+                pass
+            reg_coeff *= 10
+
+    @overrides
+    def predict(self, path):
+        if self._coeffs is None:
+            return np.zeros(len(path["rewards"]))
+        return self._cached_features(path).dot(self._coeffs)
+
+    @overrides
+    def predict_n(self, paths):
+        if self._coeffs is None:
+            return [np.zeros(len(path["rewards"])) for path in paths]
+        missing = [path for path in paths if not self._is_cached(path)]
+        if missing:
+            # computed at once, and cached as views of the features of all the missing paths
+            featmat, lengths = self._features_n(missing)
+            for path, features in zip(missing, tensor_utils.split_tensor_list(featmat, lengths)):
+                path["baseline_features"] = (path["observations"], features)
+        if len(missing) < len(paths):
+            featmat = tensor_utils.concat_tensor_list([self._cached_features(path) for path in paths])
+            lengths = [len(path["rewards"]) for path in paths]
+        return tensor_utils.split_tensor_list(featmat.dot(self._coeffs), lengths)
@@ -23,3 +23,7 @@ class ZeroBaseline(Baseline):
     @overrides
     def predict(self, path):
         return np.zeros_like(path["rewards"])
+
+    @overrides
+    def predict_observations(self, observations):
+        return np.zeros(len(observations))
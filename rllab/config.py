@@ -5,6 +5,14 @@ PROJECT_PATH = osp.abspath(osp.join(osp.dirname(__file__), '..'))
 
 LOG_DIR = PROJECT_PATH + "/data"
 
+# where the compiled Theano functions are saved, to be loaded by the sampler workers and the next runs instead of
+# compiling them again (see rllab.misc.compile_cache). Can be deleted at any time. None to only keep them in memory
+THEANO_FUNCTION_CACHE_DIR = LOG_DIR + "/theano_functions"
+
+# where the compiled MuJoCo models are saved, to be loaded by the sampler workers and the next runs instead of compiling
+# them again (see rllab.envs.mujoco.model_cache). Can be deleted at any time. None to only keep them in memory
+MUJOCO_MODEL_CACHE_DIR = LOG_DIR + "/mujoco_models"
+
 USE_TF = False
 
 DOCKER_IMAGE = "DOCKER_IMAGE"
@@ -1,5 +1,4 @@
 import os.path as osp
-import tempfile
 import xml.etree.ElementTree as ET
 import math
 import numpy as np
@@ -9,8 +8,10 @@ from rllab.envs.base import Step
 from rllab.envs.proxy_env import ProxyEnv
 from rllab.envs.mujoco.maze.maze_env_utils import construct_maze
 from rllab.envs.mujoco.maze.maze_env_utils import construct_maze_random
+from rllab.envs.mujoco import model_cache
 from rllab.envs.mujoco.mujoco_env import MODEL_DIR, BIG
-from rllab.envs.mujoco.maze.maze_env_utils import ray_segment_intersect, point_distance
+from rllab.envs.mujoco.maze.maze_env_utils import structure_to_grids, grid_ray_readings
+from rllab.envs.mujoco.maze.maze_env_utils import structure_segments, segment_ray_readings
 from rllab.core.serializable import Serializable
 from rllab.misc.overrides import overrides
 
@@ -51,6 +52,8 @@ class MazeEnv(ProxyEnv, Serializable):
             direct_goal=False,
             velocity_field=True,
             visualize_goal=False,
+            v_gradient_cache=False,  # cache the value gradient direction per grid cell and orientation bin
+            v_gradient_ori_bins=16,
             *args,
             **kwargs):
         Serializable.quick_init(self, locals())
@@ -66,18 +69,16 @@ class MazeEnv(ProxyEnv, Serializable):
         self.velocity_field = velocity_field
         self.algo = None # will be added in set_algo!
         self.visualize_goal = visualize_goal
+        self.v_gradient_cache = v_gradient_cache
+        self.v_gradient_ori_bins = v_gradient_ori_bins
+        self._v_gradient_cache = dict()
 
         model_cls = self.__class__.MODEL_CLASS
         # print("model_cls", model_cls)
         if model_cls is None:
             raise "MODEL_CLASS unspecified!"
-        xml_path = osp.join(MODEL_DIR, model_cls.FILE)
-        # print("xml_path", xml_path)
-        self.tree = tree = ET.parse(xml_path)
-        self.worldbody = worldbody = tree.find(".//worldbody")
-
-        self.MAZE_HEIGHT = height = maze_height
-        self.MAZE_SIZE_SCALING = size_scaling = maze_size_scaling
+        self.MAZE_HEIGHT = maze_height
+        self.MAZE_SIZE_SCALING = maze_size_scaling
         self.init_actual_x = self.init_actual_y = 0
         self.random_start = random_start
         if self.random_start: # in kwargs
@@ -110,6 +111,37 @@ class MazeEnv(ProxyEnv, Serializable):
         self.init_torso_x = self._init_torso_x # make visible from outside
         self.init_torso_y = self._init_torso_y
 
+        self.args = args
+        self.kwargs = kwargs
+
+        # the same maze of the same robot is generated once (goal included: it is moved by reset)
+        file_path = model_cache.xml_file(
+            (model_cls.FILE, repr(structure), self.MAZE_SIZE_SCALING, self.MAZE_HEIGHT,
+             self.__class__.MAZE_MAKE_CONTACTS, self.visualize_goal),
+            lambda: self._build_tree(structure, torso_x, torso_y))
+
+        self._goal_range = self._find_goal_range()
+        self.goal = np.array([(self._goal_range[0]+self._goal_range[1])/2, (self._goal_range[2]+self._goal_range[3])/2])
+        # print ("goal_range", self._goal_range)
+        # print("x_y", self.wrapped_env.model.data.qpos.flat[0:2])
+        # print("goal", self.goal)
+        self._cached_segments = None
+
+        self.gradient_pool = [(1, 0), (0.707, 0.707), (0, 1), (-0.707, 0.707), (-1, 0), (-0.707, -0.707),
+                              (0, -1), (0.707, -0.707)] # added gradient pool for train_low_with_v_gradient
+
+        inner_env = model_cls(*args, file_path=file_path, **kwargs)  # file to the robot specifications; model_cls is AntEnv
+        ProxyEnv.__init__(self, inner_env)  # here is where the robot env will be initialized
+
+    def _build_tree(self, structure, torso_x, torso_y):
+        """
+        :return: ElementTree of the robot in the maze of the given structure, with the robot at the origin
+        """
+        model_cls = self.__class__.MODEL_CLASS
+        tree = ET.parse(osp.join(MODEL_DIR, model_cls.FILE))
+        worldbody = tree.find(".//worldbody")
+        height = self.MAZE_HEIGHT
+        size_scaling = self.MAZE_SIZE_SCALING
         for i in range(len(structure)):
             for j in range(len(structure[0])):
                 if str(structure[i][j]) == '1':
@@ -131,16 +163,13 @@ class MazeEnv(ProxyEnv, Serializable):
                     )
                 if self.visualize_goal and str(structure[i][j]) == 'g': # visualize goal! uncomment this block when testing!
                     # offset all coordinates so that robot starts at the origin
-                    self.goal_element =\
                     ET.SubElement(
-                        self.worldbody, "geom",
-                        name="block_%d_%d" % (i, j),
-                        pos="%f %f %f" % (j * size_scaling - self._init_torso_x,
-                                          i * size_scaling - self._init_torso_y,
-                                          self.MAZE_HEIGHT / 2 * size_scaling),
-                        size="%f %f %f" % (0.2 * size_scaling,
+                        worldbody, "geom",
+                        name="goal",  # moved by reset
+                        pos="%f %f %f" % tuple(self._goal_geom_pos(i, j)),
+                        size="%f %f %f" % (0.2 * size_scaling,  # smaller than the block to prevent collision
                                            0.2 * size_scaling,
-                                           self.MAZE_HEIGHT / 2 * size_scaling),
+                                           height / 2 * size_scaling),
                         type="box",
                         material="",
                         contype="1",
@@ -148,9 +177,6 @@ class MazeEnv(ProxyEnv, Serializable):
                         rgba="1.0 0.0 0.0 0.5"
                     )
 
-        self.args = args
-        self.kwargs = kwargs
-
         torso = tree.find(".//body[@name='torso']")
         geoms = torso.findall(".//geom")
         for geom in geoms:
@@ -172,25 +198,30 @@ class MazeEnv(ProxyEnv, Serializable):
                                 geom1=geom.attrib["name"],
                                 geom2="block_%d_%d" % (i, j)
                             )
+        return tree
 
-        _, file_path = tempfile.mkstemp(text=True)
-        tree.write(file_path)  # here we write a temporal file with the robot specifications. Why not the original one??
-
-        self._goal_range = self._find_goal_range()
-        self.goal = np.array([(self._goal_range[0]+self._goal_range[1])/2, (self._goal_range[2]+self._goal_range[3])/2])
-        # print ("goal_range", self._goal_range)
-        # print("x_y", self.wrapped_env.model.data.qpos.flat[0:2])
-        # print("goal", self.goal)
-        self._cached_segments = None
-
-        self.gradient_pool = [(1, 0), (0.707, 0.707), (0, 1), (-0.707, 0.707), (-1, 0), (-0.707, -0.707),
-                              (0, -1), (0.707, -0.707)] # added gradient pool for train_low_with_v_gradient
-
-        inner_env = model_cls(*args, file_path=file_path, **kwargs)  # file to the robot specifications; model_cls is AntEnv
-        ProxyEnv.__init__(self, inner_env)  # here is where the robot env will be initialized
+    def _goal_geom_pos(self, i, j):
+        return np.array([j * self.MAZE_SIZE_SCALING - self._init_torso_x,
+                         i * self.MAZE_SIZE_SCALING - self._init_torso_y,
+                         self.MAZE_HEIGHT / 2 * self.MAZE_SIZE_SCALING])
 
     def set_algo(self, algo): # set the algorithm to the environment
         self.algo = algo
+        # the sampler sets the algo before every iteration, so its baseline may have been refit
+        self._v_gradient_cache.clear()
+
+    def _get_segments(self):
+        """
+        Numpy arrays of the segments of the goal and the obstacles (see structure_segments), rebuilt only when reset
+        moves the goal or the robot
+        """
+        key = (getattr(self, 'x_g_prev', None), getattr(self, 'y_g_prev', None),
+               getattr(self, 'x_r_prev', None), getattr(self, 'y_r_prev', None))
+        if self._cached_segments is None or self._cached_segments[0] != key:
+            segments = structure_segments(self.MAZE_STRUCTURE, self.MAZE_SIZE_SCALING,
+                                          self._init_torso_x, self._init_torso_y)
+            self._cached_segments = (key, segments)
+        return self._cached_segments[1]
 
     def get_current_maze_obs(self):
         # The observation would include both information about the robot itself as well as the sensors around its
@@ -200,62 +231,12 @@ class MazeEnv(ProxyEnv, Serializable):
         robot_x, robot_y = robot_x_mujoco + self._init_torso_x, robot_y_mujoco + self._init_torso_y # index coords
         ori = self.get_ori()
 
-        structure = self.MAZE_STRUCTURE
-        size_scaling = self.MAZE_SIZE_SCALING
-
-        segments = []
-        # compute the distance of all segments
-
-        # Get all line segments of the goal and the obstacles
-        for i in range(len(structure)):
-            for j in range(len(structure[0])):
-                if structure[i][j] == 1 or structure[i][j] == 'g':
-                    cx = j * size_scaling - self._init_torso_x
-                    cy = i * size_scaling - self._init_torso_y
-                    x1 = cx - 0.5 * size_scaling
-                    x2 = cx + 0.5 * size_scaling
-                    y1 = cy - 0.5 * size_scaling
-                    y2 = cy + 0.5 * size_scaling
-                    struct_segments = [
-                        ((x1, y1), (x2, y1)), # index coordinates
-                        ((x2, y1), (x2, y2)),
-                        ((x2, y2), (x1, y2)),
-                        ((x1, y2), (x1, y1)),
-                    ]
-                    for seg in struct_segments:
-                        segments.append(dict(
-                            segment=seg,
-                            type=structure[i][j],
-                        ))
-
-        wall_readings = np.zeros(self._n_bins)
-        goal_readings = np.zeros(self._n_bins)
-
-        for ray_idx in range(self._n_bins):
-            ray_ori = ori - self._sensor_span * 0.5 + 1.0 * (2 * ray_idx + 1) / (2 * self._n_bins) * self._sensor_span
-            ray_segments = []
-            for seg in segments:
-                p = ray_segment_intersect(ray=((robot_x, robot_y), ray_ori), segment=seg["segment"])
-                if p is not None:
-                    ray_segments.append(dict(
-                        segment=seg["segment"],
-                        type=seg["type"],
-                        ray_ori=ray_ori,
-                        distance=point_distance(p, (robot_x, robot_y)),
-                    ))
-            if len(ray_segments) > 0:
-                first_seg = sorted(ray_segments, key=lambda x: x["distance"])[0]
-                # print first_seg
-                if first_seg["type"] == 1:
-                    # Wall -> add to wall readings
-                    if first_seg["distance"] <= self._sensor_range:
-                        wall_readings[ray_idx] = (self._sensor_range - first_seg["distance"]) / self._sensor_range
-                elif first_seg["type"] == 'g':
-                    # Goal -> add to goal readings
-                    if first_seg["distance"] <= self._sensor_range:
-                        goal_readings[ray_idx] = (self._sensor_range - first_seg["distance"]) / self._sensor_range
-                else:
-                    assert False
+        ray_oris = [ori - self._sensor_span * 0.5 + 1.0 * (2 * ray_idx + 1) / (2 * self._n_bins) * self._sensor_span
+                    for ray_idx in range(self._n_bins)]
+        starts, ends, is_goal = self._get_segments()
+        # every ray against every segment of the goal and the obstacles, at once
+        wall_readings, goal_readings = segment_ray_readings(starts, ends, is_goal, (robot_x, robot_y), ray_oris,
+                                                            self._sensor_range)
 
         # print("wall readings", wall_readings)
         if any(goal_readings) == False:
@@ -349,47 +330,12 @@ class MazeEnv(ProxyEnv, Serializable):
             self.wrapped_env.reset(init_state=init_state)  # wapped_env is the inner_env in __init__()
             # in mujoco_env.py, reset(self, init_state=None)
             # print(x_r, y_r)
-            if self.visualize_goal: # remove the prev goal and add a new goal
-                i, j = x_g, y_g
-                size_scaling = self.MAZE_SIZE_SCALING
-                # remove the original goal
-                try:
-                    self.worldbody.remove(self.goal_element)
-                except AttributeError:
-                    pass
-                # offset all coordinates so that robot starts at the origin
-                self.goal_element = \
-                    ET.SubElement(
-                        self.worldbody, "geom",
-                        name="block_%d_%d" % (i, j),
-                        pos="%f %f %f" % (j * size_scaling - self._init_torso_x,
-                                          i * size_scaling - self._init_torso_y,
-                                          self.MAZE_HEIGHT / 2 * size_scaling),
-                        size="%f %f %f" % (0.2 * size_scaling, # smaller than the block to prevent collision
-                                           0.2 * size_scaling,
-                                           self.MAZE_HEIGHT / 2 * size_scaling),
-                        type="box",
-                        material="",
-                        contype="1",
-                        conaffinity="1",
-                        rgba="1.0 0.0 0.0 0.5"
-                    )
-                # Note: running the lines below will make the robot position wrong! (because the graph is rebuilt)
-                torso = self.tree.find(".//body[@name='torso']")
-                geoms = torso.findall(".//geom")
-                for geom in geoms:
-                    # print("geom", geom.attrib)
-                    if 'name' not in geom.attrib:
-                        raise Exception("Every geom of the torso must have a name "
-                                        "defined")
-                _, file_path = tempfile.mkstemp(text=True)
-                self.tree.write(
-                    file_path)  # here we write a temporal file with the robot specifications. Why not the original one??
-                model_cls = self.__class__.MODEL_CLASS
-                inner_env = model_cls(*self.args, file_path=file_path,
-                                      **self.kwargs)  # file to the robot specifications; model_cls is AntEnv
-                ProxyEnv.__init__(self, inner_env)  # here is where the robot env will be initialized
-
+            if self.visualize_goal: # move the goal geom to the new goal, in the compiled model
+                model = self.wrapped_env.model
+                geom_pos = np.array(model.geom_pos)
+                geom_pos[model.geom_names.index("goal")] = self._goal_geom_pos(x_g, y_g)
+                model.geom_pos = geom_pos
+                model.forward()
 
         else:
             self.wrapped_env.reset()
@@ -463,109 +409,76 @@ class MazeEnv(ProxyEnv, Serializable):
                         return True
         return False
 
+    def _get_occupancy_grids(self):
+        """
+        Numpy wall and goal grids of MAZE_STRUCTURE. Only the goal cell changes (in reset), so they are rebuilt when it
+        moves
+        """
+        key = (getattr(self, 'x_g_prev', None), getattr(self, 'y_g_prev', None))
+        if getattr(self, '_occupancy_grids_key', None) != key:
+            self._occupancy_grids = structure_to_grids(self.MAZE_STRUCTURE)
+            self._occupancy_grids_key = key
+        return self._occupancy_grids
+
     def get_next_maze_obs(self, next_dx, next_dy): # the maze obs with a virtual step! (in order to find the gradient)
-        # The observation would include both information about the robot itself as well as the sensors around its
-        # environment
-        structure = self.MAZE_STRUCTURE
+        return self.get_next_maze_obs_n([(next_dx, next_dy)])[0]
+
+    def get_next_maze_obs_n(self, deltas):
+        """
+        Maze obs (wall and goal readings) after virtual steps of the robot, the rays of all the steps being cast at once
+        :param deltas: list of the (dx, dy) of the virtual steps
+        :return: array (len(deltas), 2 * n_bins)
+        """
         size_scaling = self.MAZE_SIZE_SCALING
 
         # compute origin cell i_o, j_o coordinates and center of it x_o, y_o (with 0,0 in the top-left corner of struc)
         o_xy = np.array(self._find_robot())  # this is self.init_torso_x, self.init_torso_y !!: center of the cell xy!
-        o_ij = (o_xy / size_scaling).astype(int)  # this is the initial position in the grid (check if correct..) [j, i]
-
-        # robot_xy = np.array(self.wrapped_env.get_body_com("torso")[:2])  # the coordinates of this are wrt the init!!
-        x_actual, y_actual = self.wrapped_env.get_body_com("torso")[0] + self._init_torso_x - o_xy[0] + next_dx,\
-                             self.wrapped_env.get_body_com("torso")[1] + self._init_torso_y - o_xy[1] + next_dy
-        robot_xy = np.array([x_actual, y_actual]) # these are the x, y relative to the init pos in this episode
+        torso_x, torso_y = self.wrapped_env.get_body_com("torso")[:2]
+        # these are the x, y relative to the init pos in this episode, after every virtual step
+        robot_xys = [(torso_x + self._init_torso_x - o_xy[0] + dx, torso_y + self._init_torso_y - o_xy[1] + dy)
+                     for dx, dy in deltas]
 
         ori = self.get_ori()  # for Ant this is computed with atan2, which gives [-pi, pi]
-        c_ij = o_ij + np.rint(robot_xy / size_scaling) # relative to the grid
-        c_xy = (c_ij - o_ij) * size_scaling  # the xy position of the current cell center in init_robot origin
-        # print("c_xy", c_xy)
-        # print('o_xy', o_xy)
-        # print('robot_xy', robot_xy)
-        # print('c_ij', c_ij)
-        R = int(self._sensor_range // size_scaling)
-
-        wall_readings = np.zeros(self._n_bins)
-        goal_readings = np.zeros(self._n_bins)
-
-        for ray_idx in range(self._n_bins):
-            ray_ori = ori - self._sensor_span * 0.5 + ray_idx / (
-            self._n_bins - 1) * self._sensor_span  # make the ray in [-pi, pi]
-            if ray_ori > math.pi:
-                ray_ori -= 2 * math.pi
-            elif ray_ori < - math.pi:
-                ray_ori += 2 * math.pi
-            x_dir, y_dir = 1, 1
-            if math.pi / 2. <= ray_ori <= math.pi:
-                x_dir = -1
-            elif 0 > ray_ori >= - math.pi / 2.:
-                y_dir = -1
-            elif - math.pi / 2. > ray_ori >= - math.pi:
-                x_dir, y_dir = -1, -1
-
-            visited_goal = False
-            visited_wall = False
-            for r in range(R):
-                next_x = c_xy[0] + x_dir * (0.5 + r) * size_scaling  # x of the next vertical segment, in init_rob coord
-                next_i = int(c_ij[0] + x_dir * (r + 1))  # this is the i of the cells on the other side of the segment
-                delta_y = (next_x - robot_xy[0]) * math.tan(ray_ori)
-                y = robot_xy[1] + delta_y  # y of the intersection pt, wrt robot_init origin
-                dist = np.sqrt(np.sum(np.square(robot_xy - (next_x, y))))
-                # if dist > self._sensor_range:
-                #     # print("sensor range is too small")
-                #     print("vertical dist", dist)
-                if dist <= self._sensor_range and 0 <= next_i < len(structure[0]):
-                    j = int(np.rint((y + o_xy[1]) / size_scaling))
-                    if 0 <= j < len(structure):
-                        if structure[j][next_i] == 1 and not visited_wall:
-                            wall_readings[ray_idx] = (self._sensor_range - dist) / self._sensor_range
-                            # plot_ray(wall_readings[ray_idx], ray_idx)
-                            visited_wall = True
-                        elif structure[j][next_i] == 'g' and not visited_goal:  # remember to flip the ij when referring to the matrix!!
-                            goal_readings[ray_idx] = (self._sensor_range - dist) / self._sensor_range
-                            # plot_ray(goal_readings[ray_idx], ray_idx, 'g')
-                            visited_goal = True
-                    else:
-                        break
-                else:
-                    break
-            # same for next horizontal segment. If the distance is less (higher intensity), update the goal/wall reading
-            visited_goal = False
-            visited_wall = False
-            for r in range(R):
-                next_y = c_xy[1] + y_dir * (0.5 + r) * size_scaling  # y of the next horizontal segment
-                next_j = int(
-                    c_ij[1] + y_dir * (r + 1))  # this is the i and j of the cells on the other side of the segment
-                # first check the intersection with the next horizontal segment:
-                delta_x = (next_y - robot_xy[1]) / math.tan(ray_ori)
-                x = robot_xy[0] + delta_x
-                dist = np.sqrt(np.sum(np.square(robot_xy - (x, next_y))))
-                if dist <= self._sensor_range and 0 <= next_j < len(structure):
-                    i = int(np.rint((x + o_xy[0]) / size_scaling))
-                    if 0 <= i < len(structure[0]):
-                        intensity = (self._sensor_range - dist) / self._sensor_range # closeness
-                        if structure[next_j][i] == 1 and not visited_wall:
-                            if wall_readings[ray_idx] == 0 or intensity > wall_readings[ray_idx]:
-                                wall_readings[ray_idx] = intensity
-                                # plot_ray(wall_readings[ray_idx], ray_idx)
-                            visited_wall = True
-                        elif structure[next_j][i] == 'g' and not visited_goal:
-                            if goal_readings[ray_idx] == 0 or intensity > goal_readings[ray_idx]:
-                                goal_readings[ray_idx] = intensity
-                                # plot_ray(goal_readings[ray_idx], ray_idx, 'g')
-                            visited_goal = True
-                    else:
-                        break
-                else:
-                    break
-
-        obs = np.concatenate([
-                wall_readings,
-                goal_readings
-            ])
-        return obs
+        ray_oris = [ori - self._sensor_span * 0.5 + ray_idx / (self._n_bins - 1) * self._sensor_span
+                    for ray_idx in range(self._n_bins)]
+        wall_grid, goal_grid = self._get_occupancy_grids()
+        wall_readings, goal_readings = grid_ray_readings(
+            wall_grid, goal_grid, o_xy, np.repeat(robot_xys, self._n_bins, axis=0), ray_oris * len(deltas),
+            self._sensor_range, size_scaling)
+        return np.concatenate([wall_readings.reshape((len(deltas), self._n_bins)),
+                               goal_readings.reshape((len(deltas), self._n_bins))], axis=1)
+
+    def _get_value_gradient(self):
+        """
+        Direction of gradient_pool in which a virtual step of one cell leads to the highest value of the baseline of the
+        algo. The values of all the virtual steps are predicted at once.
+        If v_gradient_cache, the direction is reused while the robot stays in the same grid cell with the same
+        orientation bin, until the baseline is refit (see set_algo)
+        """
+        if self.v_gradient_cache:
+            size_scaling = self.MAZE_SIZE_SCALING
+            torso_x, torso_y = self.wrapped_env.get_body_com("torso")[:2]
+            ori_bin = int((self.get_ori() + math.pi) / (2 * math.pi) * self.v_gradient_ori_bins) % \
+                self.v_gradient_ori_bins
+            key = (int(np.rint((torso_x + self._init_torso_x) / size_scaling)),
+                   int(np.rint((torso_y + self._init_torso_y) / size_scaling)),
+                   ori_bin, self.x_g_prev, self.y_g_prev)
+            if key not in self._v_gradient_cache:
+                self._v_gradient_cache[key] = self._compute_value_gradient()
+            return self._v_gradient_cache[key]
+        return self._compute_value_gradient()
+
+    def _compute_value_gradient(self):
+        deltas = [(dx * self.MAZE_SIZE_SCALING, dy * self.MAZE_SIZE_SCALING) for dx, dy in self.gradient_pool]
+        maze_obs = self.get_next_maze_obs_n(deltas)  # maze obs with a virtual step
+        robot_obs = self.wrapped_env.get_current_obs()  # robot ego observation
+        obs = np.concatenate([np.tile(robot_obs, (len(deltas), 1)), maze_obs], axis=1)
+        values = self.algo.baseline.predict_observations(obs)
+        values = np.where(np.isnan(values), -np.inf, values)
+        best = int(np.argmax(values))
+        if values[best] > -1000.:
+            return self.gradient_pool[best]
+        return 0, 0
 
     def step(self, action):
         if self.MANUAL_COLLISION:
@@ -608,21 +521,7 @@ class MazeEnv(ProxyEnv, Serializable):
         elif self.algo is not None and self.algo.train_low_with_v_gradient:
             vel_x = inner_rew[0] # right speed
             vel_y = -inner_rew[1] # down speed (-up speed). down is the positive direction of y!
-            value_function = self.algo.baseline
-            max_v = -1000.
-            gradient_x = gradient_y = 0
-            for dx, dy in self.gradient_pool:
-                delta_x = dx * self.MAZE_SIZE_SCALING
-                delta_y = dy * self.MAZE_SIZE_SCALING
-                # add dx, dy to current x, y
-                obs = np.concatenate([self.wrapped_env.get_current_obs(), # robot ego observation
-                                    self.get_next_maze_obs(delta_x, delta_y)]) # maze obs with a virtual step
-                path = {'observations': [obs], 'rewards': [0]} # path contains a single step!
-                v = value_function.predict(path)[0]
-                if v > max_v:
-                    max_v = v
-                    gradient_x = dx
-                    gradient_y = dy
+            gradient_x, gradient_y = self._get_value_gradient()
             reward = np.dot((vel_x, vel_y), (gradient_x, gradient_y)) # inner product of speed
         else:
             reward = 0.0 # no reward for velocity
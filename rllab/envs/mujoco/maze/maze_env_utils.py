@@ -97,6 +97,249 @@ def point_distance(p1, p2):
     return ((x1 - x2) ** 2 + (y1 - y2) ** 2) ** 0.5
 
 
+def structure_segments(structure, size_scaling, torso_x, torso_y):
+    """
+    Edges of the wall and goal cells of a maze, as numpy arrays, in the order MazeEnv used to build them
+    :param torso_x: offset of the x coordinates (the initial torso x in index coordinates)
+    :param torso_y: offset of the y coordinates
+    :return: starts (n_segments, 2), ends (n_segments, 2), and a boolean array telling the goal segments
+    """
+    starts, ends, is_goal = [], [], []
+    for i in range(len(structure)):
+        for j in range(len(structure[0])):
+            if structure[i][j] == 1 or structure[i][j] == 'g':
+                cx = j * size_scaling - torso_x
+                cy = i * size_scaling - torso_y
+                x1 = cx - 0.5 * size_scaling
+                x2 = cx + 0.5 * size_scaling
+                y1 = cy - 0.5 * size_scaling
+                y2 = cy + 0.5 * size_scaling
+                starts.extend([(x1, y1), (x2, y1), (x2, y2), (x1, y2)])
+                ends.extend([(x2, y1), (x2, y2), (x1, y2), (x1, y1)])
+                is_goal.extend([structure[i][j] == 'g'] * 4)
+    return np.array(starts, dtype=float).reshape((-1, 2)), np.array(ends, dtype=float).reshape((-1, 2)), \
+        np.array(is_goal, dtype=bool)
+
+
+def segment_ray_readings(starts, ends, is_goal, robot_xy, ray_oris, sensor_range):
+    """
+    Wall and goal readings of rays, intersecting all the rays with all the segments at once (same intersections as
+    ray_segment_intersect). Every ray sees the closest segment it crosses: its reading is
+    (sensor_range - distance) / sensor_range, or 0 if it is farther than the range.
+    :param starts: array (n_segments, 2), see structure_segments
+    :param ends: array (n_segments, 2)
+    :param is_goal: boolean array telling which segments belong to the goal
+    :param robot_xy: origin of the rays
+    :param ray_oris: orientation of every ray
+    :return: wall_readings, goal_readings, both of the length of ray_oris
+    """
+    wall_readings = np.zeros(len(ray_oris))
+    goal_readings = np.zeros(len(ray_oris))
+    if len(starts) == 0:
+        return wall_readings, goal_readings
+    x1, y1 = robot_xy
+    # math.cos and math.sin rather than their numpy versions, to get exactly the same points as ray_segment_intersect
+    dx1 = (np.array([x1 + math.cos(ray_ori) for ray_ori in ray_oris]) - x1)[:, None]
+    dy1 = (np.array([y1 + math.sin(ray_ori) for ray_ori in ray_oris]) - y1)[:, None]
+    x, y = starts[:, 0], starts[:, 1]
+    dx = ends[:, 0] - x
+    dy = ends[:, 1] - y
+    det = (-dx1 * dy + dy1 * dx)  # (n_rays, n_segments)
+    valid = np.abs(det) >= 0.00000001
+    with np.errstate(divide='ignore', invalid='ignore'):
+        det_inv = 1.0 / np.where(valid, det, 1.)
+        r = det_inv * (-dy * (x - x1) + dx * (y - y1))
+        s = det_inv * (-dy1 * (x - x1) + dx1 * (y - y1))
+    hits = valid & (r >= 0) & (0 <= s) & (s <= 1)
+    xi = (x1 + r * dx1 + x + s * dx) / 2.0
+    yi = (y1 + r * dy1 + y + s * dy) / 2.0
+    distance = np.where(hits, np.sqrt((xi - x1) ** 2 + (yi - y1) ** 2), np.inf)
+    first = distance.argmin(axis=1)  # the first of the closest segments, as the stable sort did
+    first_distance = distance[np.arange(len(ray_oris)), first]
+    seen = first_distance <= sensor_range
+    readings = (sensor_range - first_distance[seen]) / sensor_range
+    wall_readings[seen] = np.where(is_goal[first[seen]], 0., readings)
+    goal_readings[seen] = np.where(is_goal[first[seen]], readings, 0.)
+    return wall_readings, goal_readings
+
+
+def structure_to_grids(structure):
+    """
+    :param structure: maze structure, as a list of rows
+    :return: boolean numpy arrays (n_rows, n_cols) of the wall cells and of the goal cells
+    """
+    wall_grid = np.array([[cell == 1 for cell in row] for row in structure], dtype=bool)
+    goal_grid = np.array([[cell == 'g' for cell in row] for row in structure], dtype=bool)
+    return wall_grid, goal_grid
+
+
+def _wrap_ray_oris(ray_oris):
+    ray_oris = np.where(ray_oris > math.pi, ray_oris - 2 * math.pi, ray_oris)
+    return np.where(ray_oris < - math.pi, ray_oris + 2 * math.pi, ray_oris)
+
+
+def _first_hits(hits, dist, sensor_range):
+    # intensity at the first crossing of every ray that hits, 0 for the others
+    first = hits.argmax(axis=1)
+    intensity = (sensor_range - dist[np.arange(len(dist)), first]) / sensor_range
+    return hits.any(axis=1), intensity
+
+
+def grid_ray_readings(wall_grid, goal_grid, o_xy, robot_xy, ray_oris, sensor_range, size_scaling):
+    """
+    Wall and goal readings of rays cast in a maze defined with a grid, walking the cell boundaries crossed by all the
+    rays at once (same readings as grid_ray_readings_loop, used by FastMazeEnv).
+    A ray sees the first wall cell and the first goal cell it crosses, possibly behind a wall. The reading of a ray is
+    (sensor_range - distance) / sensor_range, or 0 if nothing is seen within the range.
+    :param wall_grid: boolean array (n_rows, n_cols) of the wall cells, see structure_to_grids
+    :param goal_grid: boolean array (n_rows, n_cols) of the goal cells
+    :param o_xy: xy of the center of the initial cell of the robot, with 0, 0 in the center of the top-left cell
+    :param robot_xy: xy of the robot relative to o_xy, or an array (n_rays, 2) of the origin of every ray (e.g. to
+    cast the rays of several virtual positions at once)
+    :param ray_oris: orientation of every ray, in [-pi, pi] (or within 2 * pi of it)
+    :return: wall_readings, goal_readings, both of the length of ray_oris
+    """
+    n_rows, n_cols = wall_grid.shape
+    o_xy = np.asarray(o_xy)
+    robot_xy = np.asarray(robot_xy, dtype=float).reshape((-1, 2))
+    robot_x, robot_y = robot_xy[:, 0:1], robot_xy[:, 1:2]
+    o_ij = (o_xy / size_scaling).astype(int)
+    c_ij = o_ij + np.rint(robot_xy / size_scaling)  # current cell in the grid
+    c_xy = (c_ij - o_ij) * size_scaling
+    c_i, c_j = c_ij[:, 0:1], c_ij[:, 1:2]
+    c_x, c_y = c_xy[:, 0:1], c_xy[:, 1:2]
+
+    ray_oris = _wrap_ray_oris(np.asarray(ray_oris, dtype=float))
+    wall_readings = np.zeros(len(ray_oris))
+    goal_readings = np.zeros(len(ray_oris))
+    R = int(sensor_range // size_scaling)
+    if R == 0:
+        return wall_readings, goal_readings
+    third_quadrant = (- math.pi / 2. > ray_oris) & (ray_oris >= - math.pi)
+    neg_x = ((math.pi / 2. <= ray_oris) & (ray_oris <= math.pi)) | third_quadrant
+    neg_y = ((0 > ray_oris) & (ray_oris >= - math.pi / 2.)) | third_quadrant
+    x_dir = np.where(neg_x, -1, 1)[:, None]
+    y_dir = np.where(neg_y, -1, 1)[:, None]
+    # math.tan rather than np.tan, whose vectorized implementation can differ in the last bit
+    tan = np.array([math.tan(ray_ori) for ray_ori in ray_oris])[:, None]
+    r = np.arange(R)[None, :]
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        # crossings of the vertical segments: (n_rays, R)
+        next_x = c_x + x_dir * (0.5 + r) * size_scaling
+        next_i = (c_i + x_dir * (r + 1)).astype(int)  # column of the cells on the other side of the segments
+        y = robot_y + (next_x - robot_x) * tan
+        dist_v = np.sqrt(np.square(robot_x - next_x) + np.square(robot_y - y))
+        j = np.rint((y + o_xy[1]) / size_scaling)
+        valid = (dist_v <= sensor_range) & (0 <= next_i) & (next_i < n_cols) & (0 <= j) & (j < n_rows)
+        # a ray stops at the first crossing out of range or out of the maze
+        valid = np.logical_and.accumulate(valid, axis=1)
+        j = np.where(valid, j, 0).astype(int)
+        next_i = np.where(valid, next_i, 0)
+        v_wall, v_wall_intensity = _first_hits(valid & wall_grid[j, next_i], dist_v, sensor_range)
+        v_goal, v_goal_intensity = _first_hits(valid & goal_grid[j, next_i], dist_v, sensor_range)
+        wall_readings[v_wall] = v_wall_intensity[v_wall]
+        goal_readings[v_goal] = v_goal_intensity[v_goal]
+
+        # crossings of the horizontal segments
+        next_y = c_y + y_dir * (0.5 + r) * size_scaling
+        next_j = (c_j + y_dir * (r + 1)).astype(int)
+        x = robot_x + (next_y - robot_y) / tan
+        dist_h = np.sqrt(np.square(robot_x - x) + np.square(robot_y - next_y))
+        i = np.rint((x + o_xy[0]) / size_scaling)
+        valid = (dist_h <= sensor_range) & (0 <= next_j) & (next_j < n_rows) & (0 <= i) & (i < n_cols)
+        valid = np.logical_and.accumulate(valid, axis=1)
+        i = np.where(valid, i, 0).astype(int)
+        next_j = np.where(valid, next_j, 0)
+        h_wall, h_wall_intensity = _first_hits(valid & wall_grid[next_j, i], dist_h, sensor_range)
+        h_goal, h_goal_intensity = _first_hits(valid & goal_grid[next_j, i], dist_h, sensor_range)
+    # keep the closest of the two crossings
+    h_wall &= (wall_readings == 0) | (h_wall_intensity > wall_readings)
+    h_goal &= (goal_readings == 0) | (h_goal_intensity > goal_readings)
+    wall_readings[h_wall] = h_wall_intensity[h_wall]
+    goal_readings[h_goal] = h_goal_intensity[h_goal]
+    return wall_readings, goal_readings
+
+
+def grid_ray_readings_loop(structure, o_xy, robot_xy, ray_oris, sensor_range, size_scaling):
+    """
+    Reference implementation of grid_ray_readings, looping over the rays and the cell boundaries they cross (this is
+    how FastMazeEnv used to compute its readings). Kept for the tests and the benchmarks.
+    :param structure: maze structure, as a list of rows
+    """
+    o_xy = np.asarray(o_xy)
+    robot_xy = np.asarray(robot_xy)
+    o_ij = (o_xy / size_scaling).astype(int)
+    c_ij = o_ij + np.rint(robot_xy / size_scaling)
+    c_xy = (c_ij - o_ij) * size_scaling
+    R = int(sensor_range // size_scaling)
+
+    wall_readings = np.zeros(len(ray_oris))
+    goal_readings = np.zeros(len(ray_oris))
+
+    for ray_idx, ray_ori in enumerate(ray_oris):
+        if ray_ori > math.pi:
+            ray_ori -= 2 * math.pi
+        elif ray_ori < - math.pi:
+            ray_ori += 2 * math.pi
+        x_dir, y_dir = 1, 1
+        if math.pi / 2. <= ray_ori <= math.pi:
+            x_dir = -1
+        elif 0 > ray_ori >= - math.pi / 2.:
+            y_dir = -1
+        elif - math.pi / 2. > ray_ori >= - math.pi:
+            x_dir, y_dir = -1, -1
+
+        visited_goal = False
+        visited_wall = False
+        for r in range(R):
+            next_x = c_xy[0] + x_dir * (0.5 + r) * size_scaling  # x of the next vertical segment, in init_rob coord
+            next_i = int(c_ij[0] + x_dir * (r + 1))  # this is the i of the cells on the other side of the segment
+            delta_y = (next_x - robot_xy[0]) * math.tan(ray_ori)
+            y = robot_xy[1] + delta_y  # y of the intersection pt, wrt robot_init origin
+            dist = np.sqrt(np.sum(np.square(robot_xy - (next_x, y))))
+            if dist <= sensor_range and 0 <= next_i < len(structure[0]):
+                j = int(np.rint((y + o_xy[1]) / size_scaling))
+                if 0 <= j < len(structure):
+                    if structure[j][next_i] == 1 and not visited_wall:
+                        wall_readings[ray_idx] = (sensor_range - dist) / sensor_range
+                        visited_wall = True
+                    elif structure[j][next_i] == 'g' and not visited_goal:
+                        goal_readings[ray_idx] = (sensor_range - dist) / sensor_range
+                        visited_goal = True
+                else:
+                    break
+            else:
+                break
+
+        # same for next horizontal segment. If the distance is less (higher intensity), update the goal/wall reading
+        visited_goal = False
+        visited_wall = False
+        for r in range(R):
+            next_y = c_xy[1] + y_dir * (0.5 + r) * size_scaling  # y of the next horizontal segment
+            next_j = int(c_ij[1] + y_dir * (r + 1))  # this is the j of the cells on the other side of the segment
+            delta_x = (next_y - robot_xy[1]) / math.tan(ray_ori)
+            x = robot_xy[0] + delta_x
+            dist = np.sqrt(np.sum(np.square(robot_xy - (x, next_y))))
+            if dist <= sensor_range and 0 <= next_j < len(structure):
+                i = int(np.rint((x + o_xy[0]) / size_scaling))
+                if 0 <= i < len(structure[0]):
+                    intensity = (sensor_range - dist) / sensor_range  # closeness
+                    if structure[next_j][i] == 1 and not visited_wall:
+                        if wall_readings[ray_idx] == 0 or intensity > wall_readings[ray_idx]:
+                            wall_readings[ray_idx] = intensity
+                        visited_wall = True
+                    elif structure[next_j][i] == 'g' and not visited_goal:
+                        if goal_readings[ray_idx] == 0 or intensity > goal_readings[ray_idx]:
+                            goal_readings[ray_idx] = intensity
+                        visited_goal = True
+                else:
+                    break
+            else:
+                break
+    return wall_readings, goal_readings
+
+
 def construct_maze(maze_id=0, length=1):
     # define the maze to use
     if maze_id == 0:
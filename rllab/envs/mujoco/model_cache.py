@@ -0,0 +1,78 @@
+"""
+Cache of the MuJoCo models, so that the model of an env is generated and compiled once: the same env is built by every
+sampler worker (and rebuilt when it is unpickled), and the maze envs generate the same xml for every instance.
+
+The generated xml files are kept by key in each process. A model is compiled once per process and every env gets a copy
+of it, with its own data. The compiled models are also saved in the MJB format in config.MUJOCO_MODEL_CACHE_DIR (if
+set), by the hash of their xml, for the other processes to load them without compiling.
+"""
+import hashlib
+import os
+import os.path as osp
+import tempfile
+
+from rllab import config
+from rllab.misc import logger
+from rllab.mujoco_py import MjModel
+
+# key -> path of the generated xml file
+_xml_files = dict()
+# (path, mtime, size) of an xml file -> its compiled model (never used by an env, only copied)
+_models = dict()
+
+
+def xml_file(key, build_tree):
+    """
+    :param key: hashable identifying the generated model, e.g. its robot file and the structure of its maze
+    :param build_tree: function returning the ElementTree of the model, only called if it is not cached
+    :return: path of the xml file of the model
+    """
+    file_path = _xml_files.get(key)
+    if file_path is None or not osp.exists(file_path):
+        fd, file_path = tempfile.mkstemp(suffix='.xml', text=True)
+        os.close(fd)
+        build_tree().write(file_path)
+        _xml_files[key] = file_path
+    return file_path
+
+
+def _binary_file(file_path):
+    cache_dir = getattr(config, 'MUJOCO_MODEL_CACHE_DIR', None)
+    if not cache_dir:
+        return None
+    with open(file_path, 'rb') as f:
+        return osp.join(cache_dir, hashlib.sha1(f.read()).hexdigest() + '.mjb')
+
+
+def _compile(file_path):
+    binary_file = _binary_file(file_path)
+    if binary_file is not None and osp.exists(binary_file):
+        try:
+            return MjModel.load_binary(binary_file)
+        except Exception as e:  # e.g. written by another version of MuJoCo. It is compiled and saved again
+            logger.log("Could not load the compiled model %s: %s" % (binary_file, e))
+    model = MjModel(file_path)
+    if binary_file is not None:
+        try:
+            os.makedirs(osp.dirname(binary_file), exist_ok=True)
+            # written under another name first: the workers may be reading the file at the same time
+            fd, tmp_file = tempfile.mkstemp(dir=osp.dirname(binary_file), suffix='.tmp')
+            os.close(fd)
+            model.save_binary(tmp_file)
+            os.replace(tmp_file, binary_file)
+        except Exception as e:
+            logger.log("Could not save the compiled model %s: %s" % (binary_file, e))
+    return model
+
+
+def load_model(file_path):
+    """
+    Same as MjModel(file_path), without compiling the file again if it did not change
+    :return: new MjModel of the file
+    """
+    stat = os.stat(file_path)
+    key = (osp.abspath(file_path), stat.st_mtime, stat.st_size)
+    model = _models.get(key)
+    if model is None:
+        model = _models[key] = _compile(file_path)
+    return model.copy()
@@ -6,6 +6,7 @@ from rllab import spaces
 from rllab.envs.base import Env
 from rllab.misc.overrides import overrides
 from rllab.mujoco_py import MjModel, MjViewer
+from rllab.envs.mujoco import model_cache
 from rllab.misc import autoargs
 from rllab.misc import logger
 # import theano
@@ -61,7 +62,7 @@ class MujocoEnv(Env):
             self.model = MjModel(file_path)
             os.close(tmp_f)
         else:
-            self.model = MjModel(file_path)
+            self.model = model_cache.load_model(file_path)
         self.data = self.model.data
         self.viewer = None
         self.init_qpos = self.model.data.qpos
@@ -0,0 +1,112 @@
+"""
+Diagnostics computed in a separate process, off the critical path of the training loop (e.g. rasterizing the
+visitations of the paths and plotting them).
+
+The diagnostics are submitted as a picklable function and compact args (not the paths). The function returns the
+tabular entries to record: collect() waits for them and records them with the tabular prefixes active at submission,
+so that they land in the row of the iteration they were submitted in. Without a worker (init_worker not called), the
+functions are run and their entries recorded right away.
+"""
+import atexit
+import traceback
+from multiprocessing import Process, Queue
+
+from rllab.misc import logger
+
+__all__ = [
+    'init_worker',
+    'shutdown_worker',
+    'set_iteration',
+    'should_plot',
+    'submit',
+    'collect',
+]
+
+process = None
+tasks = None
+results = None
+# tabular prefixes of the submitted tasks whose entries were not collected yet, in submission order
+_pending = []
+_plot_every = 1
+_itr = 0
+
+
+def _worker_start(tasks, results):
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            fn, args, kwargs = task
+            try:
+                results.put((fn(*args, **kwargs), None))
+            except Exception:
+                results.put((None, traceback.format_exc()))
+    except KeyboardInterrupt:
+        pass
+
+
+def init_worker(plot_every=1):
+    """
+    Start the process computing the submitted diagnostics.
+    :param plot_every: the figures are only drawn every plot_every iterations (see should_plot)
+    """
+    global process, tasks, results, _plot_every
+    _plot_every = plot_every
+    if process is not None:
+        return
+    tasks = Queue()
+    results = Queue()
+    process = Process(target=_worker_start, args=(tasks, results))
+    process.daemon = True
+    process.start()
+    atexit.register(shutdown_worker)
+
+
+def shutdown_worker():
+    global process, tasks, results
+    if process is None:
+        return
+    collect()
+    tasks.put(None)
+    process.join()
+    process = tasks = results = None
+
+
+def set_iteration(itr):
+    global _itr
+    _itr = itr
+
+
+def should_plot():
+    """
+    :return: whether the diagnostics of the current iteration should draw their figures (always without a worker)
+    """
+    return process is None or _itr % _plot_every == 0
+
+
+def submit(fn, *args, **kwargs):
+    """
+    :param fn: picklable function of the args (e.g. a module-level function), returning a list of (key, value)
+    tabular entries
+    """
+    if process is None:
+        for key, val in fn(*args, **kwargs):
+            logger.record_tabular(key, val)
+    else:
+        tasks.put((fn, args, kwargs))
+        _pending.append(logger.get_tabular_prefix())
+
+
+def collect():
+    """
+    Wait for the submitted diagnostics and record their tabular entries. To call before dump_tabular.
+    """
+    while _pending:
+        entries, error = results.get()
+        prefix = _pending.pop(0)
+        if error is not None:
+            raise RuntimeError("Diagnostics failed in the background process:\n" + error)
+        with logger.tabular_prefix(prefix):
+            for key, val in entries:
+                logger.record_tabular(key, val)
@@ -0,0 +1,114 @@
+"""
+Loading of the pre-trained policies other experiments are built on (e.g. the SNN skills of the hierarchical
+experiments), from the params.pkl snapshot of their experiment or from its weights-only export (an npz of the policy
+params by name and a json of the policy args, see export_policy).
+
+Every file is read once per process: the results are cached by absolute path and modification time. They are shared
+by all the callers, which must not modify them.
+"""
+import json
+import os
+
+import joblib
+import numpy as np
+
+from rllab import config
+
+# args of the pre-trained policy needed to rebuild it, as stored under json_args/policy in the json of its experiment
+POLICY_ARGS = ('latent_dim', 'latent_name', 'bilinear_integration', 'resample', 'min_std', 'hidden_sizes')
+
+_cache = dict()
+
+
+def _cached(loader, path):
+    path = os.path.abspath(os.path.join(config.PROJECT_PATH, path))
+    mtime = os.path.getmtime(path)
+    key = (loader.__name__, path)
+    if key not in _cache or _cache[key][0] != mtime:
+        _cache[key] = (mtime, loader(path))
+    return _cache[key][1]
+
+
+def _load_json(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def _load_npz(path):
+    with np.load(path) as data:
+        return dict(data)
+
+
+def _load_pkl_policy(path):
+    # the rest of the snapshot (and the Theano graphs of the policy) is not kept in the cache
+    policy = joblib.load(path)['policy']
+    policy_args = dict((k, getattr(policy, k)) for k in POLICY_ARGS)
+    params = dict((param.name, param.get_value()) for param in policy.get_params_internal())
+    return policy_args, params
+
+
+def load_pkl(path):
+    """
+    :param path: snapshot saved by joblib, absolute or relative to the project
+    :return: the unpickled snapshot (a dict with the policy, env, baseline... of the experiment)
+    """
+    return _cached(joblib.load, path)
+
+
+def load_json(path):
+    return _cached(_load_json, path)
+
+
+def load_npz(path):
+    """
+    :return: dict of the arrays in the npz file, by name
+    """
+    return _cached(_load_npz, path)
+
+
+def load_policy_args(pkl_path=None, json_path=None):
+    """
+    :param pkl_path: snapshot of the pre-training experiment
+    :param json_path: json of the pre-training experiment (or written by export_policy). Used if given
+    :return: dict of the POLICY_ARGS of the pre-trained policy, by name
+    """
+    if json_path:
+        policy_json = load_json(json_path)['json_args']['policy']
+        # the json of an experiment only has the args given explicitly to the policy
+        return dict((k, policy_json[k]) for k in POLICY_ARGS if k in policy_json)
+    elif pkl_path:
+        return _cached(_load_pkl_policy, pkl_path)[0]
+    raise ValueError("No path to file given")
+
+
+def load_policy_params(pkl_path=None, npz_path=None):
+    """
+    :param pkl_path: snapshot of the pre-training experiment
+    :param npz_path: params exported by export_policy. Used if given
+    :return: dict of the values of the params of the pre-trained policy, by param name (as taken by set_params_snn)
+    """
+    if npz_path:
+        return load_npz(npz_path)
+    elif pkl_path:
+        return _cached(_load_pkl_policy, pkl_path)[1]
+    raise ValueError("No path to file given")
+
+
+def export_policy(pkl_path, npz_path=None, json_path=None):
+    """
+    Write the policy of a snapshot in the weights-only format, that is restored without unpickling any Theano graph.
+    :param pkl_path: snapshot of the pre-training experiment
+    :param npz_path: where to write the params. Defaults to <snapshot name>_policy.npz next to the snapshot
+    :param json_path: where to write the policy args. Defaults to <snapshot name>_policy.json next to the snapshot
+    :return: npz_path, json_path
+    """
+    prefix = os.path.splitext(os.path.join(config.PROJECT_PATH, pkl_path))[0] + '_policy'
+    npz_path = npz_path or prefix + '.npz'
+    json_path = json_path or prefix + '.json'
+    policy_args, params = _cached(_load_pkl_policy, pkl_path)
+    np.savez(npz_path, **params)
+    with open(json_path, 'w') as f:
+        # numpy scalars (e.g. a latent_dim read from a variant) are not serializable by json
+        json.dump(dict(json_args=dict(policy=policy_args)), f, indent=2, sort_keys=True,
+                  default=lambda o: o.item() if isinstance(o, np.generic) else list(o))
+    return npz_path, json_path
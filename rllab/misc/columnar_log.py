@@ -0,0 +1,122 @@
+"""
+Binary columnar progress log, written by the logger alongside the csv of the tabular outputs (progress.npcol next to
+progress.csv) and read by viskit without parsing any text.
+
+The file is append-only. It starts with MAGIC, followed by 8-byte aligned blocks, each with an 8-byte header
+(uint32 tag, uint32 n):
+- a schema block (SCHEMA_TAG, number of bytes of its payload) adds the keys of its payload (a JSON list, padded with
+  spaces) as the next columns, so that the keys can change across iterations;
+- a row block (ROW_TAG, number of columns) holds the float64 values of the first n columns for one iteration (NaN for
+  the keys not recorded in the iteration, or not numbers).
+All the rows written after a schema block have the same size, so the reader memory-maps the file and views every
+run of rows between two schema blocks as a single 2D array. A row truncated by a crash is ignored.
+"""
+import json
+import os
+
+import numpy as np
+
+MAGIC = b'RLPROG01'
+SCHEMA_TAG = 1
+ROW_TAG = 2
+
+_HEADER = np.dtype('<u4')
+_VALUE = np.dtype('<f8')
+
+
+def columnar_file(file_name):
+    """
+    :return: path of the columnar log written alongside the csv file_name
+    """
+    return os.path.splitext(file_name)[0] + '.npcol'
+
+
+def _header(tag, n):
+    return np.array([tag, n], dtype=_HEADER).tobytes()
+
+
+def _to_float(val):
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class ColumnarWriter(object):
+    def __init__(self, file_name):
+        self._f = open(file_name, 'wb')
+        self._f.write(MAGIC)
+        self._f.flush()
+        self._columns = dict()
+
+    def write_row(self, entries):
+        """
+        :param entries: list of (key, value) tabular entries of one iteration (the last value of a repeated key is kept)
+        """
+        new_keys = []
+        for key, _ in entries:
+            if key not in self._columns:
+                self._columns[key] = len(self._columns)
+                new_keys.append(key)
+        if new_keys:
+            payload = json.dumps(new_keys).encode('utf-8')
+            payload += b' ' * (-len(payload) % 8)
+            self._f.write(_header(SCHEMA_TAG, len(payload)) + payload)
+        values = np.full(len(self._columns), np.nan, dtype=_VALUE)
+        for key, val in entries:
+            values[self._columns[key]] = _to_float(val)
+        self._f.write(_header(ROW_TAG, len(values)) + values.tobytes())
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+def read_columns(file_name):
+    """
+    :return: dict of the keys of the columnar log to their (n_rows,) float64 values (NaN in the rows written before a
+    key was first recorded)
+    """
+    if os.path.getsize(file_name) <= len(MAGIC):
+        return dict()
+    buf = np.memmap(file_name, dtype=np.uint8, mode='r')
+    if bytes(buf[:len(MAGIC)]) != MAGIC:
+        raise IOError("%s is not a columnar progress log" % file_name)
+    keys = []
+    # runs of rows with the same number of columns: (view of their values, number of columns)
+    segments = []
+    offset = len(MAGIC)
+    while offset + 8 <= len(buf):
+        tag, n = buf[offset:offset + 8].view(_HEADER)
+        if tag == SCHEMA_TAG:
+            end = offset + 8 + int(n)
+            if end > len(buf):
+                break
+            keys.extend(json.loads(bytes(buf[offset + 8:end]).decode('utf-8')))
+            offset = end
+        elif tag == ROW_TAG:
+            n = int(n)
+            width = 8 * (n + 1)
+            n_rows = (len(buf) - offset) // width
+            if n_rows == 0:
+                break
+            rows = buf[offset:offset + n_rows * width].view(_VALUE).reshape(n_rows, n + 1)
+            # the run ends at the first row whose header differs (the header of the next schema block)
+            header = buf[offset:offset + 8].view('<u8')[0]
+            ends = np.flatnonzero(rows[:, 0].view('<u8') != header)
+            if len(ends):
+                n_rows = int(ends[0])
+            segments.append((rows[:n_rows, 1:], n))
+            offset += n_rows * width
+        else:
+            break
+    n_total = sum(len(values) for values, _ in segments)
+    columns = dict((key, np.full(n_total, np.nan)) for key in keys)
+    start = 0
+    for values, n in segments:
+        # copied out of the memory map: the file may be truncated if the experiment is run again
+        for key, column in zip(keys[:n], values.T):
+            columns[key][start:start + len(values)] = column
+        start += len(values)
+    del buf
+    return columns
@@ -0,0 +1,210 @@
+"""
+Registry of the compiled Theano functions, so that a graph is optimized and compiled only once: the same policy is
+rebuilt by every sampler worker (and by every run of an experiment), and compiles the same functions.
+
+A function is identified by the signature of its graph: the ops, the types of the inputs and outputs, the shapes of the
+shared variables and the values of the constants. It is kept in memory, and pickled in config.THEANO_FUNCTION_CACHE_DIR
+(if set) for the other processes. Finding a function in the registry only binds a copy of it to the shared variables
+of the new graph (e.g. the params of the new policy), without optimizing nor compiling anything.
+"""
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from rllab import config
+from rllab.misc import logger
+from rllab.misc.tabulate import tabulate
+
+_functions = dict()
+# compile_function label -> dict with the number of functions compiled, found in memory and loaded from disk, and the
+# total time spent getting them
+_stats = OrderedDict()
+
+
+def _op_signature(op):
+    props = getattr(op, '__props__', None)
+    if props is None:
+        return '%s.%s:%s' % (type(op).__module__, type(op).__name__, op)
+    return '%s.%s(%s)' % (type(op).__module__, type(op).__name__,
+                          ', '.join('%s=%s' % (p, getattr(op, p)) for p in props))
+
+
+def _leaf_signature(var, shared_inputs):
+    from theano.gof import Constant
+    if var in shared_inputs:
+        return 'shared %s %s' % (var.type, np.shape(var.get_value(borrow=True)))
+    elif isinstance(var, Constant):
+        data = var.data
+        if isinstance(data, np.ndarray):
+            data = '%s %s %s' % (data.dtype, data.shape, hashlib.sha1(np.ascontiguousarray(data)).hexdigest())
+        return 'constant %s %r' % (var.type, data)
+    return 'free %s' % var.type
+
+
+def graph_signature(inputs, outputs, updates=None, givens=None, **kwargs):
+    """
+    :return: hex digest identifying the function theano.function would compile from these args, and the shared
+    variables of its graph in the order of the implicit inputs of that function (the ones to bind a copy to)
+    """
+    import theano
+    from theano.compile.pfunc import rebuild_collect_shared
+    from theano.gof.graph import io_toposort
+
+    if outputs is None:
+        out_list = []
+    elif isinstance(outputs, (list, tuple)):
+        out_list = list(outputs)
+    else:
+        out_list = [outputs]
+    # the same collection of the shared variables and updates as done by pfunc when compiling
+    input_vars, cloned_outputs, (_, _, update_expr, shared_inputs) = rebuild_collect_shared(
+        out_list, list(inputs), replace=givens, updates=updates, rebuild_strict=True, copy_inputs_over=True)
+    shared_set = set(shared_inputs)
+
+    ids = dict()
+    lines = [
+        theano.__version__, sys.version, theano.config.floatX, theano.config.device, str(theano.config.mode),
+        theano.config.optimizer, theano.config.linker, repr(sorted(kwargs.items())),
+        'outputs is a %s' % type(outputs).__name__,
+    ]
+
+    def var_id(var):
+        if var not in ids:
+            ids[var] = len(ids)
+            if var.owner is None:
+                lines.append('%d: %s' % (ids[var], _leaf_signature(var, shared_set)))
+        return ids[var]
+
+    for var in input_vars:
+        lines.append('%d: input %s' % (var_id(var), var.type))
+    for var in shared_inputs:
+        var_id(var)
+    update_outputs = [expr for _, expr in update_expr]
+    for node in io_toposort(input_vars + shared_inputs, cloned_outputs + update_outputs):
+        in_ids = [var_id(var) for var in node.inputs]
+        out_ids = ['%d %s' % (var_id(var), var.type) for var in node.outputs]
+        lines.append('%s %s -> %s' % (_op_signature(node.op), in_ids, out_ids))
+    lines.append('outputs %s' % [var_id(var) for var in cloned_outputs])
+    lines.append('updates %s' % [(var_id(var), var_id(expr)) for var, expr in update_expr])
+    return hashlib.sha1('\n'.join(lines).encode('utf-8')).hexdigest(), shared_inputs
+
+
+def _bind(function, shared_inputs):
+    """
+    :return: a copy of the registered function computing with the given shared variables instead of its own ones
+    """
+    function_shared = [i.variable for i in function.maker.inputs if getattr(i, 'shared', False)]
+    if len(function_shared) != len(shared_inputs):
+        return None
+    return function.copy(swap=dict(zip(function_shared, shared_inputs)))
+
+
+def _cache_file(key):
+    cache_dir = getattr(config, 'THEANO_FUNCTION_CACHE_DIR', None)
+    if not cache_dir:
+        return None
+    return os.path.join(cache_dir, key + '.pkl')
+
+
+def _load(key):
+    filename = _cache_file(key)
+    if filename is None or not os.path.exists(filename):
+        return None
+    try:
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:  # e.g. written by another version of the code. It is compiled and saved again
+        logger.log("Could not load the compiled function %s: %s" % (filename, e))
+        return None
+
+
+def _save(key, function):
+    filename = _cache_file(key)
+    if filename is None:
+        return
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        # written under another name first: the workers may be reading the file at the same time
+        fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(filename), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(function, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, filename)
+    except Exception as e:  # some ops cannot be pickled: the function is only kept in memory
+        logger.log("Could not save the compiled function %s: %s" % (filename, e))
+
+
+def _record(label, source, seconds):
+    stats = _stats.setdefault(label, dict(compiled=0, memory=0, disk=0, time=0.))
+    stats[source] += 1
+    stats['time'] += seconds
+
+
+def function(label, inputs, outputs=None, updates=None, givens=None, **kwargs):
+    """
+    Same as theano.function, but looks for the function in the registry before compiling it.
+    :param label: name of the function in the compile-time report (see log_compile_stats)
+    """
+    import theano
+
+    start = time.time()
+    key = shared_inputs = None
+    # functions compiled with other objects (e.g. a mode) cannot be identified reliably
+    if all(v is None or isinstance(v, (str, bool, int, float)) for v in kwargs.values()):
+        try:
+            key, shared_inputs = graph_signature(inputs, outputs, updates=updates, givens=givens, **kwargs)
+        except Exception as e:
+            logger.log("Could not compute the signature of %s, compiling it: %s" % (label, e))
+    if key is not None:
+        source = 'memory'
+        registered = _functions.get(key)
+        if registered is None:
+            source = 'disk'
+            registered = _load(key)
+        if registered is not None:
+            _functions[key] = registered
+            ret = _bind(registered, shared_inputs)
+            if ret is not None:
+                _record(label, source, time.time() - start)
+                return ret
+    ret = theano.function(inputs=inputs, outputs=outputs, updates=updates, givens=givens, **kwargs)
+    if key is not None:
+        _functions[key] = ret
+        _save(key, ret)
+    _record(label, 'compiled', time.time() - start)
+    return ret
+
+
+def compile_stats():
+    """
+    :return: dict of the compile stats of this process, by label
+    """
+    return OrderedDict((label, dict(stats)) for label, stats in _stats.items())
+
+
+def log_compile_stats(worker_stats=()):
+    """
+    Log the time spent getting each function, in this process and summed over the workers.
+    :param worker_stats: list of the compile_stats of the workers
+    """
+    labels = list(_stats.keys())
+    for stats in worker_stats:
+        labels += [label for label in stats if label not in labels]
+    rows = []
+    for label in labels:
+        stats = _stats.get(label, dict(compiled=0, memory=0, disk=0, time=0.))
+        row = [label, stats['compiled'], stats['memory'] + stats['disk'], '%.2f' % stats['time']]
+        if worker_stats:
+            per_worker = [w.get(label, dict(compiled=0, memory=0, disk=0, time=0.)) for w in worker_stats]
+            row += [sum(s['compiled'] for s in per_worker), sum(s['memory'] + s['disk'] for s in per_worker),
+                    '%.2f' % sum(s['time'] for s in per_worker)]
+        rows.append(row)
+    headers = ['function', 'compiled', 'reused', 'time (s)']
+    if worker_stats:
+        headers += ['workers compiled', 'workers reused', 'workers time (s)']
+    logger.log("Compile times:\n" + tabulate(rows, headers=headers))
@@ -0,0 +1,62 @@
+"""
+Index of the experiments of a data root (e.g. data/local/<exp_prefix>): a manifest file in the root, to which a line is
+appended when one of its runs starts and when it ends, so that viskit finds the runs without walking their folders
+(with their snapshots), and does not check the files of the finished runs it already read.
+
+Each line of the manifest is a JSON dict with the exp_name (the name of the folder of the run in the root), its status
+(RUNNING, FINISHED or FAILED) and the time the run started. The last line of a run is its current entry.
+"""
+import datetime
+import json
+import os.path as osp
+
+import dateutil.tz
+
+MANIFEST_FILE = "manifest.jsonl"
+
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+
+# log dir -> start time of the run in this process
+_start_times = dict()
+
+
+def record_run(log_dir, status):
+    """
+    Append the entry of the run logging to log_dir to the manifest of its parent folder
+    :param status: RUNNING when it starts, FINISHED or FAILED when it ends
+    """
+    log_dir = osp.abspath(log_dir)
+    if status == RUNNING:
+        _start_times[log_dir] = datetime.datetime.now(dateutil.tz.tzlocal()).isoformat()
+    entry = dict(exp_name=osp.basename(log_dir), status=status, start_time=_start_times.get(log_dir))
+    # a single write of a whole line, for the concurrent runs of the root not to interleave their lines
+    with open(osp.join(osp.dirname(log_dir), MANIFEST_FILE), 'a') as f:
+        f.write(json.dumps(entry, sort_keys=True) + '\n')
+
+
+def read_index(root):
+    """
+    :return: dict of the exp_names of the runs in the manifest of the root to their current entry (empty if there is
+    no manifest)
+    """
+    manifest_path = osp.join(root, MANIFEST_FILE)
+    entries = dict()
+    if not osp.exists(manifest_path):
+        return entries
+    with open(manifest_path, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:  # line being written
+                continue
+            entries[entry["exp_name"]] = entry
+    return entries
+
+
+def is_done(entry):
+    """
+    :return: whether the files of the run of the manifest entry will not change anymore
+    """
+    return entry is not None and entry["status"] in (FINISHED, FAILED)
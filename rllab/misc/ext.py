@@ -121,12 +121,18 @@ def scanr(f, l, base=None):
 
 
 def compile_function(inputs=None, outputs=None, updates=None, givens=None, log_name=None, **kwargs):
-    import theano
+    from rllab.misc import compile_cache
     if log_name:
         msg = Message("Compiling function %s" % log_name)
         msg.__enter__()
+        label = log_name
+    else:
+        # named after the line compiling it in the compile-time report
+        caller = sys._getframe(1)
+        label = "%s:%d" % (Path(caller.f_code.co_filename).name, caller.f_lineno)
     # print("input_ext", inputs)
-    ret = theano.function(
+    ret = compile_cache.function(
+        label,
         inputs=inputs,
         outputs=outputs,
         updates=updates,
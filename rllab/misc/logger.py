@@ -3,6 +3,7 @@ from enum import Enum
 from rllab.misc.tabulate import tabulate
 from rllab.misc.console import mkdir_p, colorize
 from rllab.misc.autoargs import get_all_parameters
+from rllab.misc.columnar_log import ColumnarWriter, columnar_file
 from contextlib import contextmanager
 import numpy as np
 import os
@@ -30,6 +31,8 @@ _tabular_outputs = []
 _text_fds = {}
 _tabular_fds = {}
 _tabular_header_written = set()
+# csv file name -> ColumnarWriter of the columnar log written alongside
+_tabular_columnar = {}
 
 _snapshot_dir = None
 _snapshot_mode = 'all'
@@ -67,14 +70,21 @@ def remove_text_output(file_name):
     _remove_output(file_name, _text_outputs, _text_fds)
 
 
-def add_tabular_output(file_name):
+def add_tabular_output(file_name, columnar=True):
+    """
+    :param columnar: whether to also write the columnar log of the tabular entries (see rllab.misc.columnar_log)
+    """
     _add_output(file_name, _tabular_outputs, _tabular_fds, mode='w')
+    if columnar and file_name not in _tabular_columnar:
+        _tabular_columnar[file_name] = ColumnarWriter(columnar_file(file_name))
 
 
 def remove_tabular_output(file_name):
     if _tabular_fds[file_name] in _tabular_header_written:
         _tabular_header_written.remove(_tabular_fds[file_name])
     _remove_output(file_name, _tabular_outputs, _tabular_fds)
+    if file_name in _tabular_columnar:
+        _tabular_columnar.pop(file_name).close()
 
 
 def set_snapshot_dir(dir_name):
@@ -139,6 +149,10 @@ def push_tabular_prefix(key):
     _tabular_prefix_str = ''.join(_tabular_prefixes)
 
 
+def get_tabular_prefix():
+    return _tabular_prefix_str
+
+
 def pop_tabular_prefix():
     del _tabular_prefixes[-1]
     global _tabular_prefix_str
@@ -204,6 +218,8 @@ def dump_tabular(*args, **kwargs):
                 _tabular_header_written.add(tabular_fd)
             writer.writerow(tabular_dict)
             tabular_fd.flush()
+        for columnar_writer in list(_tabular_columnar.values()):
+            columnar_writer.write_row(_tabular)
         del _tabular[:]
 
 
@@ -6,6 +6,11 @@ import theano.tensor as TT
 import theano.tensor.extra_ops
 from collections import OrderedDict
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
 
 def weighted_sample(weights, objects):
     """
@@ -111,6 +116,64 @@ def discount_cumsum(x, discount):
     return scipy.signal.lfilter([1], [1, float(-discount)], x[::-1], axis=0)[::-1]
 
 
+if numba is not None:
+    @numba.njit
+    def _discount_cumsum_n_numba(x, discount, ends):
+        y = np.empty(len(x))
+        start = 0
+        for end in ends:
+            acc = 0.
+            for t in range(end - 1, start - 1, -1):
+                acc = x[t] + discount * acc
+                y[t] = acc
+            start = end
+        return y
+
+
+def _nonempty_lengths(lengths):
+    lengths = np.asarray(lengths, dtype=int).reshape(-1)
+    return lengths[lengths > 0]
+
+
+def discount_cumsum_n(x, discount, lengths):
+    """
+    discount_cumsum of every path, computed at once
+    :param x: concatenation of the values of the paths
+    :param lengths: lengths of the paths (the paths of length 0 are dropped)
+    :return: concatenation of the discounted cumsums of the paths
+    """
+    lengths = _nonempty_lengths(lengths)
+    if len(lengths) == 0:
+        return np.zeros(0)
+    if numba is not None:
+        return _discount_cumsum_n_numba(np.asarray(x, dtype=np.float64), float(discount), np.cumsum(lengths))
+    # the paths as the rows of a matrix, padded with zeros after their end: filtering the reversed rows from the zeros
+    # gives the same values as the filtering of every path
+    dtype = x.dtype if np.issubdtype(x.dtype, np.floating) else np.float64
+    valid = np.arange(lengths.max()) < lengths[:, np.newaxis]
+    padded = np.zeros(valid.shape, dtype=dtype)
+    padded[valid] = x
+    return scipy.signal.lfilter([1], [1, float(-discount)], padded[:, ::-1], axis=1)[:, ::-1][valid]
+
+
+def gae_n(rewards, baselines, lengths, discount, gae_lambda):
+    """
+    Generalized advantage estimation of all the paths at once
+    :param rewards: concatenation of the rewards of the paths
+    :param baselines: concatenation of the baselines of the paths
+    :param lengths: lengths of the paths (the paths of length 0 are dropped)
+    :return: concatenations of the advantages and of the discounted returns of the paths
+    """
+    lengths = _nonempty_lengths(lengths)
+    if len(lengths) == 0:
+        return np.zeros(0), np.zeros(0)
+    # the baseline after the last step of a path is 0
+    next_baselines = np.append(baselines[1:], 0)
+    next_baselines[np.cumsum(lengths) - 1] = 0
+    deltas = rewards + discount * next_baselines - baselines
+    return discount_cumsum_n(deltas, discount * gae_lambda, lengths), discount_cumsum_n(rewards, discount, lengths)
+
+
 def discount_return(x, discount):
     return np.sum(x * (discount ** np.arange(len(x))))
 
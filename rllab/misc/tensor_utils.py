@@ -56,12 +56,49 @@ def flatten_first_axis_tensor_dict(tensor_dict):
     return ret
 
 
+def zeros_tensor(example, leading_shape):
+    """
+    Allocate zeros for a stack of tensors shaped like example, with leading_shape prepended to example's shape.
+    """
+    example = np.asarray(example)
+    return np.zeros(tuple(leading_shape) + example.shape, dtype=example.dtype)
+
+
+def zeros_tensor_dict(example_dict, leading_shape):
+    """
+    Same as zeros_tensor for a dictionary of {tensors or dictionary of tensors}, e.g. a single agent_info or env_info.
+    """
+    ret = dict()
+    for k, v in example_dict.items():
+        if isinstance(v, dict):
+            ret[k] = zeros_tensor_dict(v, leading_shape)
+        else:
+            ret[k] = zeros_tensor(v, leading_shape)
+    return ret
+
+
+def set_tensor_dict(tensor_dict, index, value_dict):
+    """
+    Write value_dict into tensor_dict[...][index], in place. Both dictionaries must have the same (nested) keys.
+    """
+    for k, v in value_dict.items():
+        if isinstance(v, dict):
+            set_tensor_dict(tensor_dict[k], index, v)
+        else:
+            tensor_dict[k][index] = v
+
+
 def high_res_normalize(probs):
     return [x / sum(map(float, probs)) for x in list(map(float, probs))]
 
 
 def stack_tensor_list(tensor_list):
-    return np.array(tensor_list)
+    try:
+        return np.array(tensor_list)
+    except ValueError:  # tensors of different shapes (e.g. the full_path of a last, shorter, high-level step)
+        stacked = np.empty(len(tensor_list), dtype=object)
+        stacked[:] = [np.asarray(x) for x in tensor_list]
+        return stacked
     # tensor_shape = np.array(tensor_list[0]).shape
     # if tensor_shape is tuple():
     #     return np.array(tensor_list)
@@ -121,6 +158,13 @@ def concat_tensor_dict_list(tensor_dict_list):
     return ret
 
 
+def split_tensor_list(tensor, lengths):
+    """
+    Inverse of concat_tensor_list: split the concatenated tensor into tensors of the given lengths (views of it)
+    """
+    return np.split(tensor, np.cumsum(lengths)[:-1], axis=0)
+
+
 def split_tensor_dict_list(tensor_dict):
     keys = list(tensor_dict.keys())
     ret = None
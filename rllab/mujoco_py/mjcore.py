@@ -28,12 +28,17 @@ class dict2(dict):
 
 class MjModel(MjModelWrapper):
 
-    def __init__(self, xml_path):
-        buf = create_string_buffer(1000)
-        model_ptr = mjlib.mj_loadXML(xml_path, None, buf, 1000)
-        if len(buf.value) > 0:
-            super(MjModel, self).__init__(None)
-            raise MjError(buf.value)
+    def __init__(self, xml_path=None, model_ptr=None):
+        """
+        :param xml_path: file of the model to compile
+        :param model_ptr: or pointer to an already compiled model, owned by the new MjModel (see copy and load_binary)
+        """
+        if model_ptr is None:
+            buf = create_string_buffer(1000)
+            model_ptr = mjlib.mj_loadXML(xml_path, None, buf, 1000)
+            if len(buf.value) > 0:
+                super(MjModel, self).__init__(None)
+                raise MjError(buf.value)
         super(MjModel, self).__init__(model_ptr)
         data_ptr = mjlib.mj_makeData(model_ptr)
         fields = ["nq","nv","na","nu","nbody","nmocap","nuserdata","nsensordata","njnt","ngeom","nsite","ncam","nlight","ntendon","nwrap","nM","njmax","nemax"]
@@ -83,6 +88,25 @@ class MjModel(MjModelWrapper):
     def step(self):
         mjlib.mj_step(self.ptr, self.data.ptr)
 
+    def copy(self):
+        """
+        :return: new model with the current values of the fields of this one, and its own data
+        """
+        return MjModel(model_ptr=mjlib.mj_copyModel(None, self.ptr))
+
+    def save_binary(self, path):
+        """
+        Save the compiled model in the MJB format, loaded without compiling by load_binary
+        """
+        mjlib.mj_saveModel(self.ptr, path, 0, None)
+
+    @classmethod
+    def load_binary(cls, path):
+        model_ptr = mjlib.mj_loadModel(path, 0, None)
+        if not model_ptr:
+            raise MjError("Could not load the model %s" % path)
+        return cls(model_ptr=model_ptr)
+
     def __del__(self):
         if self._wrapped is not None:
             # At the very end of the process, mjlib can be unloaded before we are deleted.
@@ -50,12 +50,12 @@ mjlib.mj_inverse.restype = None
 #mjlib.mj_defaultOption.restype = None
 #mjlib.mj_defaultVisual.argtypes = [POINTER(mjVisual)]
 #mjlib.mj_defaultVisual.restype = None
-#mjlib.mj_copyModel.argtypes = [POINTER(MJMODEL), POINTER(MJMODEL)]
-#mjlib.mj_copyModel.restype = POINTER(MJMODEL)
-#mjlib.mj_saveModel.argtypes = [POINTER(MJMODEL), String, c_int, POINTER(None)]
-#mjlib.mj_saveModel.restype = None
-#mjlib.mj_loadModel.argtypes = [String, c_int, POINTER(None)]
-#mjlib.mj_loadModel.restype = POINTER(MJMODEL)
+mjlib.mj_copyModel.argtypes = [POINTER(MJMODEL), POINTER(MJMODEL)]
+mjlib.mj_copyModel.restype = POINTER(MJMODEL)
+mjlib.mj_saveModel.argtypes = [POINTER(MJMODEL), String, c_int, POINTER(None)]
+mjlib.mj_saveModel.restype = None
+mjlib.mj_loadModel.argtypes = [String, c_int, POINTER(None)]
+mjlib.mj_loadModel.restype = POINTER(MJMODEL)
 mjlib.mj_deleteModel.argtypes = [POINTER(MJMODEL)]
 mjlib.mj_deleteModel.restype = None
 #mjlib.mj_sizeModel.argtypes = [POINTER(MJMODEL)]
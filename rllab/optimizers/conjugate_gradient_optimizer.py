@@ -1,23 +1,66 @@
 from rllab.misc import ext
 from rllab.misc import krylov
 from rllab.misc import logger
+from rllab.optimizers import sharded_fun
+from rllab.sampler.stateful_pool import singleton_pool
 from rllab.core.serializable import Serializable
 import theano.tensor as TT
 import theano
 import itertools
+import os
+import time
+import tracemalloc
 import numpy as np
 from rllab.misc.ext import sliced_fun
-from _ast import Num
+
+# number of samples on which the memory footprint of the functions is measured
+FOOTPRINT_PROBE_SIZE = 1000
+
+
+def _available_memory():
+    """
+    :return: memory available to the process in bytes (without swapping)
+    """
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except IOError:
+        pass
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+
+def _peak_memory(f, *args):
+    """
+    :return: peak of the memory allocated while evaluating f (the arrays allocated by numpy and by the compiled
+    functions), or None if it cannot be measured
+    """
+    if tracemalloc.is_tracing():  # the peak of the other user would be mixed up with this one
+        return None
+    tracemalloc.start()
+    try:
+        f(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
 
 
 class PerlmutterHvp(Serializable):
 
-    def __init__(self, num_slices=1):
+    def __init__(self, num_slices=1, parallel=False):
+        """
+        :param parallel: whether to evaluate the products on the workers of the sampler pool (if there are several),
+        each one on a shard of the inputs
+        """
         Serializable.quick_init(self, locals())
         self.target = None
         self.reg_coeff = None
         self.opt_fun = None
         self._num_slices = num_slices
+        self._parallel = parallel
+        self._sharded_Hx_plain = None
+        self._inputs_key = sharded_fun.unique_key("hvp_inputs")
 
     def update_opt(self, f, target, inputs, reg_coeff):
         self.target = target
@@ -44,12 +87,25 @@ class PerlmutterHvp(Serializable):
                 log_name="f_Hx_plain",
             ),
         )
+        self._sharded_Hx_plain = None
+
+    def set_num_slices(self, num_slices):
+        self._num_slices = num_slices
 
     def build_eval(self, inputs):
+        f_Hx_plain = sliced_fun(self.opt_fun["f_Hx_plain"], self._num_slices)
+        if self._parallel and sharded_fun.is_available():
+            if self._sharded_Hx_plain is None:
+                self._sharded_Hx_plain = sharded_fun.make_sharded("f_Hx_plain", self.opt_fun["f_Hx_plain"]) or False
+            if self._sharded_Hx_plain:
+                # sent once, for all the products of the conjugate gradient
+                sharded_fun.scatter(self._inputs_key, inputs)
+                sharded_Hx_plain = self._sharded_Hx_plain.sliced(self._inputs_key, self._num_slices)
+                f_Hx_plain = lambda _, xs: sharded_Hx_plain(xs)
+
         def eval(x):
             xs = tuple(self.target.flat_to_params(x, trainable=True))
-            ret = sliced_fun(self.opt_fun["f_Hx_plain"], self._num_slices)(
-                inputs, xs) + self.reg_coeff * x
+            ret = f_Hx_plain(inputs, xs) + self.reg_coeff * x
             return ret
 
         return eval
@@ -105,6 +161,9 @@ class FiniteDifferenceHvp(Serializable):
             f_Hx_plain=lambda: f_Hx_plain,
         )
 
+    def set_num_slices(self, num_slices):
+        self._num_slices = num_slices
+
     def build_eval(self, inputs):
         def eval(x):
             xs = tuple(self.target.flat_to_params(x, trainable=True))
@@ -131,7 +190,12 @@ class ConjugateGradientOptimizer(Serializable):
             max_backtracks=15,
             accept_violation=False,
             hvp_approach=None,
-            num_slices=1):
+            num_slices=1,
+            parallel=False,
+            hvp_samples=None,
+            cg_time_budget=None,
+            adaptive_slices=False,
+            slice_memory_fraction=0.5):
         """
 
         :param cg_iters: The number of CG iterations used to calculate A^-1 g
@@ -140,6 +204,15 @@ class ConjugateGradientOptimizer(Serializable):
         computation time for the descent direction dominates, this can greatly reduce the overall computation time.
         :param accept_violation: whether to accept the descent step if it violates the line search condition after
         exhausting all backtracking budgets
+        :param parallel: whether to evaluate the loss, the gradient and the Hessian-vector products on the batch on the
+        workers of the sampler pool (if there are several), each one on a shard of the samples
+        :param hvp_samples: number of samples to compute the Hessian-vector products on, whatever the size of the batch
+        (the smallest of the sizes given by subsample_factor, hvp_samples and cg_time_budget is used)
+        :param cg_time_budget: time in seconds for the conjugate gradient: the number of samples of the
+        Hessian-vector products is chosen from the time per sample they took in the previous optimization
+        :param adaptive_slices: whether to choose num_slices on every optimization, so that the evaluation of a slice
+        needs at most slice_memory_fraction of the available memory (according to the memory per sample of the
+        functions, measured once on a few samples)
         :return:
         """
         Serializable.quick_init(self, locals())
@@ -156,8 +229,18 @@ class ConjugateGradientOptimizer(Serializable):
         self._constraint_name = None
         self._accept_violation = accept_violation
         if hvp_approach is None:
-            hvp_approach = PerlmutterHvp(num_slices)
+            hvp_approach = PerlmutterHvp(num_slices, parallel=parallel)
         self._hvp_approach = hvp_approach
+        self._parallel = parallel
+        self._sharded_funs = dict()
+        self._inputs_key = sharded_fun.unique_key("inputs")
+        self._hvp_samples = hvp_samples
+        self._cg_time_budget = cg_time_budget
+        self._adaptive_slices = adaptive_slices
+        self._slice_memory_fraction = slice_memory_fraction
+        self._hvp_time_per_sample = None
+        self._sample_footprint = None
+        self._footprint_measured = False
 
     def update_opt(self, loss, target, leq_constraint, inputs, extra_inputs=None, constraint_name="constraint", *args,
                    **kwargs):
@@ -213,6 +296,22 @@ class ConjugateGradientOptimizer(Serializable):
                 log_name="f_loss_constraint",
             ),
         )
+        self._sharded_funs = dict()
+        self._sample_footprint = None
+        self._footprint_measured = False
+
+    def _sliced_fun(self, name, scattered):
+        """
+        :param scattered: whether the inputs were scattered to the workers
+        :return: sliced_fun of the function, evaluated by the workers on the scattered inputs if possible
+        """
+        if scattered:
+            if name not in self._sharded_funs:
+                self._sharded_funs[name] = sharded_fun.make_sharded(name, self._opt_fun[name])
+            if self._sharded_funs[name] is not None:
+                f = self._sharded_funs[name].sliced(self._inputs_key, self._num_slices)
+                return lambda sliced_inputs, non_sliced_inputs=None: f(non_sliced_inputs)
+        return sliced_fun(self._opt_fun[name], self._num_slices)
 
     def loss(self, inputs, extra_inputs=None):
         inputs = tuple(inputs)
@@ -226,55 +325,126 @@ class ConjugateGradientOptimizer(Serializable):
             extra_inputs = tuple()
         return sliced_fun(self._opt_fun["f_constraint"], self._num_slices)(inputs, extra_inputs)
 
+    def _hvp_subsample_factor(self, n_samples):
+        """
+        :return: fraction of the samples to compute the Hessian-vector products on
+        """
+        counts = [n_samples * self._subsample_factor]
+        if self._hvp_samples is not None:
+            counts.append(self._hvp_samples)
+        if self._cg_time_budget is not None and self._hvp_time_per_sample is not None:
+            # cg_iters products, and one more for the step size
+            counts.append(self._cg_time_budget / (self._hvp_time_per_sample * (self._cg_iters + 1)))
+        return min(1., max(1., min(counts)) / n_samples)
+
+    def _measure_sample_footprint(self, inputs, extra_inputs):
+        """
+        :return: peak memory per sample of the gradient and of the Hessian-vector product, measured on the first
+        samples (the constant part of the footprint is counted in it: it is an overestimate for small probes)
+        """
+        probe = [x[:FOOTPRINT_PROBE_SIZE] for x in inputs]
+        xs = tuple(self._target.flat_to_params(
+            np.zeros_like(self._target.get_param_values(trainable=True)), trainable=True))
+        peaks = [
+            _peak_memory(self._opt_fun["f_grad"], *(probe + list(extra_inputs))),
+            _peak_memory(self._hvp_approach.opt_fun["f_Hx_plain"], *(probe + list(extra_inputs) + list(xs))),
+        ]
+        if any(peak is None for peak in peaks):
+            return None
+        return max(peaks) / float(len(probe[0]))
+
+    def _choose_num_slices(self, inputs, extra_inputs):
+        # measured once for the compiled functions (under tracemalloc, which slows down their evaluation)
+        if not self._footprint_measured:
+            self._sample_footprint = self._measure_sample_footprint(inputs, extra_inputs)
+            self._footprint_measured = True
+            if self._sample_footprint is None:
+                logger.log("Could not measure the memory footprint of the functions: keeping %d slices" %
+                           self._num_slices)
+        if self._sample_footprint is None:
+            return
+        n_samples = len(inputs[0])
+        if self._parallel and sharded_fun.is_available():  # each process only evaluates its shard
+            n_samples = int(np.ceil(n_samples / float(singleton_pool.n_parallel)))
+        budget = self._slice_memory_fraction * _available_memory()
+        num_slices = int(max(1, np.ceil(n_samples * self._sample_footprint / budget)))
+        if self._parallel and sharded_fun.is_available():
+            num_slices *= singleton_pool.n_parallel
+        self._num_slices = num_slices
+        self._hvp_approach.set_num_slices(num_slices)
+
     def optimize(self, inputs, extra_inputs=None, subsample_grouped_inputs=None):
 
         inputs = tuple(inputs)
         if extra_inputs is None:
             extra_inputs = tuple()
 
-        if self._subsample_factor < 1:
+        n_samples = len(inputs[0])
+        subsample_factor = self._hvp_subsample_factor(n_samples)
+        if subsample_factor < 1:
             if subsample_grouped_inputs is None:
                 subsample_grouped_inputs = [inputs]
             subsample_inputs = tuple()
             for inputs_grouped in subsample_grouped_inputs:
                 n_samples = len(inputs_grouped[0])
                 inds = np.random.choice(
-                    n_samples, int(n_samples * self._subsample_factor), replace=False)
+                    n_samples, int(n_samples * subsample_factor), replace=False)
                 subsample_inputs += tuple([x[inds] for x in inputs_grouped])
         else:
             subsample_inputs = inputs
+        n_hvp_samples = len(subsample_inputs[0])
+
+        if self._adaptive_slices:
+            self._choose_num_slices(inputs, extra_inputs)
+        logger.log("%d samples, Hessian-vector products on %d of them, %d slices" %
+                   (len(inputs[0]), n_hvp_samples, self._num_slices))
+        logger.record_tabular('CG_HvpSamples', n_hvp_samples)
+        logger.record_tabular('CG_NumSlices', self._num_slices)
+
+        scattered = self._parallel and sharded_fun.is_available()
+        if scattered:
+            sharded_fun.scatter(self._inputs_key, inputs)
 
         logger.log("computing loss before")
-        loss_before = sliced_fun(self._opt_fun["f_loss"], self._num_slices)(
+        loss_before = self._sliced_fun("f_loss", scattered)(
             inputs, extra_inputs)
         logger.log("performing update")
         logger.log("computing descent direction")
 
-        flat_g = sliced_fun(self._opt_fun["f_grad"], self._num_slices)(
+        flat_g = self._sliced_fun("f_grad", scattered)(
             inputs, extra_inputs)
 
+        cg_start = time.time()
         Hx = self._hvp_approach.build_eval(subsample_inputs + extra_inputs)
+        n_hvps = [0]
+
+        def counted_Hx(x):
+            n_hvps[0] += 1
+            return Hx(x)
 
-        descent_direction = krylov.cg(Hx, flat_g, cg_iters=self._cg_iters)
+        descent_direction = krylov.cg(counted_Hx, flat_g, cg_iters=self._cg_iters)
 
         initial_step_size = np.sqrt(
             2.0 * self._max_constraint_val *
-            (1. / (descent_direction.dot(Hx(descent_direction)) + 1e-8))
+            (1. / (descent_direction.dot(counted_Hx(descent_direction)) + 1e-8))
         )
+        cg_time = time.time() - cg_start
+        self._hvp_time_per_sample = cg_time / (n_hvps[0] * n_hvp_samples)
         if np.isnan(initial_step_size):
             initial_step_size = 1.
         flat_descent_step = initial_step_size * descent_direction
 
         logger.log("descent direction computed")
 
+        line_search_start = time.time()
         prev_param = np.copy(self._target.get_param_values(trainable=True))
+        f_loss_constraint = self._sliced_fun("f_loss_constraint", scattered)
         n_iter = 0
         for n_iter, ratio in enumerate(self._backtrack_ratio ** np.arange(self._max_backtracks)):
             cur_step = ratio * flat_descent_step
             cur_param = prev_param - cur_step
             self._target.set_param_values(cur_param, trainable=True)
-            loss, constraint_val = sliced_fun(
-                self._opt_fun["f_loss_constraint"], self._num_slices)(inputs, extra_inputs)
+            loss, constraint_val = f_loss_constraint(inputs, extra_inputs)
             if loss < loss_before and constraint_val <= self._max_constraint_val:
                 break
         if (np.isnan(loss) or np.isnan(constraint_val) or loss >= loss_before or constraint_val >=
@@ -291,6 +461,13 @@ class ConjugateGradientOptimizer(Serializable):
                 logger.log(
                     "Violated because constraint %s is violated" % self._constraint_name)
             self._target.set_param_values(prev_param, trainable=True)
+        line_search_time = time.time() - line_search_start
         logger.log("backtrack iters: %d" % n_iter)
+        logger.log("time: %.2fs in the conjugate gradient (%d Hessian-vector products), %.2fs in the line search" %
+                   (cg_time, n_hvps[0], line_search_time))
+        logger.record_tabular('CG_Time', cg_time)
+        logger.record_tabular('CG_NumHvps', n_hvps[0])
+        logger.record_tabular('CG_LineSearchTime', line_search_time)
+        logger.record_tabular('CG_BacktrackIters', n_iter)
         logger.log("computing loss after")
         logger.log("optimization finished")
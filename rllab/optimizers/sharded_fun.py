@@ -0,0 +1,150 @@
+"""
+Data-parallel evaluation of compiled functions by the worker processes of the sampler pool (singleton_pool), e.g. the
+Hessian-vector products of the conjugate gradient on the whole batch of samples.
+
+The sliced inputs are split in one contiguous shard per worker, sent once with scatter. Every call of a function then
+only sends the values of its shared variables (the current params) and its non-sliced inputs: each worker evaluates
+the function on its shard with sliced_fun, and the results are averaged weighted by the sizes of the shards, as
+sliced_fun does over its slices.
+"""
+import itertools
+import pickle
+
+import numpy as np
+
+from rllab.misc import logger
+from rllab.misc.ext import sliced_fun
+from rllab.sampler import parallel_sampler
+from rllab.sampler.stateful_pool import singleton_pool
+
+_ids = itertools.count()
+
+
+def unique_key(name):
+    """
+    :return: a key for the functions or data of one object in the workers (e.g. of one of several optimizers)
+    """
+    return "%s_%d" % (name, next(_ids))
+
+
+def _shared_variables(function):
+    return [i.variable for i in function.maker.inputs if getattr(i, 'shared', False)]
+
+
+def _worker_set_function(G, name, function):
+    if not hasattr(G, "sharded_functions"):
+        G.sharded_functions = dict()
+    G.sharded_functions[name] = pickle.loads(function)
+
+
+def _worker_set_shard(G, key, shard):
+    if not hasattr(G, "sharded_data"):
+        G.sharded_data = dict()
+    if shard is None:
+        G.sharded_data.pop(key, None)
+    else:
+        # copied out of the memory-mapped files of the pool arguments
+        G.sharded_data[key] = [np.array(x) for x in shard]
+
+
+def _worker_call(G, name, key, shared_values, non_sliced_inputs, n_slices):
+    function = G.sharded_functions[name]
+    for var, value in zip(_shared_variables(function), shared_values):
+        var.set_value(value)
+    shard = G.sharded_data[key]
+    n = len(shard[0])
+    if n == 0:
+        return None, 0
+    return sliced_fun(function, n_slices)(shard, non_sliced_inputs), n
+
+
+def is_available():
+    """
+    :return: whether there are several workers to share the evaluations with (and they are not collecting paths)
+    """
+    return singleton_pool.n_parallel > 1 and not parallel_sampler.is_collecting()
+
+
+def scatter(key, sliced_inputs):
+    """
+    Send one shard of the sliced inputs to every worker, replacing the previous data of the same key.
+    :param sliced_inputs: list of arrays with the samples along their first dimension
+    """
+    n = len(sliced_inputs[0])
+    bounds = np.linspace(0, n, singleton_pool.n_parallel + 1).astype(int)
+    singleton_pool.run_each(
+        _worker_set_shard,
+        [(key, [x[start:end] for x in sliced_inputs]) for start, end in zip(bounds[:-1], bounds[1:])]
+    )
+
+
+def clear(key):
+    """
+    Free the shards of the key in the workers
+    """
+    singleton_pool.run_each(_worker_set_shard, [(key, None)] * singleton_pool.n_parallel)
+
+
+class ShardedFunction(object):
+    """
+    Compiled function held by every worker, evaluated on the shards of the data scattered to them.
+    """
+
+    def __init__(self, name, function):
+        """
+        :param name: name of the function (made unique in the workers)
+        :param function: compiled Theano function (it is pickled to the workers: pickle.PicklingError or TypeError
+        if it cannot be)
+        """
+        self.name = unique_key(name)
+        self._shared = _shared_variables(function)
+        self._pickled = pickle.dumps(function, protocol=pickle.HIGHEST_PROTOCOL)
+        self._pool = None
+
+    def _send(self):
+        # again when the workers are restarted
+        if self._pool is not singleton_pool.pool:
+            singleton_pool.run_each(_worker_set_function, [(self.name, self._pickled)] * singleton_pool.n_parallel)
+            self._pool = singleton_pool.pool
+
+    def sliced(self, key, n_slices=1):
+        """
+        :param key: key of the scattered data to evaluate the function on
+        :param n_slices: number of slices of the whole data: each worker slices its shard accordingly
+        :return: a function of the non-sliced inputs, returning the same as sliced_fun(function, n_slices) on the
+        scattered data
+        """
+        n_worker_slices = int(np.ceil(n_slices / float(singleton_pool.n_parallel)))
+
+        def sliced_f(non_sliced_inputs=None):
+            self._send()
+            non_sliced_inputs = list(non_sliced_inputs or [])
+            shared_values = [var.get_value(borrow=True) for var in self._shared]
+            results = singleton_pool.run_each(
+                _worker_call,
+                [(self.name, key, shared_values, non_sliced_inputs, n_worker_slices)] * singleton_pool.n_parallel
+            )
+            results = [(ret, n) for ret, n in results if n > 0]
+            n_total = sum(n for _, n in results)
+            example = results[0][0]
+            ret_lists = [list(ret) if isinstance(ret, (tuple, list)) else [ret] for ret, _ in results]
+            ret_vals = [sum(np.asarray(ret_list[i]) * n for ret_list, (_, n) in zip(ret_lists, results)) / n_total
+                        for i in range(len(ret_lists[0]))]
+            if not isinstance(example, (tuple, list)):
+                return ret_vals[0]
+            elif isinstance(example, tuple):
+                return tuple(ret_vals)
+            return ret_vals
+
+        return sliced_f
+
+
+def make_sharded(name, function):
+    """
+    :return: ShardedFunction of the function, or None (logged) if it cannot be sent to the workers
+    """
+    try:
+        return ShardedFunction(name, function)
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        logger.log("Cannot evaluate %s on the workers, it is evaluated in this process: %s" % (name, e))
+        return None
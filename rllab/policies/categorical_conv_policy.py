@@ -96,7 +96,7 @@ class CategoricalConvPolicy(StochasticPolicy, LasagnePowered):
     def get_actions(self, observations):
         flat_obs = self.observation_space.flatten_n(observations)
         probs = self._f_prob(flat_obs)
-        actions = list(map(self.action_space.weighted_sample, probs))
+        actions = list(self.action_space.weighted_sample_n(probs))
         return actions, dict(prob=probs)
 
     @property
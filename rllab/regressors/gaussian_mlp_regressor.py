@@ -226,7 +226,8 @@ class GaussianMLPRegressor(LasagnePowered):
                 inputs = [xs, ys]
             loss_before += self._optimizer.loss(inputs)
 
-            self._optimizer.optimize(inputs)
+            with logger.tabular_prefix(prefix):
+                self._optimizer.optimize(inputs)
             loss_after += self._optimizer.loss(inputs)
             if self._use_trust_region:
                 mean_kl += self._optimizer.constraint_val(inputs)
@@ -46,9 +46,6 @@ class BaseSampler(Sampler):
         self.algo = algo
 
     def process_samples(self, itr, paths):
-        baselines = []
-        returns = []
-
         if hasattr(self.algo.baseline, "predict_n"):
             all_path_baselines = self.algo.baseline.predict_n(paths)
         else:
@@ -56,28 +53,25 @@ class BaseSampler(Sampler):
 
         # print("all_path_baselines", all_path_baselines[0])
 
-        for idx, path in enumerate(paths):
-            path_baselines = np.append(all_path_baselines[idx], 0)
-            deltas = path["rewards"] + \
-                     self.algo.discount * path_baselines[1:] - \
-                     path_baselines[:-1]
-            path["advantages"] = special.discount_cumsum(
-                deltas, self.algo.discount * self.algo.gae_lambda)
-            path["returns"] = special.discount_cumsum(path["rewards"], self.algo.discount)
-            baselines.append(path_baselines[:-1])
-            returns.append(path["returns"])
-
-        ev = special.explained_variance_1d(
-            np.concatenate(baselines),
-            np.concatenate(returns)
-        )
+        # advantages and returns of all the paths at once, the ones of every path being views of them
+        lengths = [len(path["rewards"]) for path in paths]
+        all_baselines = tensor_utils.concat_tensor_list(all_path_baselines)
+        all_rewards = tensor_utils.concat_tensor_list([path["rewards"] for path in paths])
+        all_advantages, all_returns = special.gae_n(
+            all_rewards, all_baselines, lengths, self.algo.discount, self.algo.gae_lambda)
+        for path, advantages, returns in zip(paths, tensor_utils.split_tensor_list(all_advantages, lengths),
+                                             tensor_utils.split_tensor_list(all_returns, lengths)):
+            path["advantages"] = advantages
+            path["returns"] = returns
+
+        ev = special.explained_variance_1d(all_baselines, all_returns)
 
         if not self.algo.policy.recurrent:
             observations = tensor_utils.concat_tensor_list([path["observations"] for path in paths])
             actions = tensor_utils.concat_tensor_list([path["actions"] for path in paths])
-            rewards = tensor_utils.concat_tensor_list([path["rewards"] for path in paths])
-            returns = tensor_utils.concat_tensor_list([path["returns"] for path in paths])
-            advantages = tensor_utils.concat_tensor_list([path["advantages"] for path in paths])
+            rewards = all_rewards
+            returns = all_returns
+            advantages = all_advantages
             # print("env_infos", [path["env_infos"] for path in paths])
             # env_infos = tensor_utils.concat_tensor_dict_list([path["env_infos"] for path in paths])
             agent_infos = tensor_utils.concat_tensor_dict_list([path["agent_infos"] for path in paths])
@@ -168,6 +162,8 @@ class BaseSampler(Sampler):
             self.algo.baseline.fit_with_samples(paths, samples_data)
         else:
             self.algo.baseline.fit(paths)
+        if hasattr(self.algo.baseline, 'clear_features'):
+            self.algo.baseline.clear_features(paths)
         logger.log("fitted")
 
         logger.record_tabular('Iteration', itr)
@@ -1,9 +1,13 @@
-from rllab.sampler.utils import rollout
-from rllab.sampler.stateful_pool import singleton_pool, SharedGlobal
+from rllab.sampler.utils import rollout, rollout_lockstep_envs
+from rllab.sampler.stateful_pool import singleton_pool, SharedGlobal, SharedParamChannel
+from rllab.sampler import shared_paths as shared_paths_module
+from rllab.misc import compile_cache
 from rllab.misc import ext
 from rllab.misc import logger
 from rllab.misc import tensor_utils
+from collections import OrderedDict
 import pickle
+import threading
 import numpy as np
 
 
@@ -15,7 +19,18 @@ def _worker_init(G, id):
     G.worker_id = id
 
 
-def initialize(n_parallel):
+# folder where the workers write the paths they collect (see shared_paths), or None to pickle them back
+_shared_path_folder = None
+
+
+def initialize(n_parallel, shared_paths=False):
+    """
+    :param n_parallel: number of worker processes
+    :param shared_paths: if True and n_parallel > 1, the workers write the arrays of the paths they collect in shared
+    memory and only send back small descriptors, instead of pickling whole paths
+    """
+    global _shared_path_folder
+    _shared_path_folder = shared_paths_module.default_folder() if shared_paths and n_parallel > 1 else None
     singleton_pool.initialize(n_parallel)
     singleton_pool.run_each(_worker_init, [(id,) for id in range(singleton_pool.n_parallel)])
 
@@ -43,6 +58,7 @@ def _worker_populate_task(G, env, policy, low_policy, scope=None):
 
 def _worker_terminate_task(G, scope=None):
     G = _get_scoped_G(G, scope)
+    G.param_channel = None
     if getattr(G, "env", None):
         G.env.terminate()
         G.env = None
@@ -81,6 +97,22 @@ def terminate_task(scope=None):
         _worker_terminate_task,
         [(scope,)] * singleton_pool.n_parallel
     )
+    channel = _param_channels.pop(scope, None)
+    if channel is not None:
+        channel.close()
+
+
+def _worker_compile_stats(_):
+    return compile_cache.compile_stats()
+
+
+def worker_compile_stats():
+    """
+    :return: list of the compile stats of the workers (see compile_cache.compile_stats), empty if there are none
+    """
+    if singleton_pool.n_parallel > 1:
+        return singleton_pool.run_each(_worker_compile_stats)
+    return []
 
 
 def _worker_set_seed(_, seed):
@@ -107,48 +139,187 @@ def _worker_set_env_params(G, params, scope=None): # setting low policy params!
     G = _get_scoped_G(G, scope)
     G.env.set_param_values(params)
 
-def _worker_collect_one_path(G, max_path_length, scope=None):
+def _worker_set_param_channel(G, channel, scope=None):
     G = _get_scoped_G(G, scope)
+    G.param_channel = channel
+    G.param_version = None
+
+
+def _worker_pull_params(G):
+    """
+    Update the policy, low policy and env parameters from the shared channel, if the master published new ones
+    """
+    channel = getattr(G, "param_channel", None)
+    if channel is None:
+        return
+    G.param_version, params = channel.pull(G.param_version)
+    if params is None:
+        return
+    G.policy.set_param_values(params["policy"])
+    if "low_policy" in params:
+        G.low_policy.set_param_values(params["low_policy"])
+    if "env" in params:
+        G.env.set_param_values(params["env"])
+
+
+# channel used by sample_paths for each scope (master side only)
+_param_channels = dict()
+
+
+def _publish_params(params, scope=None):
+    """
+    Publish the parameters in the shared channel of the scope. A new channel is created, and sent once to every worker,
+    the first time or when the parameter sizes change.
+    """
+    channel = _param_channels.get(scope)
+    if channel is None or not channel.fits(params):
+        if channel is not None:
+            channel.close()
+        channel = SharedParamChannel([(k, np.size(v)) for k, v in params.items()])
+        _param_channels[scope] = channel
+        singleton_pool.run_each(
+            _worker_set_param_channel,
+            [(channel, scope)] * singleton_pool.n_parallel
+        )
+    channel.publish(params)
+
+
+def _worker_collect_one_path(G, max_path_length, scope=None, shared_path_folder=None):
+    G = _get_scoped_G(G, scope)
+    _worker_pull_params(G)
     path = rollout(G.env, G.policy, max_path_length)
     # print("path", path['rewards'])
+    if shared_path_folder is not None:
+        return shared_paths_module.export_path(path, shared_path_folder), len(path["rewards"])
     return path, len(path["rewards"])
 
 
+def _worker_collect_lockstep_paths(G, max_path_length, n_envs, scope=None, shared_path_folder=None):
+    G = _get_scoped_G(G, scope)
+    _worker_pull_params(G)
+    paths = rollout_lockstep_envs(G.env.lockstep_executor(n_envs), G.policy, max_path_length)
+    n_samples = sum(len(path["rewards"]) for path in paths)
+    if shared_path_folder is not None:
+        paths = [shared_paths_module.export_path(path, shared_path_folder) for path in paths]
+    return paths, n_samples
+
+
 def sample_paths(
         policy_params,
         max_samples,
         max_path_length=np.inf,
         low_policy_params=None,
         env_params=None,
-        scope=None):
+        scope=None,
+        show_prog_bar=True,
+        n_lockstep_envs=1):
     """
     :param policy_params: parameters for the policy. This will be updated on each worker process
     :param max_samples: desired maximum number of samples to be collected. The actual number of collected samples
     might be greater since all trajectories will be rolled out either until termination or until max_path_length is
     reached
     :param max_path_length: horizon / maximum length of a single trajectory
+    :param low_policy_params: parameters for the low policy (if any)
+    :param env_params: parameters for the env (if any). When there are several workers, the policy parameters and the
+    env parameters given as a numpy array are published in shared memory, and each worker pulls them before its next
+    path. Other env parameters (e.g. containing objects) are sent to every worker
+    :param n_lockstep_envs: if more than 1, every worker collects that many paths at once, stepping copies of its env
+    in lockstep (the env needs a lockstep_executor, e.g. HierarchizedSnnEnv)
     :return: a list of collected paths
     """
-    singleton_pool.run_each(
-        _worker_set_policy_params,
-        [(policy_params, scope)] * singleton_pool.n_parallel
-    )
-    if low_policy_params is not None:
+    if singleton_pool.n_parallel > 1:
+        shared_params = OrderedDict(policy=policy_params)
+        if low_policy_params is not None:
+            shared_params["low_policy"] = low_policy_params
+        if isinstance(env_params, np.ndarray):
+            shared_params["env"] = env_params
+            env_params = None
+        _publish_params(shared_params, scope)
+    else:
         singleton_pool.run_each(
-            _worker_set_low_policy_params,
-            [(low_policy_params, scope)] * singleton_pool.n_parallel
+            _worker_set_policy_params,
+            [(policy_params, scope)] * singleton_pool.n_parallel
         )
+        if low_policy_params is not None:
+            singleton_pool.run_each(
+                _worker_set_low_policy_params,
+                [(low_policy_params, scope)] * singleton_pool.n_parallel
+            )
     if env_params is not None:
         singleton_pool.run_each(
             _worker_set_env_params,
             [(env_params, scope)] * singleton_pool.n_parallel
         )
-    return singleton_pool.run_collect(
-        _worker_collect_one_path,
-        threshold=max_samples,
-        args=(max_path_length, scope),
-        show_prog_bar=True
-    )
+    if n_lockstep_envs > 1:
+        paths = singleton_pool.run_collect(
+            _worker_collect_lockstep_paths,
+            threshold=max_samples,
+            args=(max_path_length, n_lockstep_envs, scope, _shared_path_folder),
+            show_prog_bar=show_prog_bar
+        )
+        paths = [path for worker_paths in paths for path in worker_paths]
+    else:
+        paths = singleton_pool.run_collect(
+            _worker_collect_one_path,
+            threshold=max_samples,
+            args=(max_path_length, scope, _shared_path_folder),
+            show_prog_bar=show_prog_bar
+        )
+    if _shared_path_folder is not None:
+        paths = [shared_paths_module.load_path(path) for path in paths]
+    return paths
+
+
+# set while an AsyncSamplePaths is running: the workers are busy with it
+_collecting = threading.Event()
+
+
+def is_collecting():
+    """
+    :return: whether the workers are collecting paths in the background (see AsyncSamplePaths)
+    """
+    return _collecting.is_set()
+
+
+class AsyncSamplePaths(object):
+    """
+    sample_paths run in a thread of the master, so that the workers collect paths while the master does something else
+    (e.g. optimizes the policy with the previous paths). All the args are taken when it starts: the policy can change
+    in the meantime. Only one can run at a time, and nothing else should use the workers until its result is taken.
+    """
+
+    def __init__(self, sample_fn=None, **kwargs):
+        """
+        :param sample_fn: function collecting the paths, with the args of sample_paths (default: sample_paths)
+        :param kwargs: args of sample_fn
+        """
+        assert not is_collecting()
+        self._paths = None
+        self._error = None
+        self._sample_fn = sample_fn if sample_fn is not None else sample_paths
+        kwargs["show_prog_bar"] = False
+        self._thread = threading.Thread(target=self._run, kwargs=kwargs)
+        self._thread.daemon = True
+        _collecting.set()
+        self._thread.start()
+
+    def _run(self, **kwargs):
+        try:
+            self._paths = self._sample_fn(**kwargs)
+        except Exception as e:  # raised by result
+            self._error = e
+        finally:
+            _collecting.clear()
+
+    def result(self):
+        """
+        Wait for the end of the collection
+        :return: the collected paths
+        """
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._paths
 
 
 def truncate_paths(paths, max_samples):
@@ -0,0 +1,121 @@
+import numpy as np
+
+from rllab.misc import tensor_utils
+
+
+class PathBuffer(object):
+    """
+    Preallocated storage for the paths collected by one sampler. Every key of a path is a numpy column of `capacity`
+    rows: the observation and action columns are sized from the env spec, and the agent_info / env_info columns from
+    the first ones appended. get_path returns views into the columns, so nothing is stacked nor copied per path.
+
+    Completed paths are never overwritten: when the current block is full a new one is allocated (the views of the
+    paths already returned keep the old block alive) and only the path in progress is moved to it.
+    """
+
+    def __init__(self, env_spec, capacity=1000, extra_keys=()):
+        """
+        :param env_spec: spec of the env the paths come from
+        :param capacity: number of steps per block. Use at least max_path_length to never move a path in progress
+        :param extra_keys: names of other per-step entries appended with the `extras` kwarg of append (e.g.
+        "terminated"), each stored in its own column
+        """
+        self.env_spec = env_spec
+        self.capacity = int(capacity)
+        self.extra_keys = tuple(extra_keys)
+        self._columns = None
+        self._start = 0
+        self._end = 0
+
+    def _allocate(self, capacity, agent_info, env_info, extras):
+        columns = dict(
+            observations=np.zeros((capacity, self.env_spec.observation_space.flat_dim)),
+            actions=np.zeros((capacity, self.env_spec.action_space.flat_dim)),
+            rewards=np.zeros(capacity),
+            agent_infos=tensor_utils.zeros_tensor_dict(agent_info, (capacity,)),
+            env_infos=tensor_utils.zeros_tensor_dict(env_info, (capacity,)),
+        )
+        for k in self.extra_keys:
+            columns[k] = tensor_utils.zeros_tensor(extras[k], (capacity,))
+        return columns
+
+    def _move_to_new_block(self, agent_info, env_info, extras):
+        path_length = self._end - self._start
+        capacity = max(self.capacity, 2 * path_length)
+        columns = self._allocate(capacity, agent_info, env_info, extras)
+        if self._columns is not None:
+            _copy_rows(columns, self._columns, self._start, self._end)
+        self._columns = columns
+        self._start, self._end = 0, path_length
+
+    def append(self, observation, action, reward, agent_info, env_info, **extras):
+        """
+        Write one step of the path in progress. observation and action must be already flattened.
+        """
+        if self._columns is None or self._end == len(self._columns["rewards"]):
+            self._move_to_new_block(agent_info, env_info, extras)
+        idx = self._end
+        columns = self._columns
+        columns["observations"][idx] = observation
+        columns["actions"][idx] = action
+        columns["rewards"][idx] = reward
+        _set_tensor_dict_or_promote(columns["agent_infos"], idx, agent_info)
+        _set_tensor_dict_or_promote(columns["env_infos"], idx, env_info)
+        for k in self.extra_keys:
+            columns[k][idx] = extras[k]
+        self._end += 1
+
+    def __len__(self):
+        """
+        Number of steps of the path in progress
+        """
+        return self._end - self._start
+
+    def get_path(self):
+        """
+        :return: the path in progress, as a dict of views into the buffer (same keys as rollout). A new path starts.
+        """
+        start, end = self._start, self._end
+        if self._columns is None:
+            raise ValueError("No step was appended to the buffer")
+        path = _slice_tensor_dict(self._columns, start, end)
+        self._start = end
+        return path
+
+
+def _copy_rows(dst_dict, src_dict, start, end):
+    for k, v in src_dict.items():
+        if isinstance(v, dict):
+            _copy_rows(dst_dict[k], v, start, end)
+        else:
+            if v.dtype == object and dst_dict[k].dtype != object:
+                dst_dict[k] = np.empty(len(dst_dict[k]), dtype=object)
+            dst_dict[k][:end - start] = v[start:end]
+
+
+def _slice_tensor_dict(tensor_dict, start, end):
+    ret = dict()
+    for k, v in tensor_dict.items():
+        if isinstance(v, dict):
+            ret[k] = _slice_tensor_dict(v, start, end)
+        else:
+            ret[k] = v[start:end]
+    return ret
+
+
+def _set_tensor_dict_or_promote(tensor_dict, index, value_dict):
+    """
+    Like tensor_utils.set_tensor_dict, but a column receiving a value that does not match its shape (e.g. the ragged
+    last 'full_path' of a hierarchized env) is turned into an object column, as np.array does when stacking them.
+    """
+    for k, v in value_dict.items():
+        if isinstance(v, dict):
+            _set_tensor_dict_or_promote(tensor_dict[k], index, v)
+            continue
+        column = tensor_dict[k]
+        if column.dtype != object and np.shape(v) != column.shape[1:]:  # would be broadcast or fail otherwise
+            promoted = np.empty(len(column), dtype=object)
+            for i in range(len(column)):
+                promoted[i] = column[i]
+            tensor_dict[k] = column = promoted
+        column[index] = v
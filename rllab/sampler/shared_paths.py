@@ -0,0 +1,92 @@
+import os
+import tempfile
+from collections import namedtuple
+
+import numpy as np
+
+# where a numeric array of an exported path is stored in its file
+ArraySlot = namedtuple("ArraySlot", ["offset", "dtype", "shape"])
+
+_ALIGNMENT = 64
+
+
+class SharedPath(object):
+    """
+    Small descriptor of a path whose numeric arrays were written by a worker in a memory-mapped file (in /dev/shm when
+    available). Only the file name and the structure of the path are pickled back to the master, which maps the file
+    and gets the arrays as views into it, without copying them. This matters for hierarchical envs, where
+    env_infos['full_path'] holds all the low-level steps of the path.
+    """
+
+    def __init__(self, filename, tree):
+        """
+        :param filename: file holding the arrays
+        :param tree: the path, where every numeric array is replaced by its ArraySlot in the file
+        """
+        self.filename = filename
+        self.tree = tree
+
+    def load(self):
+        """
+        Map the file and rebuild the path. The file is unlinked right away: its memory is released when the arrays of
+        the path are garbage collected. Can be called only once.
+        """
+        data = np.memmap(self.filename, dtype=np.uint8, mode="r+")
+        os.unlink(self.filename)
+        return _load_tree(self.tree, data)
+
+
+def default_folder():
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def export_path(path, folder=None):
+    """
+    Write the numeric arrays of the path in a new file.
+    :param path: dict of arrays and nested dicts of arrays, as returned by rollout. Arrays of objects (e.g. ragged
+    full_path entries) and other values are kept in the descriptor and pickled as usual
+    :param folder: where to create the file. Defaults to /dev/shm if available, the temp folder otherwise
+    :return: a SharedPath, or the path itself if it has no numeric data
+    """
+    arrays = []
+    tree, size = _export_tree(path, arrays, 0)
+    if size == 0:
+        return path
+    fd, filename = tempfile.mkstemp(prefix="rllab_path_", dir=folder or default_folder())
+    os.close(fd)
+    data = np.memmap(filename, dtype=np.uint8, mode="w+", shape=(size,))
+    for arr, slot in arrays:
+        np.ndarray(slot.shape, dtype=slot.dtype, buffer=data, offset=slot.offset)[...] = arr
+    del data
+    return SharedPath(filename, tree)
+
+
+def load_path(path):
+    """
+    :param path: a SharedPath, or a path that was not exported (returned as is)
+    """
+    if isinstance(path, SharedPath):
+        return path.load()
+    return path
+
+
+def _export_tree(tree, arrays, offset):
+    if isinstance(tree, dict):
+        ret = dict()
+        for k, v in tree.items():
+            ret[k], offset = _export_tree(v, arrays, offset)
+        return ret, offset
+    if isinstance(tree, np.ndarray) and tree.dtype != object and tree.nbytes > 0:
+        slot = ArraySlot(offset, tree.dtype.str, tree.shape)
+        arrays.append((tree, slot))
+        offset += -(-tree.nbytes // _ALIGNMENT) * _ALIGNMENT
+        return slot, offset
+    return tree, offset
+
+
+def _load_tree(tree, data):
+    if isinstance(tree, dict):
+        return dict((k, _load_tree(v, data)) for k, v in tree.items())
+    if isinstance(tree, ArraySlot):
+        return np.ndarray(tree.shape, dtype=np.dtype(tree.dtype), buffer=data, offset=tree.offset)
+    return tree
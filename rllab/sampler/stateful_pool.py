@@ -2,8 +2,12 @@
 
 from joblib.pool import MemmapingPool
 import multiprocessing as mp
+from collections import OrderedDict
 from rllab.misc import logger
+import numpy as np
+import os
 import pyprind
+import tempfile
 import time
 import traceback
 import sys
@@ -37,12 +41,102 @@ class SharedGlobal(object):
     pass
 
 
+class SharedParamChannel(object):
+    """
+    Flat float64 buffer in shared memory (a memory-mapped file, in /dev/shm when available) through which the master
+    publishes parameter vectors that the workers pull on demand, instead of pickling them to every worker with run_each.
+    The buffer is split in named segments (e.g. "policy", "low_policy", "env") of fixed size.
+
+    The first entry is a version counter used as a seqlock: it is odd while the master is writing, and is increased by
+    2 on every publish. Readers retry when they see it odd or changed while copying, so they never get torn values.
+    Pickling the channel only sends the file name and the layout: this is how workers attach to it.
+    """
+
+    def __init__(self, sizes, folder=None):
+        """
+        :param sizes: dict (or list of pairs) of segment name -> number of floats
+        :param folder: where to create the file. Defaults to /dev/shm if available, the temp folder otherwise
+        """
+        if folder is None:
+            folder = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        self.layout = OrderedDict()
+        offset = 1  # entry 0 is the version
+        for name, size in OrderedDict(sizes).items():
+            self.layout[name] = (offset, int(size))
+            offset += int(size)
+        fd, self.filename = tempfile.mkstemp(prefix="rllab_params_", dir=folder)
+        os.close(fd)
+        self._data = np.memmap(self.filename, dtype=np.float64, mode="w+", shape=(offset,))
+        self._owner = True
+
+    def __getstate__(self):
+        return dict(filename=self.filename, layout=self.layout)
+
+    def __setstate__(self, d):
+        self.filename = d["filename"]
+        self.layout = d["layout"]
+        size = 1 + sum(size for _, size in self.layout.values())
+        self._data = np.memmap(self.filename, dtype=np.float64, mode="r", shape=(size,))
+        self._owner = False
+
+    def fits(self, params):
+        """
+        :return: whether params (dict of name -> flat values) matches the layout of this channel
+        """
+        return list(params.keys()) == list(self.layout.keys()) and \
+            all(np.size(v) == self.layout[k][1] for k, v in params.items())
+
+    @property
+    def version(self):
+        return int(self._data[0])
+
+    def publish(self, params):
+        """
+        Write new values for all the segments and bump the version. Only the master should call this.
+        :param params: dict of segment name -> flat values
+        """
+        version = self.version
+        self._data[0] = version + 1
+        for name, values in params.items():
+            offset, size = self.layout[name]
+            self._data[offset:offset + size] = np.asarray(values, dtype=np.float64).reshape(-1)
+        self._data[0] = version + 2
+
+    def pull(self, last_version=None):
+        """
+        :param last_version: version of the values the caller already has
+        :return: (version, dict of segment name -> copy of the values), or (last_version, None) if nothing new was
+        published since last_version
+        """
+        while True:
+            version = self.version
+            if version == last_version or version == 0:  # 0: nothing was published yet
+                return last_version, None
+            if version % 2 == 1:  # the master is writing
+                time.sleep(0)
+                continue
+            data = np.array(self._data[1:])
+            if self.version == version:
+                break
+        return version, OrderedDict(
+            (name, data[offset - 1:offset - 1 + size]) for name, (offset, size) in self.layout.items()
+        )
+
+    def close(self):
+        self._data = None
+        if self._owner and os.path.exists(self.filename):
+            os.remove(self.filename)
+
+
 class StatefulPool(object):
     def __init__(self):
         self.n_parallel = 1
         self.pool = None
         self.queue = None
         self.worker_queue = None
+        self.collect_queue = None
+        self.collect_counts = None
+        self.collect_slots = None
         self.G = SharedGlobal()
 
     def initialize(self, n_parallel):
@@ -52,10 +146,17 @@ class StatefulPool(object):
             self.pool.terminate()
             self.queue.close()
             self.worker_queue.close()
+            self.collect_queue.close()
+            self.pool = None
             self.G = SharedGlobal()
         if n_parallel > 1:
             self.queue = mp.Queue()
             self.worker_queue = mp.Queue()
+            # used by run_collect: the workers stream what they collect through collect_queue, and each one counts
+            # its increments in its own slot of collect_counts, so no lock is needed to update the total
+            self.collect_queue = mp.Queue()
+            self.collect_counts = mp.RawArray('d', n_parallel)
+            self.collect_slots = mp.Value('i', 0)
             self.pool = MemmapingPool(
                 self.n_parallel,
                 temp_folder="/tmp",
@@ -120,27 +221,30 @@ class StatefulPool(object):
         if args is None:
             args = tuple()
         if self.pool:
-            manager = mp.Manager()
-            counter = manager.Value('i', 0)
-            lock = manager.RLock()
-            results = self.pool.map_async(
+            for slot in range(self.n_parallel):
+                self.collect_counts[slot] = 0
+            async_results = self.pool.map_async(
                 _worker_run_collect,
-                [(collect_once, counter, lock, threshold, args)] * self.n_parallel
+                [(collect_once, threshold, args)] * self.n_parallel
             )
             if show_prog_bar:
                 pbar = ProgBarCounter(threshold)
-            last_value = 0
-            while True:
-                time.sleep(0.1)
-                with lock:
-                    if counter.value >= threshold:
-                        if show_prog_bar:
-                            pbar.stop()
-                        break
-                    if show_prog_bar:
-                        pbar.inc(counter.value - last_value)
-                    last_value = counter.value
-            return sum(results.get(), [])
+            results = []
+            n_finished = 0
+            # every task puts what it collects in the queue as soon as it is done, and None when it stops
+            while n_finished < self.n_parallel:
+                collected = self.collect_queue.get()
+                if collected is None:
+                    n_finished += 1
+                    continue
+                result, inc = collected
+                results.append(result)
+                if show_prog_bar:
+                    pbar.inc(inc)
+            if show_prog_bar:
+                pbar.stop()
+            async_results.get()  # raises the exception of a failed worker, if any
+            return results
         else:
             count = 0
             results = []
@@ -172,22 +276,35 @@ def _worker_run_each(all_args):
         raise Exception("".join(traceback.format_exception(*sys.exc_info())))
 
 
+_worker_slot = None
+
+
+def _get_worker_slot():
+    """
+    Index of this worker process in singleton_pool.collect_counts, assigned the first time it is needed
+    """
+    global _worker_slot
+    if _worker_slot is None:
+        with singleton_pool.collect_slots.get_lock():
+            _worker_slot = singleton_pool.collect_slots.value
+            singleton_pool.collect_slots.value += 1
+        assert _worker_slot < len(singleton_pool.collect_counts)
+    return _worker_slot
+
+
 def _worker_run_collect(all_args):
     try:
-        collect_once, counter, lock, threshold, args = all_args
-        collected = []
-        while True:
-            with lock:
-                if counter.value >= threshold:
-                    return collected
+        collect_once, threshold, args = all_args
+        counts = singleton_pool.collect_counts
+        slot = _get_worker_slot()
+        while sum(counts) < threshold:
             result, inc = collect_once(singleton_pool.G, *args)
-            collected.append(result)
-            with lock:
-                counter.value += inc
-                if counter.value >= threshold:
-                    return collected
+            counts[slot] += inc  # only this worker writes its slot
+            singleton_pool.collect_queue.put((result, inc))
     except Exception:
         raise Exception("".join(traceback.format_exception(*sys.exc_info())))
+    finally:
+        singleton_pool.collect_queue.put(None)
 
 
 def _worker_run_map(all_args):
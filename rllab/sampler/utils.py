@@ -4,7 +4,14 @@ import time
 
 
 def rollout(env, agent, max_path_length=np.inf, animated=False, speedup=1,
-            always_return_paths=False):
+            always_return_paths=False, path_buffer=None):
+    """
+    :param path_buffer: optional PathBuffer. If given, the steps are written into it instead of being appended to lists
+    and the returned path holds views into the buffer
+    """
+    if path_buffer is not None:
+        return _rollout_to_buffer(env, agent, path_buffer, max_path_length=max_path_length, animated=animated,
+                                  always_return_paths=always_return_paths)
     observations = []
     actions = []
     rewards = []
@@ -46,3 +53,64 @@ def rollout(env, agent, max_path_length=np.inf, animated=False, speedup=1,
         agent_infos=tensor_utils.stack_tensor_dict_list(agent_infos),
         env_infos=tensor_utils.stack_tensor_dict_list(env_infos),
     )
+
+
+def _rollout_to_buffer(env, agent, path_buffer, max_path_length=np.inf, animated=False, always_return_paths=False):
+    o = env.reset()
+    agent.reset()
+    path_length = 0
+    if animated:
+        env.render()
+    while path_length < max_path_length:
+        a, agent_info = agent.get_action(o)
+        next_o, r, d, env_info = env.step(a)
+        path_buffer.append(env.observation_space.flatten(o), env.action_space.flatten(a), r, agent_info, env_info)
+        path_length += 1
+        if d:
+            break
+        o = next_o
+        if animated:
+            env.render()
+    path = path_buffer.get_path()
+    if animated and not always_return_paths:
+        return
+    return path
+
+
+def rollout_lockstep_envs(vec_env, agent, max_path_length=np.inf):
+    """
+    One path of every env of the executor, all stepped in lockstep: the agent gets the actions of all the envs that
+    are not done with a single get_actions call per step
+    :param vec_env: executor with reset() and step_envs(indices, actions) (e.g. HierarchizedSnnVecEnvExecutor)
+    :return: list of the num_envs paths, as returned by rollout
+    """
+    n = vec_env.num_envs
+    obs = vec_env.reset()
+    agent.reset()
+    steps = [[] for _ in range(n)]
+    alive = np.arange(n)
+    path_length = 0
+    while path_length < max_path_length and len(alive):
+        actions, agent_infos = agent.get_actions([obs[idx] for idx in alive])
+        next_obs, rewards, dones, env_infos = vec_env.step_envs(alive, actions)
+        still_alive = []
+        for k, idx in enumerate(alive):
+            agent_info = dict((key, val[k]) for key, val in agent_infos.items())
+            steps[idx].append((vec_env.observation_space.flatten(obs[idx]), vec_env.action_space.flatten(actions[k]),
+                               rewards[k], agent_info, env_infos[k]))
+            if not dones[k]:
+                obs[idx] = next_obs[k]
+                still_alive.append(idx)
+        alive = np.asarray(still_alive, dtype=int)
+        path_length += 1
+    paths = []
+    for env_steps in steps:
+        observations, actions, rewards, agent_infos, env_infos = zip(*env_steps)
+        paths.append(dict(
+            observations=tensor_utils.stack_tensor_list(observations),
+            actions=tensor_utils.stack_tensor_list(actions),
+            rewards=tensor_utils.stack_tensor_list(rewards),
+            agent_infos=tensor_utils.stack_tensor_dict_list(agent_infos),
+            env_infos=tensor_utils.stack_tensor_dict_list(env_infos),
+        ))
+    return paths
@@ -48,6 +48,13 @@ class Discrete(Space):
     def weighted_sample(self, weights):
         return special.weighted_sample(weights, range(self.n))
 
+    def weighted_sample_n(self, weights_matrix):
+        """
+        :param weights_matrix: (N, n) array with the weights of each sample in a row
+        :return: (N,) array of samples. Same as calling weighted_sample on each row, with the same random numbers
+        """
+        return special.weighted_sample_n(np.asarray(weights_matrix), np.arange(self.n))
+
     @property
     def default_value(self):
         return 0
@@ -1,11 +1,14 @@
 import csv
 from rllab.misc import ext
+from rllab.misc import columnar_log
+from rllab.misc import experiment_index
 import os
 import numpy as np
 import base64
 import pickle
 import json
 import itertools
+from concurrent.futures import ThreadPoolExecutor
 # import ipywidgets
 # import IPython.display
 # import plotly.offline as po
@@ -38,6 +41,11 @@ def load_progress(progress_csv_path):
     return entries
 
 
+def load_progress_columnar(progress_npcol_path):
+    print("Reading %s" % progress_npcol_path)
+    return columnar_log.read_columns(progress_npcol_path)
+
+
 def to_json(stub_object):
     from rllab.misc.instrument import StubObject
     from rllab.misc.instrument import StubAttr
@@ -93,30 +101,97 @@ def lookup(d, keys):
     return d
 
 
-def load_exps_data(exp_folder_paths,disable_variant=False):
+# experiment folder -> (stats of its files, manifest entry, AttrDict of the experiment), to only read again the
+# changed experiments
+_exps_cache = dict()
+
+
+def _file_stat(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime, stat.st_size
+    except OSError:
+        return None
+
+
+def load_exp_data(exp_path, disable_variant=False, index_entry=None):
+    """
+    :return: AttrDict of the progress and params of the experiment, read from its columnar progress log if there is
+    one (else from its progress.csv). Cached until one of its files changes.
+    :param index_entry: entry of the experiment in the manifest of its root, if any: the files of a finished
+    experiment are not checked again until its entry changes
+    """
+    cached = _exps_cache.get(exp_path)
+    if cached is not None and cached[0][0] == disable_variant and experiment_index.is_done(index_entry) \
+            and cached[1] == index_entry:
+        return cached[2]
+    params_json_path = os.path.join(exp_path, "params.json")
+    variant_json_path = os.path.join(exp_path, "variant.json")
+    progress_csv_path = os.path.join(exp_path, "progress.csv")
+    progress_npcol_path = columnar_log.columnar_file(progress_csv_path)
+    stats = (disable_variant,) + tuple(_file_stat(path) for path in
+                                       [params_json_path, variant_json_path, progress_csv_path, progress_npcol_path])
+    if cached is not None and cached[0] == stats:
+        _exps_cache[exp_path] = (stats, index_entry, cached[2])
+        return cached[2]
+    if stats[-1] is not None:
+        progress = load_progress_columnar(progress_npcol_path)
+    else:
+        progress = load_progress(progress_csv_path)
+    if disable_variant:
+        params = load_params(params_json_path)
+    else:
+        try:
+            params = load_params(variant_json_path)
+        except IOError:
+            params = load_params(params_json_path)
+    exp_data = ext.AttrDict(progress=progress, params=params, flat_params=flatten_dict(params))
+    _exps_cache[exp_path] = (stats, index_entry, exp_data)
+    return exp_data
+
+
+def _is_exp(folder):
+    progress_csv_path = os.path.join(folder, "progress.csv")
+    return os.path.exists(progress_csv_path) or os.path.exists(columnar_log.columnar_file(progress_csv_path))
+
+
+def find_exps(folder):
+    """
+    :return: list of (folder of an experiment under the folder, its manifest entry or None). The runs in the manifest
+    of a folder are not walked into, nor the experiments (e.g. into their snapshots)
+    """
+    if _is_exp(folder):
+        return [(folder, None)]
+    index = experiment_index.read_index(folder)
+    exps = []
+    for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+        if not entry.is_dir():
+            continue
+        if entry.name in index:
+            exps.append((entry.path, index[entry.name]))
+        else:
+            exps += find_exps(entry.path)
+    return exps
+
+
+def load_exps_data(exp_folder_paths, disable_variant=False, n_workers=None):
+    """
+    :param n_workers: number of threads reading the experiments (default of ThreadPoolExecutor if None)
+    """
     exps = []
     for exp_folder_path in exp_folder_paths:
-        exps += [x[0] for x in os.walk(exp_folder_path)]
-    exps_data = []
-    for exp in exps:
+        exps += find_exps(exp_folder_path)
+
+    def load(exp):
         try:
-            exp_path = exp
-            params_json_path = os.path.join(exp_path, "params.json")
-            variant_json_path = os.path.join(exp_path, "variant.json")
-            progress_csv_path = os.path.join(exp_path, "progress.csv")
-            progress = load_progress(progress_csv_path)
-            if disable_variant:
-                params = load_params(params_json_path)
-            else:
-                try:
-                    params = load_params(variant_json_path)
-                except IOError:
-                    params = load_params(params_json_path)
-            exps_data.append(ext.AttrDict(
-                progress=progress, params=params, flat_params=flatten_dict(params)))
+            return load_exp_data(exp[0], disable_variant, exp[1])
         except IOError as e:
             print(e)
-    return exps_data
+            return None
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        exps_data = list(executor.map(load, exps))
+    return [exp_data for exp_data in exps_data if exp_data is not None]
 
 
 def smart_repr(x):
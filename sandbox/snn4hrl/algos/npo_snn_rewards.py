@@ -62,13 +62,25 @@ class BatchSampler_snn(BatchSampler):
         # print("path_length", len(path["rewards"]))
         return path, len(path["rewards"])
 
+    @overrides
+    def _sample_args(self):
+        # only the params of the policy are sent to the workers
+        return dict(
+            policy_params=self.algo.policy.get_param_values(),
+            max_samples=self.algo.batch_size,
+            max_path_length=self.algo.max_path_length,
+            scope=self.algo.scope,
+        )
+
+    @overrides
     def sample_paths(
             self,
             policy_params,
             max_samples,
             max_path_length=np.inf,
             env_params=None,
-            scope=None):
+            scope=None,
+            show_prog_bar=True):
         """
         :param policy_params: parameters for the policy. This will be updated on each worker process
         :param max_samples: desired maximum number of samples to be collected. The actual number of collected samples
@@ -92,23 +104,9 @@ class BatchSampler_snn(BatchSampler):
             self._worker_collect_one_path_snn,  # now this is defined in parallel_sampler also!
             threshold=max_samples,
             args=(max_path_length, self.switch_lat_every, scope),
-            show_prog_bar=True
+            show_prog_bar=show_prog_bar
         )
 
-    def obtain_samples(self, itr):
-        cur_params = self.algo.policy.get_param_values()
-        paths = self.sample_paths(  # use the sample function above
-            policy_params=cur_params,
-            max_samples=self.algo.batch_size,
-            max_path_length=self.algo.max_path_length,
-            scope=self.algo.scope,
-        )
-        if self.algo.whole_paths:
-            return paths
-        else:
-            paths_truncated = parallel_sampler.truncate_paths(paths, self.algo.batch_size)
-            return paths_truncated
-
     @overrides
     def process_samples(self, itr, paths):
         print("process paths in npo_snn_rewards")
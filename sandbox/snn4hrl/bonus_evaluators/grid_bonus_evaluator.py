@@ -3,13 +3,12 @@ import gc
 import os.path as osp
 from rllab.misc import logger
 from rllab.misc import tensor_utils
-import collections
-from functools import reduce
 import matplotlib as mpl
 
 mpl.use('Agg')
 import matplotlib.pyplot as plt
 from sandbox.snn4hrl.bonus_evaluators.base import BonusEvaluator
+from sandbox.snn4hrl.core.visitation_grid import VisitationGrid
 
 
 class GridBonusEvaluator(BonusEvaluator):
@@ -22,12 +21,12 @@ class GridBonusEvaluator(BonusEvaluator):
                  switch_lat_every=0,
                  survival_bonus=0,
                  dist_from_reset_bonus=0,
-                 start_bonus_after=0):
+                 start_bonus_after=0,
+                 accumulate=False):  # count the visitations of all the iterations, not only of the last paths
         self.mesh_density = mesh_density
         self.furthest = 0
-        self.visitation_all = np.zeros((1, 1), dtype=int)
         self.num_latents = 0  # this will simply not be used if there are no latents (the same for the following 2)
-        self.dict_visit = collections.OrderedDict()  # keys: latents (int), values: np.array with number of visitations
+        self.grid = VisitationGrid(self.furthest, mesh_density)  # number of visitations of every cell, by latent
         self.visitation_by_lat = np.zeros((1, 1), dtype=int)  # used to plot: matrix with a number for each lat/rep
         self.visitation_bonus = visitation_bonus
         self.snn_H_bonus = snn_H_bonus
@@ -36,192 +35,116 @@ class GridBonusEvaluator(BonusEvaluator):
         self.survival_bonus = survival_bonus
         self.dist_from_reset_bonus = dist_from_reset_bonus
         self.start_bonus_after = start_bonus_after
+        self.accumulate = accumulate
         # in case I'm gridding all the obs_dim (not just the com) --> for this I should use hashing, or too high dim
         if env_spec:
             obs_dim = env_spec.observation_space.flat_dim
 
-    def fit_before_process_samples(self, paths):
-        if 'env_infos' in paths[0].keys() and 'full_path' in paths[0]['env_infos'].keys():
-            paths = [tensor_utils.flatten_first_axis_tensor_dict(path['env_infos']['full_path']) for path in paths]
-
-        if 'env_infos' in list(paths[0].keys()) and 'com' in list(paths[0]['env_infos'].keys()):
-            coms_xy = [np.array(path['env_infos']['com'][:, 0:2]) for path in paths]  # no z coord
-        else:
-            coms_xy = [np.array(path['observations'][:, -3:-1])[:, [1, 0]] for path in paths]
-
-        if self.virtual_reset:  # change the com according to switch_lat_every or resets
-            for k, com_xy in enumerate(coms_xy):
-                i = self.start_bonus_after
-                while i < len(com_xy):
-                    start = i
-                    ori = paths[k]['env_infos']['ori'][i - self.start_bonus_after]
-                    c = np.float(np.cos(ori))
-                    s = np.float(np.sin(ori))
-                    R = np.matrix('{} {}; {} {}'.format(c, -s, s, c))
-                    while i < len(com_xy) and i - start < self.switch_lat_every - self.start_bonus_after:
-                        i += 1
-                    com_xy[start:i] = np.dot(R, com_xy[start:i].T).T
-                    xy = com_xy[start]
-                    com_xy[start:i] -= xy
-                    while i < len(com_xy) and i - start < self.switch_lat_every:  # skip some! compare to above
-                        i += 1
-
-        self.furthest = np.ceil(np.max(np.abs(np.concatenate(coms_xy))))
-        # now translate and scale the coms!
-        coms = [np.ceil((com_xy + self.furthest) * self.mesh_density).astype(int) for com_xy in coms_xy]
-
-        if 'agent_infos' in list(paths[0].keys()) and (('latents' in list(paths[0]['agent_infos'].keys())
-                                                        and np.size(paths[0]['agent_infos']['latents'])) or
-                                                           ('selectors' in list(paths[0]['agent_infos'].keys())
-                                                            and np.size(paths[0]['agent_infos']['selectors']))):
-            selectors_name = 'selectors' if 'selectors' in list(paths[0]['agent_infos'].keys()) else 'latents'
-            self.num_latents = np.size(paths[0]["agent_infos"][selectors_name][0])
-            # set all the labels for the latents and initialize the entries of dict_visit
-            size_grid = int(2 * self.furthest * self.mesh_density + 1)
-            for i in range(self.num_latents):  # use integer to define the latents
-                self.dict_visit[i] = np.zeros((size_grid, size_grid))
-            lats = [[np.nonzero(lat)[0][0] for lat in path['agent_infos'][selectors_name]]
-                    for path in paths]  # list of all lats by idx
-            for k, com in enumerate(coms):  # this iterates through paths
-                start = 0
-                for i, xy in enumerate(com):
-                    if i - start == self.switch_lat_every:
-                        start = i
-                    if i - start < self.start_bonus_after:
-                        pass
-                    else:
-                        self.dict_visit[lats[k][i]][tuple(xy)] += 1
-
-            self.visitation_all = reduce(np.add, [visit for visit in self.dict_visit.values()])
-
-        else:  # If I don't have latents. I also assume no virtual reset and no start_bonus_after!!
-            self.visitation_all = np.zeros(
-                (2 * self.furthest * self.mesh_density + 1, 2 * self.furthest * self.mesh_density + 1))
-            for com in np.concatenate(coms):
-                self.visitation_all[tuple(com)] += 1
-
-    def predict_count(self, path):
+    @staticmethod
+    def _expanded(path):
         if 'env_infos' in path.keys() and 'full_path' in path['env_infos'].keys():
-            path = tensor_utils.flatten_first_axis_tensor_dict(path['env_infos']['full_path'])
-
+            return tensor_utils.flatten_first_axis_tensor_dict(path['env_infos']['full_path'])
+        return path
+
+    @staticmethod
+    def _selectors_name(path):
+        agent_infos = path.get('agent_infos', {})
+        if 'selectors' in agent_infos and np.size(agent_infos['selectors']):
+            return 'selectors'
+        elif 'latents' in agent_infos and np.size(agent_infos['latents']):
+            return 'latents'
+        return None
+
+    @staticmethod
+    def _latent_indices(lats):
+        return np.argmax(np.asarray(lats) != 0, axis=-1)  # index of the first nonzero of every one-hot
+
+    def _coms_xy(self, path):
         if 'env_infos' in list(path.keys()) and 'com' in list(path['env_infos'].keys()):
-            com_xy = np.array(path['env_infos']['com'][:, 0:2])
+            com_xy = np.array(path['env_infos']['com'][:, 0:2])  # no z coord
         else:
             com_xy = np.array(path['observations'][:, -3:-1])[:, [1, 0]]
 
         if self.virtual_reset:  # change the com according to switch_lat_every or resets
-            i = self.start_bonus_after
-            while i < len(com_xy):
-                start = i
-                ori = path['env_infos']['ori'][i - self.start_bonus_after]
-                c = np.float(np.cos(ori))
-                s = np.float(np.sin(ori))
-                R = np.matrix('{} {}; {} {}'.format(c, -s, s, c))
-                while i < len(com_xy) and i - start < self.switch_lat_every - self.start_bonus_after:
-                    i += 1
-                com_xy[start:i] = np.dot(R, com_xy[start:i].T).T
-                xy = com_xy[start]
-                com_xy[start:i] -= xy
-                while i < len(com_xy) and i - start < self.switch_lat_every:  # skip some! compare to above
-                    i += 1
-
-        # now translate and scale the coms!
-        coms = np.ceil((com_xy + self.furthest) * self.mesh_density).astype(int)
-
-        counts = []
-        start = 0
-        for i, com in enumerate(coms):
-            if i - start == self.switch_lat_every:
-                start = i
-            if i - start < self.start_bonus_after:
-                counts.append(np.inf)  # this is the way of zeroing out the reward for the first steps
-            else:
-                counts.append(self.visitation_all[tuple(com)])
+            # every switch_lat_every steps (after the first start_bonus_after ones), the next
+            # switch_lat_every - start_bonus_after coms are rotated by the ori at the switch and translated to 0
+            steps = np.arange(len(com_xy))
+            starts = self.start_bonus_after + \
+                (steps - self.start_bonus_after) // self.switch_lat_every * self.switch_lat_every
+            reset = (steps >= self.start_bonus_after) & \
+                (steps - starts < self.switch_lat_every - self.start_bonus_after)
+            starts = starts[reset]
+            oris = np.reshape(path['env_infos']['ori'], (len(path['env_infos']['ori']), -1))[:, 0]
+            ori = oris[starts - self.start_bonus_after]
+            c, s = np.cos(ori), np.sin(ori)
+
+            def rotate(xy):
+                return np.stack([c * xy[:, 0] - s * xy[:, 1], s * xy[:, 0] + c * xy[:, 1]], axis=1)
+
+            com_xy[reset] = rotate(com_xy[reset]) - rotate(com_xy[starts])
+        return com_xy
+
+    def _counted(self, n):
+        """
+        :return: mask of the steps of a path with a bonus (the first start_bonus_after ones after every switch have none)
+        """
+        steps = np.arange(n)
+        if self.switch_lat_every:
+            steps = steps % self.switch_lat_every
+        return steps >= self.start_bonus_after
 
-        return 1. / np.maximum(1., np.sqrt(counts))
+    def fit_before_process_samples(self, paths):
+        paths = [self._expanded(path) for path in paths]
+        coms_xy = [self._coms_xy(path) for path in paths]
+        furthest = np.ceil(np.max(np.abs(np.concatenate(coms_xy))))
 
-    def predict_entropy(self, path):
-        if 'env_infos' in path.keys() and 'full_path' in path['env_infos'].keys():
-            path = tensor_utils.flatten_first_axis_tensor_dict(path['env_infos']['full_path'])
+        selectors_name = self._selectors_name(paths[0])
+        if selectors_name is not None:
+            self.num_latents = np.size(paths[0]["agent_infos"][selectors_name][0])
+            counted = [self._counted(len(com_xy)) for com_xy in coms_xy]
+            coms_xy = np.concatenate([com_xy[mask] for com_xy, mask in zip(coms_xy, counted)])
+            lats = np.concatenate([self._latent_indices(path['agent_infos'][selectors_name])[mask]
+                                   for path, mask in zip(paths, counted)])
+        else:  # If I don't have latents. I also assume no virtual reset and no start_bonus_after!!
+            coms_xy = np.concatenate(coms_xy)
+            lats = None
 
-        if 'env_infos' in list(path.keys()) and 'com' in list(path['env_infos'].keys()):
-            com_xy = np.array(path['env_infos']['com'][:, 0:2])
+        if self.accumulate and self.grid.num_latents == max(1, self.num_latents):
+            self.grid.extend(furthest)
         else:
-            com_xy = np.array(path['observations'][:, -3:-1])[:, [1, 0]]
+            self.grid = VisitationGrid(furthest, self.mesh_density, num_latents=self.num_latents)
+        self.furthest = self.grid.furthest
+        self.grid.add(coms_xy, lats)
 
-        if self.virtual_reset:  # change the com according to switch_lat_every or resets
-            i = self.start_bonus_after
-            while i < len(com_xy):
-                start = i
-                ori = path['env_infos']['ori'][i - self.start_bonus_after]
-                c = np.float(np.cos(ori))
-                s = np.float(np.sin(ori))
-                R = np.matrix('{} {}; {} {}'.format(c, -s, s, c))
-                while i < len(com_xy) and i - start < self.switch_lat_every - self.start_bonus_after:
-                    i += 1
-                com_xy[start:i] = np.dot(R, com_xy[start:i].T).T
-                xy = com_xy[start]
-                com_xy[start:i] -= xy
-                while i < len(com_xy) and i - start < self.switch_lat_every:  # skip some! compare to above
-                    i += 1
-
-        # now translate and scale the coms!
-        coms = np.ceil((com_xy + self.furthest) * self.mesh_density).astype(int)
-
-        freqs = []
-        lats = [np.nonzero(lat)[0][0] for lat in path['agent_infos']['latents']]
-
-        start = 0
-        for i, com in enumerate(coms):
-            if i - start == self.switch_lat_every:
-                start = i
-            if i - start < self.start_bonus_after:
-                freqs.append(
-                    1.)  # this is tricky because it will be higher than the other rewards!! (negatives) -> at least bonus for staying alife until the transition
-            else:
-                freqs.append(self.dict_visit[lats[i]][tuple(com)] / self.visitation_all[tuple(com)])
+    def predict_count(self, path):
+        com_xy = self._coms_xy(self._expanded(path))
+        # the steps without bonus get an infinite count: this is the way of zeroing out the reward for the first steps
+        counts = np.where(self._counted(len(com_xy)), self.grid.count(com_xy), np.inf)
+        return 1. / np.maximum(1., np.sqrt(counts))
+
+    def predict_entropy(self, path):
+        path = self._expanded(path)
+        com_xy = self._coms_xy(path)
+        counted = self._counted(len(com_xy))
+        lats = self._latent_indices(path['agent_infos']['latents'])
+
+        # this is tricky because it will be higher than the other rewards!! (negatives) -> at least bonus for staying
+        # alife until the transition
+        freqs = np.ones(len(com_xy))
+        freqs[counted] = self.grid.count(com_xy[counted], lats[counted]) / self.grid.count(com_xy[counted])
         return np.log(freqs)
 
     def predict_dist_from_reset(self, path):
-        if 'env_infos' in path.keys() and 'full_path' in path['env_infos'].keys():
-            path = tensor_utils.flatten_first_axis_tensor_dict(path['env_infos']['full_path'])
+        com_xy = self._coms_xy(self._expanded(path))
+        coms = self.grid.cells(com_xy)
+        counted = self._counted(len(com_xy))
+        steps = np.arange(len(com_xy))
+        starts = steps - steps % self.switch_lat_every if self.switch_lat_every else np.zeros_like(steps)
 
-        if 'env_infos' in list(path.keys()) and 'com' in list(path['env_infos'].keys()):
-            com_xy = np.array(path['env_infos']['com'][:, 0:2])
-        else:
-            com_xy = np.array(path['observations'][:, -3:-1])[:, [1, 0]]
-
-        if self.virtual_reset:  # change the com according to switch_lat_every or resets
-            i = self.start_bonus_after
-            while i < len(com_xy):
-                start = i
-                ori = path['env_infos']['ori'][i - self.start_bonus_after]
-                c = np.float(np.cos(ori))
-                s = np.float(np.sin(ori))
-                R = np.matrix('{} {}; {} {}'.format(c, -s, s, c))
-                while i < len(com_xy) and i - start < self.switch_lat_every - self.start_bonus_after:
-                    i += 1
-                com_xy[start:i] = np.dot(R, com_xy[start:i].T).T
-                xy = com_xy[start]
-                com_xy[start:i] -= xy
-                while i < len(com_xy) and i - start < self.switch_lat_every:  # skip some! compare to above
-                    i += 1
-
-        # now translate and scale the coms!
-        coms = np.ceil((com_xy + self.furthest) * self.mesh_density).astype(int)
-
-        dists_from_reset = []
-
-        start = 0
-        for i, com in enumerate(coms):
-            if i - start == self.switch_lat_every:
-                start = i
-            if i - start < self.start_bonus_after:
-                dists_from_reset.append(
-                    0.)  # this is tricky because it will be higher than the other rewards!! (negatives) -> at least bonus for staying alife until the transition
-            else:
-                dists_from_reset.append(np.linalg.norm(com - coms[start + self.start_bonus_after]))
-        return np.array(dists_from_reset)
+        dists_from_reset = np.zeros(len(com_xy))
+        dists_from_reset[counted] = np.linalg.norm(
+            coms[counted] - coms[starts[counted] + self.start_bonus_after], axis=1)
+        return dists_from_reset
 
     def predict(self, path):
         if 'env_infos' in path.keys() and 'full_path' in path['env_infos'].keys():
@@ -251,24 +174,20 @@ class GridBonusEvaluator(BonusEvaluator):
         pass
 
     def log_diagnostics(self, paths):
-        if 'env_infos' in paths[0].keys() and 'full_path' in paths[0]['env_infos'].keys():
-            paths = [tensor_utils.flatten_first_axis_tensor_dict(path['env_infos']['full_path']) for path in paths]
+        paths = [self._expanded(path) for path in paths]
+        visitation_all = self.grid.counts()
 
         fig, ax = plt.subplots()
         overlap = 0  # keep track of the overlap
         delta = 1. / self.mesh_density
         y, x = np.mgrid[-self.furthest:self.furthest + delta:delta, -self.furthest:self.furthest + delta:delta]
-        if 'agent_infos' in list(paths[0].keys()) and (('latents' in list(paths[0]['agent_infos'].keys())
-                                                        and np.size(paths[0]['agent_infos']['latents'])) or
-                                                           ('selectors' in list(paths[0]['agent_infos'].keys())
-                                                            and np.size(paths[0]['agent_infos']['selectors']))):
+        if self._selectors_name(paths[0]) is not None:
             # fix the colors for each latent
             num_colors = self.num_latents + 2  # +2 for the 0 and Repetitions NOT COUNTING THE WALLS
             # create a matrix with entries corresponding to the latent that was there (or other if several/wall/nothing)
-            size_grid = int(2 * self.furthest * self.mesh_density + 1)
-            self.visitation_by_lat = np.zeros(
-                (size_grid, size_grid))
-            for i, visit in self.dict_visit.items():
+            self.visitation_by_lat = np.zeros((self.grid.size, self.grid.size))
+            for i in range(self.num_latents):
+                visit = self.grid.counts(i)
                 lat_visit = np.where(visit == 0, visit, i + 1)  # transform the map into 0 or i+1
                 self.visitation_by_lat += lat_visit
                 overlap += np.sum(np.where(self.visitation_by_lat > lat_visit))  # add the overlaps of this latent
@@ -280,13 +199,13 @@ class GridBonusEvaluator(BonusEvaluator):
             color_len = (num_colors - 1.) / num_colors
             ticks = np.arange(color_len / 2., num_colors - 1, color_len)
             cbar = fig.colorbar(map_plot, ticks=ticks)
-            latent_tick_labels = ['latent: ' + str(i) for i in list(self.dict_visit.keys())]
+            latent_tick_labels = ['latent: ' + str(i) for i in range(self.num_latents)]
             cbar.ax.set_yticklabels(
                 ['No visitation'] + latent_tick_labels + ['Repetitions'])  # horizontal colorbar
         else:
-            plt.pcolormesh(x, y, self.visitation_all, vmax=self.mesh_density)
+            plt.pcolormesh(x, y, visitation_all, vmax=self.mesh_density)
             overlap = np.sum(
-                np.where(self.visitation_all > 1, self.visitation_all, 0))  # sum of all visitations larger than 1
+                np.where(visitation_all > 1, visitation_all, 0))  # sum of all visitations larger than 1
         ax.set_xlim([x[0][0], x[0][-1]])
         ax.set_ylim([y[0][0], y[-1][0]])
 
@@ -303,11 +222,11 @@ class GridBonusEvaluator(BonusEvaluator):
         # del fig, ax, cmap, cbar, map_plot
         gc.collect()
 
-        visitation_different = np.count_nonzero(self.visitation_all)
+        visitation_different = np.count_nonzero(visitation_all)
         logger.record_tabular('VisitationDifferents', visitation_different)
         logger.record_tabular('VisitationOverlap', overlap)
-        logger.record_tabular('VisitationMin', np.min(self.visitation_all))
-        logger.record_tabular('VisitationMax', np.max(self.visitation_all))
+        logger.record_tabular('VisitationMin', np.min(visitation_all))
+        logger.record_tabular('VisitationMax', np.max(visitation_all))
 
         if self.snn_H_bonus:
             avg_grid_entropy_bonus = np.mean([np.sum(self.predict_entropy(path)) for path in paths])
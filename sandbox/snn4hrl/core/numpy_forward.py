@@ -0,0 +1,145 @@
+import lasagne.layers as L
+import lasagne.nonlinearities as NL
+import numpy as np
+import theano
+
+from rllab.core.lasagne_layers import ParamLayer
+from sandbox.snn4hrl.core.lasagne_layers import BilinearIntegrationLayer, CropLayer
+
+# batch sizes up to this one (the ones of the rollouts) keep their activation arrays between calls
+MAX_BUFFERED_BATCH_SIZE = 256
+
+
+def _softmax(x):
+    # same steps as the C code of the Theano softmax: shift by the max, exp, and scale by the inverse of the sum
+    # accumulated in float64 from the first column on
+    x -= np.max(x, axis=1, keepdims=True)
+    np.exp(x, out=x)
+    total = x[:, 0].astype(np.float64)
+    for j in range(1, x.shape[1]):
+        total += x[:, j]
+    np.multiply(x, (1. / total)[:, np.newaxis], out=x, casting='unsafe')
+
+
+def _rectify(x):
+    np.maximum(x, 0, out=x)
+
+
+def _sigmoid(x):
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    x += 1
+    np.reciprocal(x, out=x)
+
+
+def _tanh(x):
+    np.tanh(x, out=x)
+
+
+# in-place numpy versions of the nonlinearities of the layers (None for the identity)
+_NONLINEARITIES = {
+    NL.identity: None,
+    NL.tanh: _tanh,
+    NL.softmax: _softmax,
+    NL.rectify: _rectify,
+    NL.sigmoid: _sigmoid,
+}
+
+
+class NumpyForward(object):
+    """
+    Forward pass of a feed-forward Lasagne network in NumPy, to evaluate a policy on the few observations of a rollout
+    step without the overhead of a Theano call. The layers are evaluated with the same operations as their Theano graph
+    (x.dot(W) + b, then the nonlinearity) on a copy of their params in floatX.
+
+    The copy of the params is only updated by refresh(): the policies using it call it when their params are set.
+    """
+
+    def __init__(self, output_layers):
+        """
+        :param output_layers: layers to evaluate, computed from a single InputLayer through DenseLayer, ParamLayer,
+        BilinearIntegrationLayer, CropLayer and ConcatLayer only (NotImplementedError otherwise)
+        """
+        self.output_layers = list(output_layers)
+        self.layers = L.get_all_layers(self.output_layers)
+        input_layers = [layer for layer in self.layers if isinstance(layer, L.InputLayer)]
+        if len(input_layers) != 1:
+            raise NotImplementedError("The network should have a single input layer")
+        self.input_layer = input_layers[0]
+        for layer in self.layers:
+            if isinstance(layer, L.DenseLayer):
+                if layer.nonlinearity not in _NONLINEARITIES or layer.input_layer.output_shape is None or \
+                        len(layer.input_layer.output_shape) != 2:
+                    raise NotImplementedError("Unsupported dense layer %s" % layer.name)
+            elif isinstance(layer, L.ConcatLayer):
+                if layer.axis not in (1, -1) or getattr(layer, 'cropping', None):
+                    raise NotImplementedError("Unsupported concat layer %s" % layer.name)
+            elif not isinstance(layer, (L.InputLayer, ParamLayer, BilinearIntegrationLayer, CropLayer)):
+                raise NotImplementedError("Unsupported layer %s" % type(layer).__name__)
+        self.dtype = np.dtype(theano.config.floatX)
+        for layer in self.layers:
+            if any(param.dtype != self.dtype for param in layer.get_params()):
+                # Theano would upcast the outputs of the layer
+                raise NotImplementedError("Params of layer %s are not in floatX" % layer.name)
+        self._params = dict()
+        self._buffers = dict()
+        self.refresh()
+
+    def refresh(self):
+        """
+        Copy the current values of the params of the layers
+        """
+        for layer in self.layers:
+            if isinstance(layer, L.DenseLayer):
+                b = None if layer.b is None else np.ascontiguousarray(layer.b.get_value(), dtype=self.dtype)
+                self._params[layer] = (np.ascontiguousarray(layer.W.get_value(), dtype=self.dtype), b)
+            elif isinstance(layer, ParamLayer):
+                self._params[layer] = np.ascontiguousarray(layer.param.get_value(), dtype=self.dtype)
+
+    def _get_buffers(self, n):
+        buffers = self._buffers.get(n)
+        if buffers is None:
+            buffers = dict()
+            for layer in self.layers:
+                if isinstance(layer, (L.DenseLayer, ParamLayer, BilinearIntegrationLayer, L.ConcatLayer)):
+                    buffers[layer] = np.empty((n, layer.output_shape[1]), dtype=self.dtype)
+            if n <= MAX_BUFFERED_BATCH_SIZE:
+                self._buffers[n] = buffers
+        return buffers
+
+    def __call__(self, inputs):
+        """
+        :param inputs: (N, input_dim) array
+        :return: list of the (N, dim) outputs of the output layers (new arrays)
+        """
+        inputs = np.asarray(inputs, dtype=self.dtype)
+        buffers = self._get_buffers(len(inputs))
+        outputs = dict()
+        for layer in self.layers:
+            if layer is self.input_layer:
+                out = inputs
+            elif isinstance(layer, L.DenseLayer):
+                W, b = self._params[layer]
+                out = np.dot(outputs[layer.input_layer], W, out=buffers[layer])
+                if b is not None:
+                    out += b
+                nonlinearity = _NONLINEARITIES[layer.nonlinearity]
+                if nonlinearity is not None:
+                    nonlinearity(out)
+            elif isinstance(layer, ParamLayer):
+                out = buffers[layer]
+                out[...] = self._params[layer]
+            elif isinstance(layer, CropLayer):
+                out = outputs[layer.input_layer][:, layer.start_index:layer.end_index]
+            elif isinstance(layer, BilinearIntegrationLayer):
+                obs, selection = [outputs[l] for l in layer.input_layers]
+                out = buffers[layer]
+                obs_dim, sel_dim = obs.shape[1], selection.shape[1]
+                out[:, :obs_dim] = obs
+                out[:, obs_dim:obs_dim + sel_dim] = selection
+                out[:, obs_dim + sel_dim:] = np.reshape(obs[:, :, np.newaxis] * selection[:, np.newaxis, :],
+                                                        (len(out), obs_dim * sel_dim))
+            else:  # ConcatLayer
+                out = np.concatenate([outputs[l] for l in layer.input_layers], axis=1, out=buffers[layer])
+            outputs[layer] = out
+        return [np.array(outputs[layer]) for layer in self.output_layers]
@@ -0,0 +1,144 @@
+import numpy as np
+
+# grids with more cells (over all the latents) than this are stored sparse
+MAX_DENSE_CELLS = 2 ** 24
+
+
+class VisitationGrid(object):
+    """
+    Counts of the visitations of the cells of a square 2D grid covering [-furthest, furthest]^2 with mesh_density cells
+    per unit, separately for every latent. The cell of a position xy is ceil((xy + furthest) * mesh_density).
+
+    All the counts of a batch of positions are accumulated with a single bincount over their (latent, x, y) indices.
+    The counts can be accumulated across iterations: extend() grows the grid if the new positions go further. Large
+    grids are stored sparse, as the sorted flat indices of the visited cells and their counts.
+    """
+
+    def __init__(self, furthest, mesh_density, num_latents=1, sparse=None):
+        """
+        :param furthest: half width of the grid (an integer number of units)
+        :param num_latents: number of latents counted separately (1 if there are none)
+        :param sparse: whether to store the counts sparse (default: if the grid has more than MAX_DENSE_CELLS cells)
+        """
+        self.mesh_density = int(mesh_density)
+        self.num_latents = max(1, int(num_latents))
+        self.furthest = 0
+        self.size = 1
+        self._sparse = sparse
+        self._counts = np.zeros((self.num_latents, 1, 1), dtype=np.int64)
+        self._keys = self._values = None
+        self.extend(furthest)
+
+    @property
+    def sparse(self):
+        return self._counts is None
+
+    def extend(self, furthest):
+        """
+        Grow the grid to cover [-furthest, furthest]^2, keeping the counts of the cells (no-op if it already does)
+        """
+        furthest = max(int(np.ceil(furthest)), self.furthest)
+        shift = (furthest - self.furthest) * self.mesh_density
+        size = 2 * furthest * self.mesh_density + 1
+        sparse = self._sparse if self._sparse is not None else self.num_latents * size ** 2 > MAX_DENSE_CELLS
+        if shift == 0 and sparse == self.sparse:
+            return
+        if sparse:
+            if self.sparse:
+                lats, x, y = self._unflatten(self._keys)
+                values = self._values
+            else:
+                lats, x, y = np.nonzero(self._counts)
+                values = self._counts[lats, x, y]
+            self.furthest, self.size = furthest, size
+            self._counts = None
+            self._keys, self._values = self._flatten(lats, x + shift, y + shift), values
+        else:
+            counts = np.zeros((self.num_latents, size, size), dtype=np.int64)
+            counts[:, shift:shift + self.size, shift:shift + self.size] = self._counts
+            self.furthest, self.size = furthest, size
+            self._counts = counts
+
+    def cells(self, coms_xy):
+        """
+        :param coms_xy: (N, 2) positions
+        :return: (N, 2) int indices of their cells
+        """
+        return np.ceil((np.asarray(coms_xy)[:, :2] + self.furthest) * self.mesh_density).astype(int)
+
+    def _flatten(self, latents, x, y):
+        return (np.asarray(latents, dtype=np.int64) * self.size + x) * self.size + y
+
+    def _unflatten(self, keys):
+        latents, xy = np.divmod(keys, self.size * self.size)
+        x, y = np.divmod(xy, self.size)
+        return latents, x, y
+
+    def _in_grid(self, cells):
+        return np.all((cells >= 0) & (cells < self.size), axis=1)
+
+    def add(self, coms_xy, latents=None):
+        """
+        Count one visitation of the cell of every position (ValueError if some are out of the grid)
+        :param latents: (N,) int indices of the latents of the positions (None: all in latent 0)
+        """
+        cells = self.cells(coms_xy)
+        if not np.all(self._in_grid(cells)):
+            raise ValueError("Positions out of the grid of half width %d: extend it first" % self.furthest)
+        if latents is None:
+            latents = np.zeros(len(cells), dtype=np.int64)
+        keys = self._flatten(latents, cells[:, 0], cells[:, 1])
+        if self.sparse:
+            keys, counts = np.unique(keys, return_counts=True)
+            all_keys, inverse = np.unique(np.concatenate([self._keys, keys]), return_inverse=True)
+            self._values = np.bincount(inverse, weights=np.concatenate([self._values, counts]),
+                                       minlength=len(all_keys)).astype(np.int64)
+            self._keys = all_keys
+        else:
+            self._counts += np.bincount(keys, minlength=self._counts.size).reshape(self._counts.shape)
+
+    def count(self, coms_xy, latents=None):
+        """
+        :param latents: (N,) int indices of the latents to count the visitations of (None: of all the latents)
+        :return: (N,) number of visitations of the cells of the positions (0 out of the grid)
+        """
+        cells = self.cells(coms_xy)
+        in_grid = self._in_grid(cells)
+        x, y = np.where(in_grid, cells[:, 0], 0), np.where(in_grid, cells[:, 1], 0)
+        if self.sparse:
+            if latents is None:
+                keys = np.concatenate([self._flatten(np.full(len(x), lat), x, y) for lat in range(self.num_latents)])
+                counts = self._lookup(keys).reshape(self.num_latents, -1).sum(axis=0)
+            else:
+                counts = self._lookup(self._flatten(latents, x, y))
+        elif latents is None:
+            counts = self._counts[:, x, y].sum(axis=0)
+        else:
+            counts = self._counts[latents, x, y]
+        return np.where(in_grid, counts, 0)
+
+    def _lookup(self, keys):
+        if not len(self._keys):
+            return np.zeros(len(keys), dtype=np.int64)
+        idx = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        return np.where(self._keys[idx] == keys, self._values[idx], 0)
+
+    def counts(self, latent=None):
+        """
+        :return: dense (size, size) array of the visitations of the latent (None: of all the latents)
+        """
+        if self.sparse:
+            lats, x, y = self._unflatten(self._keys)
+            grid = np.zeros((self.size, self.size), dtype=np.int64)
+            selected = slice(None) if latent is None else lats == latent
+            np.add.at(grid, (x[selected], y[selected]), self._values[selected])
+            return grid
+        return self._counts.sum(axis=0) if latent is None else self._counts[latent].copy()
+
+    def num_visited(self):
+        """
+        :return: number of cells visited with any latent
+        """
+        if self.sparse:
+            return len(np.unique(self._keys % (self.size * self.size)))
+        return int(np.count_nonzero(self._counts.sum(axis=0)))
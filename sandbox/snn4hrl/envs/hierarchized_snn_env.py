@@ -1,16 +1,16 @@
-import json
-import joblib
 import numpy as np
-import os
 
-from rllab import config
 from rllab import spaces
 from rllab.core.serializable import Serializable
 from rllab.envs.base import Step
 from rllab.envs.normalized_env import NormalizedEnv
 from rllab.envs.proxy_env import ProxyEnv
+from rllab.misc import checkpoints
+from rllab.misc import logger
 from rllab.misc import tensor_utils
 from rllab.misc.overrides import overrides
+from rllab.sampler.path_buffer import PathBuffer
+from sandbox.snn4hrl.envs.hierarchized_snn_vec_env import HierarchizedSnnVecEnvExecutor
 from sandbox.snn4hrl.envs.mujoco.maze.fast_maze_env import FastMazeEnv
 from sandbox.snn4hrl.policies.hier_snn_mlp_policy import GaussianMLPPolicy_snn_hier
 from sandbox.snn4hrl.sampler.utils import rollout  # this is a different rollout (option of no reset)
@@ -28,6 +28,7 @@ class HierarchizedSnnEnv(ProxyEnv, Serializable):
             npz_path=None,
             animate=False,
             keep_rendered_rgb=False,
+            use_path_buffer=False,
     ):
         """
         :param env: Env to wrap, should have same robot characteristics than env where the policy where pre-trained on
@@ -37,6 +38,7 @@ class HierarchizedSnnEnv(ProxyEnv, Serializable):
         :param json_path: path to json of the pre-training experiment. Requires npz_paths of the policy params
         :param npz_path: only required when using json_path
         :param keep_rendered_rgb: the returned frac_paths include all rgb images (for plotting video after)
+        :param use_path_buffer: write the low-level rollouts into a preallocated PathBuffer instead of stacking lists
         """
         Serializable.quick_init(self, locals())
         ProxyEnv.__init__(self, env) # the inner env can be referred to as wrapped_env
@@ -44,13 +46,14 @@ class HierarchizedSnnEnv(ProxyEnv, Serializable):
         self.discrete_actions = discrete_actions
         self.animate = animate
         self.keep_rendered_rgb = keep_rendered_rgb
-        if json_path:
-            self.data = json.load(open(os.path.join(config.PROJECT_PATH, json_path), 'r'))
-            self.low_policy_latent_dim = self.data['json_args']['policy']['latent_dim']
-        elif pkl_path:
-            pkl_path = os.path.join(config.PROJECT_PATH, pkl_path)
-            self.data = joblib.load(pkl_path)
-            self.low_policy_latent_dim = self.data['policy'].latent_dim
+        if use_path_buffer:
+            # the frac_paths are views into this buffer: they stay valid, a new block is allocated when it is full
+            self.low_path_buffer = PathBuffer(env.spec, capacity=10 * time_steps_agg, extra_keys=('terminated',))
+        else:
+            self.low_path_buffer = None
+        if json_path or pkl_path:
+            # only the args of the pre-trained policy are read here (cached for all the envs of the process)
+            self.low_policy_latent_dim = checkpoints.load_policy_args(pkl_path, json_path)['latent_dim']
         else:
             raise Exception("No path to file given")
 
@@ -60,6 +63,8 @@ class HierarchizedSnnEnv(ProxyEnv, Serializable):
             #latent_dim=latent_dim, # restore from file
             latent_name='categorical',
             pkl_path=pkl_path,
+            json_path=json_path,
+            npz_path=npz_path,
             bilinear_integration=True,  # concatenate also the outer product
             hidden_sizes=(64, 64),
             min_std=1e-6,
@@ -75,11 +80,51 @@ class HierarchizedSnnEnv(ProxyEnv, Serializable):
             ub = 1e6 * np.ones(lat_dim)
             return spaces.Box(-1 * ub, ub)
 
+    @property
+    def vectorized(self):
+        return True
+
+    def vec_env_executor(self, n_envs, max_path_length):
+        # the low-level rollouts of all the copies are run in lockstep, with one low_policy call per low-level step
+        return HierarchizedSnnVecEnvExecutor(self, n_envs=n_envs, max_path_length=max_path_length)
+
+    def lockstep_executor(self, n_envs):
+        """
+        :return: executor of n_envs copies of the wrapped env, kept for the next calls (used by the sampler workers to
+        collect n_envs paths at once, see parallel_sampler.sample_paths). The env params set on this env are also set
+        on the copies
+        """
+        executor = getattr(self, '_lockstep_executor', None)
+        if executor is None or executor.num_envs != n_envs:
+            executor = self._lockstep_executor = self.vec_env_executor(n_envs=n_envs, max_path_length=None)
+            algo = getattr(self.wrapped_env.wrapped_env, 'algo', None)
+            if algo is not None:
+                for env in executor.envs:
+                    env.wrapped_env.set_algo(algo)
+        return executor
+
+    @staticmethod
+    def get_fast_maze_env(env):
+        """
+        :return: the FastMazeEnv that is env or that env normalizes, or None. Its maze obs are blanked in low-level steps
+        """
+        if isinstance(env, FastMazeEnv):
+            return env
+        elif isinstance(env, NormalizedEnv) and isinstance(env.wrapped_env, FastMazeEnv):
+            return env.wrapped_env
+        return None
+
     #@overrides
     def set_param_values(self, params):
         # Rui: setting env param when n_parallel != 1
-        self.time_steps_agg = params[0]
-        self.wrapped_env.wrapped_env.algo = params[1]
+        # params is [time_steps_agg, algo], or only [time_steps_agg] (e.g. a numpy array from the shared param channel)
+        # when the workers do not need the algo (it is only used to train low with the value gradient)
+        self.time_steps_agg = int(params[0])
+        if len(params) > 1:
+            self.wrapped_env.wrapped_env.set_algo(params[1])
+            if getattr(self, '_lockstep_executor', None) is not None:
+                for env in self._lockstep_executor.envs:
+                    env.wrapped_env.set_algo(params[1])
         #self.low_policy.set_param_values(params) # is set separately!
 
     @overrides
@@ -92,7 +137,7 @@ class HierarchizedSnnEnv(ProxyEnv, Serializable):
                 with self.wrapped_env.blank_maze():
                     frac_path = rollout(self.wrapped_env, self.low_policy, max_path_length=self.time_steps_agg,
                                         reset_start_rollout=False, keep_rendered_rgbs=self.keep_rendered_rgb,
-                                        animated=self.animate, speedup=1000)
+                                        animated=self.animate, speedup=1000, path_buffer=self.low_path_buffer)
                 next_obs = self.wrapped_env.get_current_obs()
                 #next_obs = frac_path['observations'][-1]
             elif isinstance(self.wrapped_env, NormalizedEnv) and isinstance(self.wrapped_env.wrapped_env, FastMazeEnv):
@@ -100,7 +145,7 @@ class HierarchizedSnnEnv(ProxyEnv, Serializable):
                     # print("max_path_length", self.time_steps_agg)
                     frac_path = rollout(self.wrapped_env, self.low_policy, max_path_length=self.time_steps_agg,
                                         reset_start_rollout=False, keep_rendered_rgbs=self.keep_rendered_rgb,
-                                        animated=self.animate, speedup=1000)
+                                        animated=self.animate, speedup=1000, path_buffer=self.low_path_buffer)
                     # print("low_policy", self.low_policy)
                 next_obs = self.wrapped_env.wrapped_env.get_current_obs()
                 #next_obs = frac_path['observations'][-1]
@@ -109,7 +154,7 @@ class HierarchizedSnnEnv(ProxyEnv, Serializable):
             else:
                 frac_path = rollout(self.wrapped_env, self.low_policy, max_path_length=self.time_steps_agg,
                                     reset_start_rollout=False, keep_rendered_rgbs=self.keep_rendered_rgb,
-                                    animated=self.animate, speedup=1000)
+                                    animated=self.animate, speedup=1000, path_buffer=self.low_path_buffer)
                 next_obs = frac_path['observations'][-1]
 
             reward = np.sum(frac_path['rewards'])
@@ -135,8 +180,11 @@ class HierarchizedSnnEnv(ProxyEnv, Serializable):
         # print("last_env_info", last_env_info)
         # print("last_agent_info", last_agent_info)
         # print("full_path", full_path)
+        maze_env = self.get_fast_maze_env(self.wrapped_env)
+        skipped_ray_casts = maze_env.pop_skipped_ray_casts() if maze_env is not None else 0
         return Step(next_obs, reward, done,
-                    last_env_info=last_env_info, last_agent_info=last_agent_info, full_path=full_path)
+                    last_env_info=last_env_info, last_agent_info=last_agent_info, full_path=full_path,
+                    skipped_ray_casts=skipped_ray_casts)
         # the last kwargs will all go to env_info, so path['env_info']['full_path'] gives a dict with the full path!
 
     @overrides
@@ -144,6 +192,9 @@ class HierarchizedSnnEnv(ProxyEnv, Serializable):
         # to use the visualization I need to append all paths
         expanded_paths = [tensor_utils.flatten_first_axis_tensor_dict(path['env_infos']['full_path']) for path in paths]
         self.wrapped_env.log_diagnostics(expanded_paths, *args, **kwargs)
+        # maze observations of the low-level steps that were not computed
+        logger.record_tabular('SkippedRayCasts',
+                              int(sum(np.sum(path['env_infos'].get('skipped_ray_casts', 0)) for path in paths)))
 
     def __str__(self):
         return "Hierarchized: %s" % self._wrapped_env
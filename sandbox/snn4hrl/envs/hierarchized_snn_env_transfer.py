@@ -1,3 +1,18 @@
+import numpy as np
+
+from rllab import spaces
+from rllab.core.serializable import Serializable
+from rllab.envs.base import Step
+from rllab.envs.normalized_env import NormalizedEnv
+from rllab.envs.proxy_env import ProxyEnv
+from rllab.misc import checkpoints
+from rllab.misc import tensor_utils
+from rllab.misc.overrides import overrides
+from sandbox.snn4hrl.envs.mujoco.maze.fast_maze_env import FastMazeEnv
+from sandbox.snn4hrl.sampler.utils import rollout  # this is a different rollout (option of no reset)
+from sandbox.snn4hrl.policies.snn_mlp_policy_restorable import GaussianMLPPolicy_snn_restorable
+
+
 class HierarchizedSnnEnvTransfer(ProxyEnv, Serializable):
     def __init__(
             self,
@@ -25,13 +40,9 @@ class HierarchizedSnnEnvTransfer(ProxyEnv, Serializable):
         self.discrete_actions = discrete_actions
         self.animate = animate
         self.keep_rendered_rgb = keep_rendered_rgb
-        if json_path:
-            self.data = json.load(open(os.path.join(config.PROJECT_PATH, json_path), 'r'))
-            self.low_policy_latent_dim = self.data['json_args']['policy']['latent_dim']
-        elif pkl_path:
-            pkl_path = os.path.join(config.PROJECT_PATH, pkl_path)
-            self.data = joblib.load(pkl_path)
-            self.low_policy_latent_dim = self.data['policy'].latent_dim
+        if json_path or pkl_path:
+            # only the args of the pre-trained policy are read here (cached for all the envs of the process)
+            self.low_policy_latent_dim = checkpoints.load_policy_args(pkl_path, json_path)['latent_dim']
         else:
             raise Exception("No path to file given")
 
@@ -41,6 +52,8 @@ class HierarchizedSnnEnvTransfer(ProxyEnv, Serializable):
             #latent_dim=latent_dim, # restore from file
             latent_name='categorical',
             pkl_path=pkl_path,
+            json_path=json_path,
+            npz_path=npz_path,
             bilinear_integration=True,  # concatenate also the outer product
             hidden_sizes=(64, 64),
             min_std=1e-6,
@@ -59,8 +72,11 @@ class HierarchizedSnnEnvTransfer(ProxyEnv, Serializable):
     #@overrides
     def set_param_values(self, params):
         # Rui: setting env param when n_parallel != 1
-        self.time_steps_agg = params[0]
-        self.wrapped_env.wrapped_env.algo = params[1]
+        # params is [time_steps_agg, algo], or only [time_steps_agg] (e.g. a numpy array from the shared param channel)
+        # when the workers do not need the algo (it is only used to train low with the value gradient)
+        self.time_steps_agg = int(params[0])
+        if len(params) > 1:
+            self.wrapped_env.wrapped_env.set_algo(params[1])
         #self.low_policy.set_param_values(params) # is set separately!
 
     @overrides
@@ -0,0 +1,117 @@
+import pickle
+from contextlib import ExitStack
+
+import numpy as np
+
+from rllab.misc import tensor_utils
+from sandbox.snn4hrl.sampler.utils import rollout_lockstep
+
+
+class HierarchizedSnnVecEnvExecutor(object):
+    """
+    Steps n_envs copies of the env wrapped by a HierarchizedSnnEnv in lockstep. Every high-level step runs the
+    low-level policy for time_steps_agg steps on all the copies at once (see rollout_lockstep), instead of one low-level
+    rollout per env. The interface is the same as VecEnvExecutor.
+    """
+
+    def __init__(self, env, n_envs, max_path_length):
+        """
+        :param env: the HierarchizedSnnEnv. Its low_policy and time_steps_agg are shared by all the copies
+        :param n_envs: number of copies of env.wrapped_env to step in lockstep
+        :param max_path_length: maximum number of high-level steps before a copy is reset
+        """
+        self.env = env
+        self.envs = [pickle.loads(pickle.dumps(env.wrapped_env)) for _ in range(n_envs)]
+        self._action_space = env.action_space
+        self._observation_space = env.observation_space
+        self.ts = np.zeros(len(self.envs), dtype='int')
+        self.max_path_length = max_path_length
+
+    def step(self, action_n):
+        obs, rewards, dones, env_infos = self.step_envs(np.arange(len(self.envs)), action_n)
+        dones = np.asarray(dones)
+        rewards = np.asarray(rewards)
+        self.ts += 1
+        if self.max_path_length is not None:
+            dones[self.ts >= self.max_path_length] = True
+        for (i, done) in enumerate(dones):
+            if done:
+                obs[i] = self.envs[i].reset()
+                self.ts[i] = 0
+        return obs, rewards, dones, tensor_utils.stack_tensor_dict_list(env_infos)
+
+    def step_envs(self, indices, action_n):
+        """
+        One high-level step of some of the copies, as HierarchizedSnnEnv.step (the copies are not reset when done)
+        :param indices: indices of the copies to step
+        :param action_n: their actions (latents)
+        :return: lists of the next observations, rewards, dones and env_infos of the stepped copies
+        """
+        envs = [self.envs[idx] for idx in indices]
+        latents = np.asarray([self._action_space.flatten(a) for a in action_n])
+        time_steps_agg = self.env.time_steps_agg
+        maze_envs = [self.env.get_fast_maze_env(env) for env in envs]
+        with ExitStack() as stack:
+            for maze_env in maze_envs:
+                if maze_env is not None:
+                    stack.enter_context(maze_env.blank_maze())
+            frac_paths = rollout_lockstep(envs, self.env.low_policy, latents, max_path_length=time_steps_agg)
+
+        obs, rewards, dones, env_infos = [], [], [], []
+        for idx, path_length in enumerate(frac_paths['path_lengths']):
+            # views of the valid part of the preallocated arrays. The env_infos are kept with the full time_steps_agg
+            # length: the zeros past path_length are the same padding HierarchizedSnnEnv.step does when done
+            last = path_length - 1
+            full_path = dict(
+                observations=frac_paths['observations'][idx, :path_length],
+                actions=frac_paths['actions'][idx, :path_length],
+                rewards=frac_paths['rewards'][idx, :path_length],
+                agent_infos=dict((k, v[idx, :path_length]) for k, v in frac_paths['agent_infos'].items()),
+                env_infos=_index_tensor_dict(frac_paths['env_infos'], idx),
+                terminated=frac_paths['terminated'][idx, :path_length],
+            )
+            if maze_envs[idx] is not None:
+                next_obs = maze_envs[idx].get_current_obs()
+            else:
+                next_obs = full_path['observations'][last]
+            done = time_steps_agg > path_length or bool(full_path['terminated'][last])
+            obs.append(next_obs)
+            rewards.append(np.sum(full_path['rewards']))
+            dones.append(done)
+            env_infos.append(dict(
+                last_env_info=_index_tensor_dict(full_path['env_infos'], last),
+                last_agent_info=_index_tensor_dict(full_path['agent_infos'], last),
+                full_path=full_path,
+                skipped_ray_casts=maze_envs[idx].pop_skipped_ray_casts() if maze_envs[idx] is not None else 0,
+            ))
+        return obs, rewards, dones, env_infos
+
+    def reset(self):
+        results = [env.reset() for env in self.envs]
+        self.ts[:] = 0
+        return results
+
+    @property
+    def num_envs(self):
+        return len(self.envs)
+
+    @property
+    def action_space(self):
+        return self._action_space
+
+    @property
+    def observation_space(self):
+        return self._observation_space
+
+    def terminate(self):
+        pass
+
+
+def _index_tensor_dict(tensor_dict, idx):
+    ret = dict()
+    for k, v in tensor_dict.items():
+        if isinstance(v, dict):
+            ret[k] = _index_tensor_dict(v, idx)
+        else:
+            ret[k] = v[idx]
+    return ret
@@ -8,6 +8,7 @@ import numpy as np
 from rllab import spaces
 from rllab.core.serializable import Serializable
 from rllab.envs.mujoco.maze.maze_env import MazeEnv
+from rllab.envs.mujoco.maze.maze_env_utils import grid_ray_readings
 from rllab.envs.mujoco.mujoco_env import BIG
 from rllab.misc.overrides import overrides
 import datetime
@@ -22,6 +23,9 @@ class FastMazeEnv(MazeEnv, Serializable):
     - The option
     """
 
+    # number of maze observations not computed because the maze was blanked, see blank_maze
+    skipped_ray_casts = 0
+
     def __init__(
             self,
             *args,
@@ -129,12 +133,10 @@ class FastMazeEnv(MazeEnv, Serializable):
     def get_current_maze_obs(self):
         # The observation would include both information about the robot itself as well as the sensors around its
         # environment
-        structure = self.MAZE_STRUCTURE
         size_scaling = self.MAZE_SIZE_SCALING
 
         # compute origin cell i_o, j_o coordinates and center of it x_o, y_o (with 0,0 in the top-left corner of struc)
         o_xy = np.array(self._find_robot())  # this is self.init_torso_x, self.init_torso_y !!: center of the cell xy!
-        o_ij = (o_xy / size_scaling).astype(int)  # this is the initial position in the grid (check if correct..) [j, i]
 
         # robot_xy = np.array(self.wrapped_env.get_body_com("torso")[:2])  # the coordinates of this are wrt the init!!
         x_actual, y_actual = self.wrapped_env.get_body_com("torso")[0] + self._init_torso_x - o_xy[0],\
@@ -142,94 +144,12 @@ class FastMazeEnv(MazeEnv, Serializable):
         robot_xy = np.array([x_actual, y_actual]) # these are the x, y relative to the init pos in this episode
 
         ori = self.get_ori()  # for Ant this is computed with atan2, which gives [-pi, pi]
-        c_ij = o_ij + np.rint(robot_xy / size_scaling) # relative to the grid
-        c_xy = (c_ij - o_ij) * size_scaling  # the xy position of the current cell center in init_robot origin
-        # print("c_xy", c_xy)
-        # print('o_xy', o_xy)
-        # print('robot_xy', robot_xy)
-        # print('c_ij', c_ij)
-
-        R = int(self._sensor_range // size_scaling)
-
-        wall_readings = np.zeros(self._n_bins)
-        goal_readings = np.zeros(self._n_bins)
-
-        for ray_idx in range(self._n_bins):
-            ray_ori = ori - self._sensor_span * 0.5 + ray_idx / (
-            self._n_bins - 1) * self._sensor_span  # make the ray in [-pi, pi]
-            if ray_ori > math.pi:
-                ray_ori -= 2 * math.pi
-            elif ray_ori < - math.pi:
-                ray_ori += 2 * math.pi
-            x_dir, y_dir = 1, 1
-            if math.pi / 2. <= ray_ori <= math.pi:
-                x_dir = -1
-            elif 0 > ray_ori >= - math.pi / 2.:
-                y_dir = -1
-            elif - math.pi / 2. > ray_ori >= - math.pi:
-                x_dir, y_dir = -1, -1
-
-            visited_goal = False
-            visited_wall = False
-            for r in range(R):
-                next_x = c_xy[0] + x_dir * (0.5 + r) * size_scaling  # x of the next vertical segment, in init_rob coord
-                next_i = int(c_ij[0] + x_dir * (r + 1))  # this is the i of the cells on the other side of the segment
-                delta_y = (next_x - robot_xy[0]) * math.tan(ray_ori)
-                y = robot_xy[1] + delta_y  # y of the intersection pt, wrt robot_init origin
-                dist = np.sqrt(np.sum(np.square(robot_xy - (next_x, y))))
-                # if dist > self._sensor_range:
-                #     # print("sensor range is too small")
-                #     print("vertical dist", dist)
-                if dist <= self._sensor_range and 0 <= next_i < len(structure[0]):
-                    j = int(np.rint((y + o_xy[1]) / size_scaling))
-                    if 0 <= j < len(structure):
-                        if structure[j][next_i] == 1 and not visited_wall:
-                            wall_readings[ray_idx] = (self._sensor_range - dist) / self._sensor_range
-                            # plot_ray(wall_readings[ray_idx], ray_idx)
-                            visited_wall = True
-                        elif structure[j][next_i] == 'g' and not visited_goal:  # remember to flip the ij when referring to the matrix!!
-                            goal_readings[ray_idx] = (self._sensor_range - dist) / self._sensor_range
-                            # plot_ray(goal_readings[ray_idx], ray_idx, 'g')
-                            visited_goal = True
-
-                    else:
-                        break
-                else:
-                    break
-
-            # same for next horizontal segment. If the distance is less (higher intensity), update the goal/wall reading
-            visited_goal = False
-            visited_wall = False
-            for r in range(R):
-                next_y = c_xy[1] + y_dir * (0.5 + r) * size_scaling  # y of the next horizontal segment
-                next_j = int(
-                    c_ij[1] + y_dir * (r + 1))  # this is the i and j of the cells on the other side of the segment
-                # first check the intersection with the next horizontal segment:
-                delta_x = (next_y - robot_xy[1]) / math.tan(ray_ori)
-                x = robot_xy[0] + delta_x
-                dist = np.sqrt(np.sum(np.square(robot_xy - (x, next_y))))
-                # if dist > self._sensor_range:
-                #     # print("sensor range is too small")
-                #     print("horizontal dist", dist)
-                if dist <= self._sensor_range and 0 <= next_j < len(structure):
-                    i = int(np.rint((x + o_xy[0]) / size_scaling))
-                    if 0 <= i < len(structure[0]):
-                        intensity = (self._sensor_range - dist) / self._sensor_range # closeness
-                        if structure[next_j][i] == 1 and not visited_wall:
-                            if wall_readings[ray_idx] == 0 or intensity > wall_readings[ray_idx]:
-                                wall_readings[ray_idx] = intensity
-                                # plot_ray(wall_readings[ray_idx], ray_idx)
-                            visited_wall = True
-                        elif structure[next_j][i] == 'g' and not visited_goal:
-                            if goal_readings[ray_idx] == 0 or intensity > goal_readings[ray_idx]:
-                                goal_readings[ray_idx] = intensity
-                                # plot_ray(goal_readings[ray_idx], ray_idx, 'g')
-                            visited_goal = True
-
-                    else:
-                        break
-                else:
-                    break
+        ray_oris = [ori - self._sensor_span * 0.5 + ray_idx / (self._n_bins - 1) * self._sensor_span
+                    for ray_idx in range(self._n_bins)]
+        wall_grid, goal_grid = self._get_occupancy_grids()
+        # all the rays are walked through the grid at once, see grid_ray_readings_loop for the per-ray version
+        wall_readings, goal_readings = grid_ray_readings(wall_grid, goal_grid, o_xy, robot_xy, ray_oris,
+                                                         self._sensor_range, size_scaling)
 
         # can see  goal behind a wall
         # # errase the goal readings behind a wall and the walls behind a goal:
@@ -262,6 +182,7 @@ class FastMazeEnv(MazeEnv, Serializable):
     def get_current_obs(self):
         if self._blank_maze:
             # print("get_obs_here")
+            self.skipped_ray_casts += 1
             return np.concatenate([self.wrapped_env.get_current_obs(),
                                    self.blank_maze_obs
                                    ])
@@ -272,11 +193,24 @@ class FastMazeEnv(MazeEnv, Serializable):
 
     @contextmanager
     def blank_maze(self):
+        """
+        Within this context the maze readings are not computed: the maze part of the observations is zeros. This is
+        how the low-level steps are run, the readings being only needed at the high-level steps (the virtual readings
+        of train_low_with_v_gradient are computed by MazeEnv.step regardless)
+        """
         previous_blank_maze_obs = self._blank_maze
         self._blank_maze = True
         yield
         self._blank_maze = previous_blank_maze_obs
 
+    def pop_skipped_ray_casts(self):
+        """
+        :return: the number of maze observations skipped in blank_maze since the last call
+        """
+        skipped_ray_casts = self.skipped_ray_casts
+        self.skipped_ray_casts = 0
+        return skipped_ray_casts
+
     @property
     @overrides
     def observation_space(self):
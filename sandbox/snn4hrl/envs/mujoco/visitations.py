@@ -0,0 +1,124 @@
+"""
+Visitation maps of the center of mass of robots moving in 2D (see MujocoEnv_ObsInit.plot_visitations), computed from
+a compact summary of the paths so that they can be computed in the background process of
+rllab.misc.background_diagnostics.
+"""
+import os.path as osp
+import collections
+import gc
+
+import numpy as np
+
+import matplotlib as mpl
+mpl.use('Agg')
+import matplotlib.pyplot as plt
+
+from sandbox.snn4hrl.core.visitation_grid import VisitationGrid
+
+# number of latents (colors) of the maps by latent
+NUM_LATENTS = 6
+
+
+def visitation_summary(paths):
+    """
+    :return: dict with the (N, 2) positions of the com of all the steps of the paths, and the (N,) indices of the
+    latents (or selectors) the steps were taken with (None if the policy has none)
+    """
+    if 'env_infos' not in paths[0].keys() or 'com' not in paths[0]['env_infos'].keys():
+        raise KeyError("No 'com' key in your path['env_infos']: please change you step function")
+    agent_infos = paths[0].get('agent_infos', {})
+    selectors_name = None
+    if 'selectors' in agent_infos and np.size(agent_infos['selectors']):
+        selectors_name = 'selectors'
+    elif 'latents' in agent_infos and np.size(agent_infos['latents']):
+        selectors_name = 'latents'
+    coms, latents = [], []
+    for path in paths:
+        com = np.asarray(path['env_infos']['com'])[:, :2]
+        if selectors_name is not None:
+            lats = np.reshape(np.argmax(np.asarray(path['agent_infos'][selectors_name]), axis=-1), -1)
+            n = min(len(com), len(lats))  # the steps without latent are not counted
+            com, lats = com[:n], lats[:n]
+            latents.append(lats)
+        coms.append(com)
+    return dict(coms=np.concatenate(coms), latents=np.concatenate(latents) if selectors_name is not None else None)
+
+
+def log_visitations(summary, mesh_density=20, visit_prefix='', visit_axis_bound=None, log_dir=None, plot=True):
+    """
+    Count the visitations of the cells of the grid, and plot them by latent in log_dir if plot.
+    :param summary: visitation_summary of the paths
+    :return: the VisitationTotal and VisitationOverlap tabular entries
+    """
+    coms, latents = summary['coms'], summary['latents']
+    # now we will grid the space and check how much of it the policy is covering
+    x_max = int(np.ceil(np.max(np.abs(coms[:, 0]))))
+    y_max = int(np.ceil(np.max(np.abs(coms[:, 1]))))
+    furthest = max(x_max, y_max)
+    print('THE FUTHEST IT WENT COMPONENT-WISE IS: x_max={}, y_max={}'.format(x_max, y_max))
+    if visit_axis_bound and visit_axis_bound >= furthest:
+        furthest = max(furthest, visit_axis_bound)
+    delta = 1. / mesh_density
+    grid_size = 2 * furthest * mesh_density + 1
+
+    if plot:
+        fig, ax = plt.subplots()
+        y, x = np.mgrid[-furthest:furthest + delta:delta, -furthest:furthest + delta:delta]
+
+    if latents is not None:
+        num_latents = NUM_LATENTS
+        known = latents < num_latents
+        if not np.all(known):
+            print("lats", latents[~known])
+        grid = VisitationGrid(furthest, mesh_density, num_latents=num_latents)
+        grid.add(coms[known], latents[known])
+        dict_visit = collections.OrderedDict()  # keys: latents, values: np.array with number of visitations
+        for i in range(num_latents):  # use integer to define the latents
+            dict_visit[i] = grid.counts(i)
+
+        # keep track of the overlap
+        overlap = 0
+        # fix the colors for each latent
+        num_colors = num_latents + 2  # +2 for the 0 and Repetitions NOT COUNTING THE WALLS
+        # create a matrix with entries corresponding to the latent that was there (or other if several/wall/nothing)
+        visitation_by_lat = np.zeros((grid_size, grid_size))
+        for i, visit in dict_visit.items():
+            lat_visit = np.where(visit == 0, visit, i + 1)  # transform the map into 0 or i+1
+            visitation_by_lat += lat_visit
+            overlap += np.sum(np.where(visitation_by_lat > lat_visit))  # add the overlaps of this latent
+            visitation_by_lat = np.where(visitation_by_lat <= i + 1, visitation_by_lat,
+                                         num_colors - 1)  # mark overlaps
+        if plot:
+            cmap = plt.get_cmap('nipy_spectral', num_colors)  # add one color for the walls
+            map_plot = ax.pcolormesh(x, y, visitation_by_lat, cmap=cmap, vmin=0.1,
+                                     vmax=num_latents + 1)  # before 1 (will it affect when no walls?)
+            color_len = (num_colors - 1.) / num_colors
+            ticks = np.arange(color_len / 2., num_colors - 1, color_len)
+            cbar = fig.colorbar(map_plot, ticks=ticks)
+            latent_tick_labels = ['latent: ' + str(i) for i in list(dict_visit.keys())]
+            cbar.ax.set_yticklabels(
+                ['No visitation'] + latent_tick_labels + ['Repetitions'])  # horizontal colorbar
+        # still log the total visitation
+        visitation_all = grid.counts()
+    else:
+        grid = VisitationGrid(furthest, mesh_density)
+        grid.add(coms)
+        visitation_all = grid.counts()
+        if plot:
+            plt.pcolormesh(x, y, visitation_all, vmax=mesh_density)
+        overlap = np.sum(np.where(visitation_all > 1, visitation_all, 0.))  # sum of all visitations larger than 1
+
+    if plot:
+        ax.set_xlim([x[0][0], x[0][-1]])
+        ax.set_ylim([y[0][0], y[-1][0]])
+        exp_name = log_dir.split('/')[-1] if log_dir else '?'
+        ax.set_title(visit_prefix + 'visitation: ' + exp_name)
+        if log_dir is None:
+            log_dir = '/home/wr1/rllab/data/local/transfer/'
+        plt.savefig(osp.join(log_dir, visit_prefix + 'visitation.png'))  # this saves the current figure, here f
+        plt.cla()
+        plt.clf()
+        plt.close('all')
+        gc.collect()
+
+    return [('VisitationTotal', np.count_nonzero(visitation_all)), ('VisitationOverlap', overlap)]
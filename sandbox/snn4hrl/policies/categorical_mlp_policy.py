@@ -6,7 +6,9 @@ import numpy as np
 from rllab.core.lasagne_powered import LasagnePowered
 from rllab.core.network import MLP
 from rllab.core.serializable import Serializable
+from rllab.misc import logger
 
+from sandbox.snn4hrl.core.numpy_forward import NumpyForward
 from sandbox.snn4hrl.distributions.categorical import Categorical_oneAxis as Categorical
 # from sandbox.snn4hrl.distributions.categorical import from_index
 # from rllab.distributions.categorical import Categorical
@@ -65,6 +67,11 @@ class CategoricalMLPPolicy(StochasticPolicy, LasagnePowered, Serializable):
         self._l_obs = prob_network.input_layer
         self._f_prob = ext.compile_function([prob_network.input_layer.input_var], L.get_output(
             prob_network.output_layer))
+        try:  # used instead of _f_prob in dist_info
+            self._forward = NumpyForward([prob_network.output_layer])
+        except NotImplementedError as e:
+            logger.log("Using the Theano forward pass of the policy: %s" % e)
+            self._forward = None
 
         self._dist = Categorical(env_spec.action_space.n)
         self._layers = prob_network.layers # Rui: added layers for function get_params()
@@ -88,7 +95,15 @@ class CategoricalMLPPolicy(StochasticPolicy, LasagnePowered, Serializable):
 
     @overrides
     def dist_info(self, obs, state_infos=None):
-        return dict(prob=self._f_prob(obs))
+        if self._forward is None:
+            return dict(prob=self._f_prob(obs))
+        return dict(prob=self._forward(obs)[0])
+
+    @overrides
+    def set_param_values(self, flattened_params, **tags):
+        super(CategoricalMLPPolicy, self).set_param_values(flattened_params, **tags)
+        if self._forward is not None:
+            self._forward.refresh()
 
     # The return value is a pair. The first item is a matrix (N, A), where each
     # entry corresponds to the action value taken. The second item is a vector
@@ -118,9 +133,9 @@ class CategoricalMLPPolicy(StochasticPolicy, LasagnePowered, Serializable):
         if self._set_std_to_0:
             # indexes = [np.argmax(dist_info['prob']) for dist_info in dist_infos]
             # actions = from_index(indexes, dim=len(dist_infos[0]['prob']))
-            actions = [np.argmax(dist_info['prob']) for dist_info in dist_infos]
+            actions = list(np.argmax(dist_infos['prob'], axis=1))
         else:
-            actions = list(map(self.action_space.weighted_sample, dist_infos['prob']))
+            actions = list(self.action_space.weighted_sample_n(dist_infos['prob']))
         latents = np.array([[]]* len(actions))  # fake latents
         return actions, dict(**dist_infos, latents=latents)
 
@@ -151,3 +166,5 @@ class CategoricalMLPPolicy(StochasticPolicy, LasagnePowered, Serializable):
         for param in local_params:
             # print("new", param.name)
             param.set_value(params_value_by_name[param.name])
+        if self._forward is not None:
+            self._forward.refresh()
@@ -1,8 +1,5 @@
-import json
-import os
 from contextlib import contextmanager
 
-import joblib
 import lasagne
 import lasagne.layers as L
 import lasagne.nonlinearities as NL
@@ -10,7 +7,6 @@ import numpy as np
 import theano
 import theano.tensor as TT
 
-from rllab import config
 from rllab.core.lasagne_layers import ParamLayer
 from rllab.core.lasagne_powered import LasagnePowered
 from rllab.core.network import MLP
@@ -19,6 +15,7 @@ from rllab.distributions.diagonal_gaussian import DiagonalGaussian
 from rllab.envs.mujoco.gather.gather_env import GatherEnv
 from rllab.envs.mujoco.maze.maze_env import MazeEnv
 from rllab.envs.normalized_env import NormalizedEnv  # this is just to check if the env passed is a normalized maze
+from rllab.misc import checkpoints
 from rllab.misc import ext
 from rllab.misc import logger
 from rllab.misc.overrides import overrides
@@ -93,9 +90,7 @@ class GaussianMLPPolicy_multi_hier(StochasticPolicy, LasagnePowered, Serializabl
         self.old_hidden_sizes = []
         # assume json always given
         for json_path in self.json_paths:
-            data = json.load(open(os.path.join(config.PROJECT_PATH, json_path), 'r'))
-            old_json_policy = data['json_args']["policy"]
-            self.old_hidden_sizes.append(old_json_policy['hidden_sizes'])
+            self.old_hidden_sizes.append(checkpoints.load_policy_args(json_path=json_path)['hidden_sizes'])
 
         # retrieve dimensions and check consistency
         if isinstance(env, MazeEnv) or isinstance(env, GatherEnv):
@@ -180,7 +175,7 @@ class GaussianMLPPolicy_multi_hier(StochasticPolicy, LasagnePowered, Serializabl
         if self.json_paths and self.npz_paths:
             old_params_dict = {}
             for i, npz_path in enumerate(self.npz_paths):
-                params_dict = dict(np.load(os.path.join(config.PROJECT_PATH, npz_path)))
+                params_dict = checkpoints.load_policy_params(npz_path=npz_path)
                 renamed_warm_params_dict = {}
                 for key in params_dict.keys():
                     if key == 'output_log_std.param':
@@ -194,15 +189,14 @@ class GaussianMLPPolicy_multi_hier(StochasticPolicy, LasagnePowered, Serializabl
         elif self.pkl_paths:
             old_params_dict = {}
             for i, pkl_path in enumerate(self.pkl_paths):
-                data = joblib.load(os.path.join(config.PROJECT_PATH, pkl_path))
-                params = data['policy'].get_params_internal()
-                for param in params:
-                    if param.name == 'output_log_std.param':
-                        old_params_dict['output_log_std{}.param'.format(i)] = param.get_value()
-                    elif 'meanMLP_' == param.name[:8]:
-                        old_params_dict['meanMLP{}_'.format(i)+param.name[8:]] = param.get_value()
+                params_dict = checkpoints.load_policy_params(pkl_path=pkl_path)
+                for key in params_dict.keys():
+                    if key == 'output_log_std.param':
+                        old_params_dict['output_log_std{}.param'.format(i)] = params_dict[key]
+                    elif 'meanMLP_' == key[:8]:
+                        old_params_dict['meanMLP{}_'.format(i)+key[8:]] = params_dict[key]
                     else:
-                        old_params_dict['meanMLP{}_'.format(i)+param.name] = param.get_value()
+                        old_params_dict['meanMLP{}_'.format(i)+key] = params_dict[key]
             self.set_old_params(old_params_dict)
 
         # new layers actually selecting the correct output
@@ -1,8 +1,5 @@
-import json
-import os
 from contextlib import contextmanager
 
-import joblib
 import lasagne
 import lasagne.layers as L
 import lasagne.nonlinearities as NL
@@ -10,7 +7,6 @@ import numpy as np
 import theano
 import theano.tensor as TT
 
-from rllab import config
 from rllab.core.lasagne_layers import ParamLayer
 from rllab.core.lasagne_powered import LasagnePowered
 from rllab.core.network import MLP
@@ -20,12 +16,14 @@ from rllab.envs.mujoco.gather.gather_env import GatherEnv
 from rllab.envs.mujoco.maze.maze_env import MazeEnv
 from rllab.envs.normalized_env import NormalizedEnv  # this is just to check if the env passed is a normalized maze
 from rllab.misc import autoargs
+from rllab.misc import checkpoints
 from rllab.misc import ext
 from rllab.misc import logger
 from rllab.misc.overrides import overrides
 from rllab.policies.base import StochasticPolicy
 from rllab.spaces import Box
 from sandbox.snn4hrl.core.lasagne_layers import BilinearIntegrationLayer, CropLayer
+from sandbox.snn4hrl.core.numpy_forward import NumpyForward
 from sandbox.snn4hrl.distributions.categorical import Categorical_oneAxis as Categorical
 from rllab.distributions.bernoulli import Bernoulli
 
@@ -86,33 +84,23 @@ class GaussianMLPPolicy_snn_hier(StochasticPolicy, LasagnePowered, Serializable)
         self.latent_fix = np.array([])  # this will hold the latents variable sampled in reset()
         self.shared_latent_var = theano.shared(self.latent_fix)  # this is for external lat! update that
         self._set_std_to_0 = False
+        self._forward = None
 
         self.trainable_snn = trainable_snn
         self.external_latent = external_latent
         self.pkl_path = pkl_path
         self.json_path = json_path
         self.npz_path = npz_path
-        self.old_policy = None
-
-        if self.json_path:  # there is another one after defining all the NN to warm-start the params of the SNN
-            data = json.load(
-                open(os.path.join(config.PROJECT_PATH, self.json_path), 'r'))  # I should do this with the json file
-            self.old_policy_json = data['json_args']["policy"]
-            self.latent_dim = self.old_policy_json['latent_dim']
-            self.latent_name = self.old_policy_json['latent_name']
-            self.bilinear_integration = self.old_policy_json['bilinear_integration']
-            self.resample = self.old_policy_json['resample']  # this could not be needed...
-            self.min_std = self.old_policy_json['min_std']
-            self.hidden_sizes_snn = self.old_policy_json['hidden_sizes']
-        elif self.pkl_path:
-            data = joblib.load(os.path.join(config.PROJECT_PATH, self.pkl_path))
-            self.old_policy = data["policy"]
-            self.latent_dim = self.old_policy.latent_dim
-            self.latent_name = self.old_policy.latent_name
-            self.bilinear_integration = self.old_policy.bilinear_integration
-            self.resample = self.old_policy.resample  # this could not be needed...
-            self.min_std = self.old_policy.min_std
-            self.hidden_sizes_snn = self.old_policy.hidden_sizes
+
+        # there is another one after defining all the NN to warm-start the params of the SNN
+        if self.json_path or self.pkl_path:
+            old_policy_args = checkpoints.load_policy_args(self.pkl_path, self.json_path)
+            self.latent_dim = old_policy_args['latent_dim']
+            self.latent_name = old_policy_args['latent_name']
+            self.bilinear_integration = old_policy_args['bilinear_integration']
+            self.resample = old_policy_args['resample']  # this could not be needed...
+            self.min_std = old_policy_args['min_std']
+            self.hidden_sizes_snn = old_policy_args['hidden_sizes']
 
         if self.latent_name == 'normal':
             self.latent_dist = DiagonalGaussian(self.latent_dim)
@@ -234,14 +222,9 @@ class GaussianMLPPolicy_snn_hier(StochasticPolicy, LasagnePowered, Serializable)
                 for param, tags in layer.params.items():  # params of layer are OrDict: key=the shared var, val=tags
                     tags.remove("trainable")
 
-        if self.json_path and self.npz_path:
-            warm_params_dict = dict(np.load(os.path.join(config.PROJECT_PATH, self.npz_path)))
-            # keys = list(param_dict.keys())
+        if (self.json_path and self.npz_path) or self.pkl_path:
+            warm_params_dict = checkpoints.load_policy_params(self.pkl_path, self.npz_path if self.json_path else None)
             self.set_params_snn(warm_params_dict)
-        elif self.pkl_path:
-            data = joblib.load(os.path.join(config.PROJECT_PATH, self.pkl_path))
-            warm_params = data['policy'].get_params_internal()
-            self.set_params_snn(warm_params)
 
         mean_var, log_std_var = L.get_output([l_mean, l_log_std])
 
@@ -280,12 +263,27 @@ class GaussianMLPPolicy_snn_hier(StochasticPolicy, LasagnePowered, Serializable)
             inputs=[all_obs_var],
             outputs=selection_var,
         )
+        try:  # used instead of _f_select and _f_dist in the rollouts
+            self._forward = NumpyForward([l_selection, l_mean, l_log_std])
+        except NotImplementedError as e:  # e.g. the float64 shared_latent_var of external_latent
+            logger.log("Using the Theano forward pass of the hierarchical policy: %s" % e)
+            # the selector is evaluated once for the three outputs (the graphs of mean_var and log_std_var include it)
+            self._f_select_dist = ext.compile_function(
+                inputs=[all_obs_var],
+                outputs=[selection_var, mean_var, log_std_var],
+            )
 
     # # I shouldn't need the latent space anymore
     @property
     def latent_space(self):
         return Box(low=-np.inf, high=np.inf, shape=(1,))
 
+    @overrides
+    def set_param_values(self, flattened_params, **tags):
+        super(GaussianMLPPolicy_snn_hier, self).set_param_values(flattened_params, **tags)
+        if self._forward is not None:
+            self._forward.refresh()
+
     def get_params_snn(self):
         params = []
         for layer in self._layers_snn:
@@ -310,6 +308,8 @@ class GaussianMLPPolicy_snn_hier(StochasticPolicy, LasagnePowered, Serializable)
         for param in local_params:
             # print("new", param.name)
             param.set_value(params_value_by_name[param.name])
+        if self._forward is not None:
+            self._forward.refresh()
 
     def dist_info_sym(self, obs_var, state_info_var=None):
         mean_var, log_std_var = L.get_output([self._l_mean, self._l_log_std], obs_var)
@@ -325,10 +325,13 @@ class GaussianMLPPolicy_snn_hier(StochasticPolicy, LasagnePowered, Serializable)
         return actions[0], {k: v[0] for k, v in outputs.items()}
 
     def get_actions(self, observations):
-
-        selector_output = self._f_select(observations)
-        # print("obeservation", len(observations))
-        mean, log_std = self._f_dist(observations)
+        if self._forward is None:
+            # print("obeservation", len(observations))
+            selector_output, mean, log_std = self._f_select_dist(observations)
+        else:
+            selector_output, mean, log_std = self._forward(observations)
+            if self.min_std is not None:
+                log_std = np.maximum(log_std, np.log(self.min_std))
 
         if self._set_std_to_0:
             actions = mean
@@ -367,6 +370,8 @@ class GaussianMLPPolicy_snn_hier(StochasticPolicy, LasagnePowered, Serializable)
             pass
         # this is needed for the external latent!!
         self.shared_latent_var.set_value(np.array(self.latent_fix))
+        if self.external_latent and self._forward is not None:
+            self._forward.refresh()
 
     def log_diagnostics(self, paths):
         log_stds = np.vstack([path["agent_infos"]["log_std"] for path in paths])
@@ -1,5 +1,3 @@
-import os
-import joblib
 import lasagne
 import lasagne.layers as L
 import lasagne.nonlinearities as NL
@@ -8,7 +6,6 @@ import theano.tensor as TT
 import numpy as np
 from contextlib import contextmanager
 
-from rllab import config
 from rllab.core.lasagne_layers import ParamLayer
 from rllab.core.lasagne_powered import LasagnePowered
 from rllab.core.network import MLP
@@ -22,6 +19,7 @@ from rllab.misc.overrides import overrides
 from rllab.misc import logger
 from rllab.misc import ext
 from rllab.misc import autoargs
+from rllab.misc import checkpoints
 from rllab.distributions.diagonal_gaussian import DiagonalGaussian
 from rllab.distributions.bernoulli import Bernoulli
 # from rllab.distributions.categorical import Categorical
@@ -29,6 +27,7 @@ from rllab.envs.mujoco.gather.gather_env import GatherEnv
 from rllab.envs.mujoco.maze.maze_env import MazeEnv
 from rllab.envs.normalized_env import NormalizedEnv  # this is just to check if the env passed is a normalized maze
 
+from sandbox.snn4hrl.core.numpy_forward import NumpyForward
 from sandbox.snn4hrl.distributions.categorical import Categorical_oneAxis as Categorical
 
 
@@ -73,6 +72,8 @@ class GaussianMLPPolicy_snn_restorable(StochasticPolicy, LasagnePowered, Seriali
             output_nonlinearity=None,
             min_std=1e-4,
             pkl_path=None,
+            json_path=None,
+            npz_path=None,
     ):
         """
         :param latent_dim: dimension of the latent variables
@@ -80,6 +81,10 @@ class GaussianMLPPolicy_snn_restorable(StochasticPolicy, LasagnePowered, Seriali
         :param bilinear_integration: Boolean indicator of bilinear integration or simple concatenation
         :param resample: Boolean indicator of resampling at every step or only at the start of the rollout (or whenever
         agent is reset, which can happen several times along the rollout with rollout in utils_snn)
+        :param pkl_path: snapshot of the pre-training experiment, to restore the latent args and the params from
+        :param json_path: json of the pre-training experiment (or exported with checkpoints.export_policy). Used instead
+        of pkl_path if given
+        :param npz_path: params exported with checkpoints.export_policy. Used instead of pkl_path if given
         """
         self.latent_dim = latent_dim  ##could I avoid needing this self for the get_action?
         self.latent_name = latent_name
@@ -91,18 +96,20 @@ class GaussianMLPPolicy_snn_restorable(StochasticPolicy, LasagnePowered, Seriali
         self.pre_fix_latent = np.array([])  # if this is not empty when using reset() it will use this latent
         self.latent_fix = np.array([])  # this will hold the latents variable sampled in reset()
         self._set_std_to_0 = False
+        self._forward = None
 
         self.pkl_path = pkl_path
-
-        if self.pkl_path:
-            data = joblib.load(os.path.join(config.PROJECT_PATH, self.pkl_path))
-            self.old_policy = data["policy"]
-            self.latent_dim = self.old_policy.latent_dim
-            self.latent_name = self.old_policy.latent_name
-            self.bilinear_integration = self.old_policy.bilinear_integration
-            self.resample = self.old_policy.resample  # this could not be needed...
-            self.min_std = self.old_policy.min_std
-            self.hidden_sizes_snn = self.old_policy.hidden_sizes
+        self.json_path = json_path
+        self.npz_path = npz_path
+
+        if self.json_path or self.pkl_path:
+            old_policy_args = checkpoints.load_policy_args(self.pkl_path, self.json_path)
+            self.latent_dim = old_policy_args['latent_dim']
+            self.latent_name = old_policy_args['latent_name']
+            self.bilinear_integration = old_policy_args['bilinear_integration']
+            self.resample = old_policy_args['resample']  # this could not be needed...
+            self.min_std = old_policy_args['min_std']
+            self.hidden_sizes_snn = old_policy_args['hidden_sizes']
 
         if latent_name == 'normal':
             self.latent_dist = DiagonalGaussian(self.latent_dim)
@@ -191,10 +198,9 @@ class GaussianMLPPolicy_snn_restorable(StochasticPolicy, LasagnePowered, Seriali
 
         self._layers_snn = self._layers_mean + self._layers_log_std  # this returns a list with the "snn" layers
 
-        if self.pkl_path: # restore from pkl file
-            data = joblib.load(os.path.join(config.PROJECT_PATH, self.pkl_path))
-            warm_params = data['policy'].get_params_internal()
-            self.set_params_snn(warm_params)
+        if self.npz_path or self.pkl_path:  # restore from the exported params or the pkl file
+            warm_params_dict = checkpoints.load_policy_params(self.pkl_path, self.npz_path)
+            self.set_params_snn(warm_params_dict)
 
         mean_var, log_std_var = L.get_output([l_mean, l_log_std])
 
@@ -213,6 +219,10 @@ class GaussianMLPPolicy_snn_restorable(StochasticPolicy, LasagnePowered, Seriali
             inputs=[obs_var],
             outputs=[mean_var, log_std_var],
         )
+        try:  # used instead of _f_dist in the rollouts
+            self._forward = NumpyForward([l_mean, l_log_std])
+        except NotImplementedError as e:
+            logger.log("Using the Theano forward pass of the low-level policy: %s" % e)
 
 # #  this is currently not used, although it could, in dist_info_sym and in get_actions. Also we could refactor all..
 #         # this would actually be WRONG with the current obs_var definition
@@ -256,18 +266,54 @@ class GaussianMLPPolicy_snn_restorable(StochasticPolicy, LasagnePowered, Seriali
             log_std_var = TT.maximum(log_std_var, np.log(self.min_std))
         return dict(mean=mean_var, log_std=log_std_var)
 
+    def _mean_log_std(self, observations, latents):
+        # observations already trimmed to the robot part
+        if not self.latent_dim:
+            extended_obs = observations
+        elif self.bilinear_integration:
+            extended_obs = np.concatenate([observations, latents,
+                                           np.reshape(
+                                               observations[:, :, np.newaxis] * latents[:, np.newaxis, :],
+                                               (observations.shape[0], -1))],
+                                          axis=1)
+        else:
+            extended_obs = np.concatenate([observations, latents], axis=1)
+        if self._forward is None:
+            return self._f_dist(extended_obs)
+        mean, log_std = self._forward(extended_obs)
+        if self.min_std is not None:
+            log_std = np.maximum(log_std, np.log(self.min_std))
+        return mean, log_std
+
+    def dist_info(self, obs, state_infos):
+        """
+        :param state_infos: dict with the latents the actions were taken with (the agent_infos of the samples)
+        :return: dict of the mean and log_std of the current params, as in the agent_infos of get_actions
+        """
+        observations = np.asarray(obs)[:, :self.obs_robot_dim]
+        latents = np.asarray(state_infos["latents"]) if self.latent_dim else np.array([[]] * len(observations))
+        mean, log_std = self._mean_log_std(observations, latents)
+        return dict(mean=mean, log_std=log_std)
+
     @overrides
     def get_action(self, observation):
         actions, outputs = self.get_actions([observation])
         return actions[0], {k: v[0] for k, v in outputs.items()}
 
-    def get_actions(self, observations):
-        # observations: [ndarray]
-        observations = [observations[0][:self.obs_robot_dim]]
-        observations = np.array(observations)  # needed to do the outer product for the bilinear
+    def get_actions(self, observations, latents=None):
+        """
+        :param observations: [ndarray] or (N, obs_dim) array. Only the robot part of each observation is used
+        :param latents: optional (N, latent_dim) array (or a single latent) to use instead of the fixed one. This is
+        how the batched low-level rollout evaluates N envs, each under its own high-level action, in a single call
+        """
+        observations = np.array(observations)[:, :self.obs_robot_dim]  # needed to do the outer product for the bilinear
         # print(observations)
         if self.latent_dim:
-            if self.resample:
+            if latents is not None:
+                latents = np.asarray(latents)
+                if latents.ndim == 1:
+                    latents = np.tile(latents, [len(observations), 1])
+            elif self.resample:
                 latents = [self.latent_dist.sample(self.latent_dist_info) for _ in observations]
                 print('resampling the latents')
             else:
@@ -276,22 +322,10 @@ class GaussianMLPPolicy_snn_restorable(StochasticPolicy, LasagnePowered, Seriali
                 if len(self.pre_fix_latent) == self.latent_dim:  # If we have a pre_fix, reset will put the latent to it
                     self.reset()  # this overwrites the latent sampled or in latent_fix
                 latents = np.tile(self.latent_fix, [len(observations), 1])  # maybe a broadcast operation better...
-            if self.bilinear_integration:
-                extended_obs = np.concatenate([observations, latents,
-                                               np.reshape(
-                                                   observations[:, :, np.newaxis] * latents[:, np.newaxis, :],
-                                                   (observations.shape[0], -1))],
-                                              axis=1)
-                # print("obs:", observations.shape) # 1*47
-                # print("latents:", latents.shape) # 1*6
-                # print("extended obs:", extended_obs.shape) # 1*335
-            else:
-                extended_obs = np.concatenate([observations, latents], axis=1)
         else:
             latents = np.array([[]] * len(observations))
-            extended_obs = observations
         # make mean, log_std also depend on the latents (as observ.)
-        mean, log_std = self._f_dist(extended_obs)
+        mean, log_std = self._mean_log_std(observations, latents)
         # print("log_std", log_std)
 
         if self._set_std_to_0:
@@ -302,6 +336,12 @@ class GaussianMLPPolicy_snn_restorable(StochasticPolicy, LasagnePowered, Seriali
             actions = rnd * np.exp(log_std) + mean
         return actions, dict(mean=mean, log_std=log_std, latents=latents)
 
+    @overrides
+    def set_param_values(self, flattened_params, **tags):
+        super(GaussianMLPPolicy_snn_restorable, self).set_param_values(flattened_params, **tags)
+        if self._forward is not None:
+            self._forward.refresh()
+
     def get_params_snn(self):
         params = []
         for layer in self._layers_snn:
@@ -326,6 +366,8 @@ class GaussianMLPPolicy_snn_restorable(StochasticPolicy, LasagnePowered, Seriali
         for param in local_params:
             # print("new", param.name)
             param.set_value(params_value_by_name[param.name])
+        if self._forward is not None:
+            self._forward.refresh()
 
     def set_pre_fix_latent(self, latent):
         self.pre_fix_latent = np.array(latent)
@@ -0,0 +1,51 @@
+"""
+Micro-benchmark of the maze sensor readings of FastMazeEnv: the vectorized grid traversal (grid_ray_readings) against
+the per-ray loop it replaced (grid_ray_readings_loop), on the four-room maze of the Ant experiments.
+"""
+import argparse
+import math
+import timeit
+
+import numpy as np
+
+from rllab.envs.mujoco.maze.maze_env_utils import construct_maze, structure_to_grids, grid_ray_readings, \
+    grid_ray_readings_loop
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--maze_id', type=int, default=11)
+parser.add_argument('--size_scaling', type=float, default=3.)  # MAZE_SIZE_SCALING of AntMazeEnv
+parser.add_argument('--n_bins', type=int, default=20)
+parser.add_argument('--n_calls', type=int, default=2000)
+args = parser.parse_args()
+
+structure = construct_maze(maze_id=args.maze_id)
+wall_grid, goal_grid = structure_to_grids(structure)
+o_xy = np.array([1, 3]) * args.size_scaling  # initial cell of the robot in the four-room maze
+rng = np.random.RandomState(0)
+states = [(rng.uniform(-args.size_scaling, 6 * args.size_scaling, size=2), rng.uniform(-math.pi, math.pi))
+          for _ in range(args.n_calls)]
+
+
+def ray_oris(ori):
+    return [ori - math.pi + ray_idx / (args.n_bins - 1) * 2 * math.pi for ray_idx in range(args.n_bins)]
+
+
+for sensor_range in [20., 40.]:
+    def run_vectorized():
+        for robot_xy, ori in states:
+            grid_ray_readings(wall_grid, goal_grid, o_xy, robot_xy, ray_oris(ori), sensor_range, args.size_scaling)
+
+    def run_loop():
+        for robot_xy, ori in states:
+            grid_ray_readings_loop(structure, o_xy, robot_xy, ray_oris(ori), sensor_range, args.size_scaling)
+
+    for robot_xy, ori in states:
+        readings = grid_ray_readings(wall_grid, goal_grid, o_xy, robot_xy, ray_oris(ori), sensor_range,
+                                     args.size_scaling)
+        expected = grid_ray_readings_loop(structure, o_xy, robot_xy, ray_oris(ori), sensor_range, args.size_scaling)
+        assert np.array_equal(readings, expected)
+
+    loop_time = min(timeit.repeat(run_loop, number=1, repeat=3)) / args.n_calls
+    vectorized_time = min(timeit.repeat(run_vectorized, number=1, repeat=3)) / args.n_calls
+    print("sensor_range %g: loop %.1f us/obs, vectorized %.1f us/obs (x%.1f)" % (
+        sensor_range, loop_time * 1e6, vectorized_time * 1e6, loop_time / vectorized_time))
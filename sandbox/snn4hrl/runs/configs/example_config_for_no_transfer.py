@@ -4,6 +4,14 @@ train_high = True
 train_low_with_penalty = True
 
 n_parallel = 16 # 16
+parallel_optimizer = True # evaluate the conjugate gradient of TRPO on the n_parallel workers, one shard of the batch each
+low_hvp_samples = None # or samples of the Hessian-vector products of the low policy update (None: the whole batch)
+low_adaptive_slices = False # pick the slices of the low policy update from the measured memory footprint
+low_cg_time_budget = None # or seconds for the conjugate gradient of the low policy update
+async_sampling = False # collect the paths of the next iteration during the policy updates (one iteration stale)
+diagnostics_in_background = True # rasterize and plot the visitations in a separate process
+diagnostics_plot_every = 1 # draw the visitation plots every that many iterations
+lockstep_envs = 1 # paths collected at once by every worker, stepping copies of the env in lockstep
 maze_id = 8 # 13
 
 fence = False
@@ -27,7 +35,8 @@ random_start = True
 velocity_field = False # whether to use manually-set velocity field as
 train_low_with_v_split = True # use HAAR
 train_low_with_v_gradient = False # useless
-baseline_name = 'linear'
+baseline_name = 'linear' # 'linear', 'streaming' or 'mlp'
+baseline_forget_factor = 0. # streaming baseline: weight of the previous fits in the new one
 low_level_entropy_penalty = 0.
 
 train_low_with_external = False # train with external rewards only, no auxiliary reward
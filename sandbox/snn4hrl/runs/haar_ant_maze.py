@@ -10,6 +10,7 @@ import joblib
 
 from rllab import config
 from rllab.baselines.linear_feature_baseline import LinearFeatureBaseline
+from rllab.baselines.streaming_linear_feature_baseline import StreamingLinearFeatureBaseline
 from rllab.config_personal import *
 from rllab.envs.normalized_env import normalize
 from rllab.misc.instrument import stub, run_experiment_lite
@@ -45,6 +46,8 @@ for maze_size_scaling in [4]:
         print("env_hier", env.spec)
         if par.baseline_name == 'linear':
             baseline = LinearFeatureBaseline(env_spec=env.spec)
+        elif par.baseline_name == 'streaming':
+            baseline = StreamingLinearFeatureBaseline(env_spec=env.spec, forget_factor=par.baseline_forget_factor)
         elif par.baseline_name == 'mlp':
             baseline = GaussianMLPBaseline(env_spec=env.spec)
 
@@ -80,6 +83,13 @@ for maze_size_scaling in [4]:
             low_level_entropy_penalty = par.low_level_entropy_penalty,
             itr_delay=par.itr_delay,
             transfer=par.transfer,
+            optimizer_args=dict(parallel=par.parallel_optimizer),
+            optimizer_low_args=dict(parallel=par.parallel_optimizer, hvp_samples=par.low_hvp_samples,
+                                    cg_time_budget=par.low_cg_time_budget, adaptive_slices=par.low_adaptive_slices),
+            async_sampling=par.async_sampling,
+            diagnostics_in_background=par.diagnostics_in_background,
+            diagnostics_plot_every=par.diagnostics_plot_every,
+            lockstep_envs=par.lockstep_envs,
         )
 
         for s in [40, 30, 20, 10, 0]:  # range(10, 110, 10):  # [10, 20, 30, 40, 50]:
@@ -5,10 +5,9 @@ from rllab.misc import special
 from rllab.misc import tensor_utils
 from rllab.algos import util
 import rllab.misc.logger as logger
-import joblib
 
-from rllab import config
 from rllab.baselines.linear_feature_baseline import LinearFeatureBaseline
+from rllab.baselines.streaming_linear_feature_baseline import StreamingLinearFeatureBaseline
 from rllab.config_personal import *
 from rllab.envs.normalized_env import normalize
 from sandbox.snn4hrl.envs.hierarchized_snn_env import hierarchize_snn
@@ -47,19 +46,20 @@ class Sampler(object):
 
 
 class LowSampler(Sampler):
-    def __init__(self):
+    def __init__(self, low_policy, baseline_name='linear', baseline_forget_factor=0.):
         """
-        :type algo: BatchPolopt
+        :param low_policy: the low-level policy of the algo, whose distribution gives the entropy of the samples
+        :param baseline_name: 'streaming' for a StreamingLinearFeatureBaseline of the low-level paths, else a
+        LinearFeatureBaseline
+        :param baseline_forget_factor: forget_factor of the StreamingLinearFeatureBaseline
         """
         env_low = normalize(AntEnv(ego_obs=True))
         # baseline_low = LinearFeatureBaseline(env_spec=env_low.spec)
-        # low_policy = env.low_policy
-        pkl_path = '/home/lsy/Desktop/rllab/data/local/Ant-snn1000/Ant-snn_10MI_5grid_6latCat_bil_0040/params.pkl'
-        data = joblib.load(os.path.join(config.PROJECT_PATH, pkl_path))
-        low_policy = data['policy']
 
-
-        self.baseline = LinearFeatureBaseline(env_spec=env_low.spec)
+        if baseline_name == 'streaming':
+            self.baseline = StreamingLinearFeatureBaseline(env_spec=env_low.spec, forget_factor=baseline_forget_factor)
+        else:
+            self.baseline = LinearFeatureBaseline(env_spec=env_low.spec)
         self.discount = 0.99
         self.gae_lambda = 1.0
         self.center_adv = True
@@ -67,36 +67,30 @@ class LowSampler(Sampler):
         self.policy = low_policy
 
     def process_samples(self, itr, paths):
-        baselines = []
-        returns = []
-
         if hasattr(self.baseline, "predict_n"):
             all_path_baselines = self.baseline.predict_n(paths)
         else:
             all_path_baselines = [self.baseline.predict(path) for path in paths]
 
-        for idx, path in enumerate(paths):
-            path_baselines = np.append(all_path_baselines[idx], 0)
-            deltas = path["rewards"] + \
-                     self.discount * path_baselines[1:] - \
-                     path_baselines[:-1]
-            path["advantages"] = special.discount_cumsum(
-                deltas, self.discount * self.gae_lambda)
-            path["returns"] = special.discount_cumsum(path["rewards"], self.discount)
-            baselines.append(path_baselines[:-1])
-            returns.append(path["returns"])
-
-        ev = special.explained_variance_1d(
-            np.concatenate(baselines),
-            np.concatenate(returns)
-        )
+        # advantages and returns of all the paths at once, the ones of every path being views of them
+        lengths = [len(path["rewards"]) for path in paths]
+        all_baselines = tensor_utils.concat_tensor_list(all_path_baselines)
+        all_rewards = tensor_utils.concat_tensor_list([path["rewards"] for path in paths])
+        all_advantages, all_returns = special.gae_n(
+            all_rewards, all_baselines, lengths, self.discount, self.gae_lambda)
+        for path, advantages, returns in zip(paths, tensor_utils.split_tensor_list(all_advantages, lengths),
+                                             tensor_utils.split_tensor_list(all_returns, lengths)):
+            path["advantages"] = advantages
+            path["returns"] = returns
+
+        ev = special.explained_variance_1d(all_baselines, all_returns)
 
         # if not self.algo.policy.recurrent:
         observations = tensor_utils.concat_tensor_list([path["observations"] for path in paths])
         actions = tensor_utils.concat_tensor_list([path["actions"] for path in paths])
-        rewards = tensor_utils.concat_tensor_list([path["rewards"] for path in paths])
-        returns = tensor_utils.concat_tensor_list([path["returns"] for path in paths])
-        advantages = tensor_utils.concat_tensor_list([path["advantages"] for path in paths])
+        rewards = all_rewards
+        returns = all_returns
+        advantages = all_advantages
         env_infos = tensor_utils.concat_tensor_dict_list([path["env_infos"] for path in paths])
         agent_infos = tensor_utils.concat_tensor_dict_list([path["agent_infos"] for path in paths])
 
@@ -130,6 +124,8 @@ class LowSampler(Sampler):
             self.baseline.fit_with_samples(paths, samples_data)
         else:
             self.baseline.fit(paths)
+        if hasattr(self.baseline, 'clear_features'):
+            self.baseline.clear_features(paths)
         logger.log("fitted")
 
         with logger.tabular_prefix('Low_'):
@@ -5,11 +5,15 @@ from rllab.envs.normalized_env import NormalizedEnv  # this is just to check if
 from rllab.misc import ext
 
 def rollout(env, agent, max_path_length=np.inf, reset_start_rollout=True, keep_rendered_rgbs=False,
-            animated=False, speedup=1):
+            animated=False, speedup=1, path_buffer=None):
     """
     :param reset_start_rollout: whether to reset the env when calling this function
     :param keep_rendered_rgbs: whether to keep a list of all rgb_arrays (for future video making)
+    :param path_buffer: optional PathBuffer created with extra_keys=('terminated',). If given, the steps are written
+    into it instead of being appended to lists and the returned path holds views into the buffer
     """
+    if path_buffer is not None:
+        assert 'terminated' in path_buffer.extra_keys
     observations = []
     actions = []
     rewards = []
@@ -36,16 +40,19 @@ def rollout(env, agent, max_path_length=np.inf, reset_start_rollout=True, keep_r
         next_o, r, d, env_info = env.step(a)
         # print("next_obs", next_o.shape)
         # print("env", env)
-        observations.append(env.observation_space.flatten(o))
-        rewards.append(r)
-        actions.append(env.action_space.flatten(a))
-        agent_infos.append(agent_info)
-        env_infos.append(env_info)
+        if path_buffer is not None:
+            path_buffer.append(env.observation_space.flatten(o), env.action_space.flatten(a), r, agent_info, env_info,
+                               terminated=int(bool(d)))
+        else:
+            observations.append(env.observation_space.flatten(o))
+            rewards.append(r)
+            actions.append(env.action_space.flatten(a))
+            agent_infos.append(agent_info)
+            env_infos.append(env_info)
+            terminated.append(int(bool(d)))
         path_length += 1
         if d:
-            terminated.append(1)
             break
-        terminated.append(0)
         o = next_o
         if keep_rendered_rgbs:  # will return a new entry to the path dict with all rendered images
             rendered_rgbs.append(env.render(mode='rgb_array'))
@@ -56,6 +63,12 @@ def rollout(env, agent, max_path_length=np.inf, reset_start_rollout=True, keep_r
     # if animated:   # this is off as in the case of being an inner rollout, it will close the outer renderer!
         # env.render(close=True)
 
+    if path_buffer is not None:
+        path_dict = path_buffer.get_path()
+        if keep_rendered_rgbs:
+            path_dict['rendered_rgbs'] = tensor_utils.stack_tensor_list(rendered_rgbs)
+        return path_dict
+
     path_dict = dict(
         observations=tensor_utils.stack_tensor_list(observations),
         actions=tensor_utils.stack_tensor_list(actions),
@@ -71,6 +84,60 @@ def rollout(env, agent, max_path_length=np.inf, reset_start_rollout=True, keep_r
 
     return path_dict
 
+def rollout_lockstep(envs, agent, latents, max_path_length):
+    """
+    Batched version of rollout(..., reset_start_rollout=False) for the low-level policy: the N envs are stepped in
+    lockstep, each one under its own fixed latent, and the agent is queried only once per time-step for all the envs
+    that are not done yet. All the data is written into preallocated (N, max_path_length, dim) arrays.
+    :param envs: list of N envs, already in the state from which to continue
+    :param agent: low-level policy accepting get_actions(observations, latents=latents)
+    :param latents: (N, latent_dim) array with the latent each env is executed with
+    :return: dict with the same keys as rollout, where every array has two leading axis (N, max_path_length), plus
+    "path_lengths" with the number of valid steps of every env. Entries past the path length are zero.
+    """
+    n = len(envs)
+    max_path_length = int(max_path_length)
+    latents = np.asarray(latents)
+    obs = np.asarray([env.wrapped_env.get_current_obs() if isinstance(env, NormalizedEnv) else env.get_current_obs()
+                      for env in envs])
+    path_dict = None
+    path_lengths = np.zeros(n, dtype=int)
+    alive = np.arange(n)
+    for t in range(max_path_length):
+        actions, agent_infos = agent.get_actions(obs[alive], latents=latents[alive])
+        steps = [envs[idx].step(a) for idx, a in zip(alive, actions)]
+        if path_dict is None:  # the schema of the infos is only known after the first step
+            env = envs[0]
+            path_dict = dict(
+                observations=tensor_utils.zeros_tensor(env.observation_space.flatten(obs[0]), (n, max_path_length)),
+                actions=tensor_utils.zeros_tensor(env.action_space.flatten(actions[0]), (n, max_path_length)),
+                rewards=np.zeros((n, max_path_length)),
+                agent_infos=tensor_utils.zeros_tensor_dict(dict((k, v[0]) for k, v in agent_infos.items()),
+                                                           (n, max_path_length)),
+                env_infos=tensor_utils.zeros_tensor_dict(steps[0][3], (n, max_path_length)),
+                terminated=np.zeros((n, max_path_length), dtype=int),
+            )
+        path_dict['observations'][alive, t] = obs[alive]
+        path_dict['actions'][alive, t] = actions
+        for k, v in agent_infos.items():
+            path_dict['agent_infos'][k][alive, t] = v
+        still_alive = []
+        for idx, (next_o, r, d, env_info) in zip(alive, steps):
+            path_dict['rewards'][idx, t] = r
+            tensor_utils.set_tensor_dict(path_dict['env_infos'], (idx, t), env_info)
+            path_lengths[idx] += 1
+            if d:
+                path_dict['terminated'][idx, t] = 1
+            else:
+                obs[idx] = next_o
+                still_alive.append(idx)
+        alive = np.asarray(still_alive, dtype=int)
+        if len(alive) == 0:
+            break
+    path_dict['path_lengths'] = path_lengths
+    return path_dict
+
+
 def process_path(paths, itr, low_sampler):
     paths_low = []
     for idx, path in enumerate(paths):
@@ -113,3 +180,41 @@ def process_path(paths, itr, low_sampler):
     real_samples["importance_weights"] = np.ones_like(real_samples["advantages"])
 
     return real_samples
+
+
+def _flatten_high_steps(x):
+    # (T_high, K, ...) -> (T_high * K, ...), a view when the high-level steps have the same length. A ragged last
+    # step (when the path was done) makes an object array (or a list) of the high-level steps, concatenated instead
+    if isinstance(x, dict):
+        return dict((k, _flatten_high_steps(v)) for k, v in x.items())
+    if isinstance(x, np.ndarray) and x.dtype != object:
+        return x.reshape((-1,) + x.shape[2:])
+    return np.concatenate(list(x))
+
+
+def low_level_paths(paths, obs_robot_dim, high_step_rewards=None):
+    """
+    Low-level paths made of the full_path env infos of high-level paths: every key of the (T_high, K, ...) tensors of a
+    path is reshaped once into (T_high * K, ...), without copying when the high-level steps have the same length.
+    :param paths: high-level paths of a hierarchized env
+    :param obs_robot_dim: the low-level observations are trimmed to their first obs_robot_dim dimensions
+    :param high_step_rewards: optional list with an array for every path. Its i-th entry replaces the reward of all
+    the low-level steps of the i-th high-level step (the steps past its length keep their rewards)
+    :return: list of low-level paths
+    """
+    paths_low = []
+    for idx, path in enumerate(paths):
+        full_path = path['env_infos']['full_path']
+        rewards = _flatten_high_steps(full_path['rewards'])
+        if high_step_rewards is not None:
+            step_rewards = high_step_rewards[idx]
+            lengths = [len(r) for r in full_path['rewards'][:len(step_rewards)]]
+            rewards = np.concatenate([np.repeat(step_rewards, lengths), rewards[int(np.sum(lengths)):]])
+        paths_low.append(dict(
+            observations=_flatten_high_steps(full_path['observations'])[:, :obs_robot_dim],
+            actions=_flatten_high_steps(full_path['actions']),
+            rewards=rewards,
+            agent_infos=_flatten_high_steps(full_path['agent_infos']),
+            env_infos=_flatten_high_steps(full_path['env_infos']),
+        ))
+    return paths_low
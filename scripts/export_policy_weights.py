@@ -0,0 +1,19 @@
+import argparse
+
+from rllab.misc.checkpoints import export_policy
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Export the policy of a snapshot as an npz of its params and a json of its args, to be given as '
+                    'npz_path and json_path instead of pkl_path (e.g. to hierarchize_snn)')
+    parser.add_argument('file', type=str,
+                        help='path to the snapshot file')
+    parser.add_argument('--npz_path', type=str, default=None,
+                        help='where to write the params (default: next to the snapshot)')
+    parser.add_argument('--json_path', type=str, default=None,
+                        help='where to write the args (default: next to the snapshot)')
+    args = parser.parse_args()
+
+    npz_path, json_path = export_policy(args.file, npz_path=args.npz_path, json_path=args.json_path)
+    print("Exported the policy params to %s and its args to %s" % (npz_path, json_path))
@@ -5,6 +5,7 @@ sys.path.append(".")
 from rllab.misc.ext import is_iterable, set_seed
 from rllab.misc.instrument import concretize
 from rllab import config
+from rllab.misc import experiment_index
 import rllab.misc.logger as logger
 import argparse
 import os.path as osp
@@ -31,6 +32,8 @@ def run_experiment(argv):
     parser = argparse.ArgumentParser()
     parser.add_argument('--n_parallel', type=int, default=1,
                         help='Number of parallel workers to perform rollouts. 0 => don\'t start any workers')
+    parser.add_argument('--shared_paths', type=ast.literal_eval, default=False,
+                        help='Whether the workers send the collected paths back through shared memory')
     parser.add_argument(
         '--exp_name', type=str, default=default_exp_name, help='Name of the experiment.')
     parser.add_argument('--log_dir', type=str, default=None,
@@ -72,7 +75,7 @@ def run_experiment(argv):
 
     if args.n_parallel > 0:
         from rllab.sampler import parallel_sampler
-        parallel_sampler.initialize(n_parallel=args.n_parallel)
+        parallel_sampler.initialize(n_parallel=args.n_parallel, shared_paths=args.shared_paths)
         if args.seed is not None:
             parallel_sampler.set_seed(args.seed)
 
@@ -108,23 +111,29 @@ def run_experiment(argv):
     logger.set_log_tabular_only(args.log_tabular_only)
     logger.push_prefix("[%s] " % args.exp_name)
 
-    if args.resume_from is not None:
-        data = joblib.load(args.resume_from)
-        assert 'algo' in data
-        algo = data['algo']
-        algo.train()
-    else:
-        # read from stdin
-        if args.use_cloudpickle:
-            import cloudpickle
-            method_call = cloudpickle.loads(base64.b64decode(args.args_data))
-            method_call(variant_data)
+    experiment_index.record_run(log_dir, experiment_index.RUNNING)
+    try:
+        if args.resume_from is not None:
+            data = joblib.load(args.resume_from)
+            assert 'algo' in data
+            algo = data['algo']
+            algo.train()
         else:
-            data = pickle.loads(base64.b64decode(args.args_data))
-            maybe_iter = concretize(data)
-            if is_iterable(maybe_iter):
-                for _ in maybe_iter:
-                    pass
+            # read from stdin
+            if args.use_cloudpickle:
+                import cloudpickle
+                method_call = cloudpickle.loads(base64.b64decode(args.args_data))
+                method_call(variant_data)
+            else:
+                data = pickle.loads(base64.b64decode(args.args_data))
+                maybe_iter = concretize(data)
+                if is_iterable(maybe_iter):
+                    for _ in maybe_iter:
+                        pass
+    except BaseException:
+        experiment_index.record_run(log_dir, experiment_index.FAILED)
+        raise
+    experiment_index.record_run(log_dir, experiment_index.FINISHED)
 
     logger.set_snapshot_mode(prev_mode)
     logger.set_snapshot_dir(prev_snapshot_dir)
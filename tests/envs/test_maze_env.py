@@ -1,5 +1,7 @@
 import math
 
+import pytest
+
 from rllab.envs.mujoco.maze.maze_env_utils import line_intersect, ray_segment_intersect
 
 
@@ -8,3 +10,88 @@ def test_line_intersect():
     assert line_intersect((0, 0), (0, 1), (0, 0), (0, 1))[2] == 0
     assert ray_segment_intersect(ray=((0, 0), 0), segment=((1, -1), (1, 1))) == (1, 0)
     assert ray_segment_intersect(ray=((0, 0), math.pi), segment=((1, -1), (1, 1))) is None
+
+
+def test_grid_ray_readings():
+    import numpy as np
+    from rllab.envs.mujoco.maze.maze_env_utils import construct_maze, structure_to_grids, grid_ray_readings, \
+        grid_ray_readings_loop
+    structure = construct_maze(maze_id=11)
+    wall_grid, goal_grid = structure_to_grids(structure)
+    o_xy = np.array([1, 3]) * 2.
+    rng = np.random.RandomState(0)
+    for sensor_range in [0.5, 5., 10.]:
+        for _ in range(100):
+            robot_xy = rng.uniform(-3, 12, size=2)
+            ori = rng.uniform(-math.pi, math.pi)
+            ray_oris = [ori - math.pi + ray_idx / 19 * 2 * math.pi for ray_idx in range(20)]
+            readings = grid_ray_readings(wall_grid, goal_grid, o_xy, robot_xy, ray_oris, sensor_range, 2.)
+            expected = grid_ray_readings_loop(structure, o_xy, robot_xy, ray_oris, sensor_range, 2.)
+            assert np.array_equal(readings[0], expected[0])
+            assert np.array_equal(readings[1], expected[1])
+
+
+def test_grid_ray_readings_per_ray_origins():
+    import numpy as np
+    from rllab.envs.mujoco.maze.maze_env_utils import construct_maze, structure_to_grids, grid_ray_readings
+    wall_grid, goal_grid = structure_to_grids(construct_maze(maze_id=11))
+    o_xy = np.array([1, 3]) * 2.
+    ray_oris = [-math.pi + ray_idx / 9 * 2 * math.pi for ray_idx in range(10)]
+    robot_xys = np.random.RandomState(0).uniform(-3, 12, size=(8, 2))
+    batch = grid_ray_readings(wall_grid, goal_grid, o_xy, np.repeat(robot_xys, 10, axis=0), ray_oris * 8, 10., 2.)
+    for k, robot_xy in enumerate(robot_xys):
+        readings = grid_ray_readings(wall_grid, goal_grid, o_xy, robot_xy, ray_oris, 10., 2.)
+        assert np.array_equal(batch[0][10 * k:10 * (k + 1)], readings[0])
+        assert np.array_equal(batch[1][10 * k:10 * (k + 1)], readings[1])
+
+
+def test_segment_ray_readings():
+    import numpy as np
+    from rllab.envs.mujoco.maze.maze_env_utils import construct_maze, structure_segments, segment_ray_readings, \
+        point_distance
+    structure = construct_maze(maze_id=11)
+    starts, ends, is_goal = structure_segments(structure, 2., 2., 6.)
+    rng = np.random.RandomState(0)
+    for _ in range(200):
+        robot_xy = tuple(rng.uniform(-3, 12, size=2))
+        ray_oris = [rng.uniform(-math.pi, math.pi) + k * math.pi / 10 for k in range(20)]
+        wall_readings, goal_readings = segment_ray_readings(starts, ends, is_goal, robot_xy, ray_oris, 10.)
+        for ray_idx, ray_ori in enumerate(ray_oris):
+            hits = []
+            for start, end, goal in zip(starts, ends, is_goal):
+                p = ray_segment_intersect(ray=(robot_xy, ray_ori), segment=(tuple(start), tuple(end)))
+                if p is not None:
+                    hits.append((point_distance(p, robot_xy), goal))
+            expected_wall = expected_goal = 0.
+            if hits:
+                distance, goal = sorted(hits, key=lambda hit: hit[0])[0]
+                if distance <= 10.:
+                    if goal:
+                        expected_goal = (10. - distance) / 10.
+                    else:
+                        expected_wall = (10. - distance) / 10.
+            assert wall_readings[ray_idx] == expected_wall
+            assert goal_readings[ray_idx] == expected_goal
+
+
+def test_maze_model_cache():
+    import numpy as np
+    pytest.importorskip("theano")
+    try:
+        from rllab.envs.mujoco.maze.point_maze_env import PointMazeEnv
+    except OSError:  # the MuJoCo library is not installed
+        pytest.skip("MuJoCo is not installed")
+    from rllab.envs.mujoco import model_cache
+
+    env1 = PointMazeEnv(maze_id=0)
+    n_xml_files = len(model_cache._xml_files)
+    env2 = PointMazeEnv(maze_id=0)
+    # the xml is generated and compiled once, but every env gets its own model and data
+    assert len(model_cache._xml_files) == n_xml_files
+    model1, model2 = env1.wrapped_env.model, env2.wrapped_env.model
+    assert model1 is not model2
+    assert np.array_equal(model1.geom_pos, model2.geom_pos)
+    qpos = np.array(model2.data.qpos)
+    for _ in range(10):
+        env1.step(env1.action_space.sample())
+    assert np.array_equal(model2.data.qpos, qpos)
@@ -0,0 +1,40 @@
+import tempfile
+
+import numpy as np
+
+
+def _paths(latents=True):
+    rng = np.random.RandomState(0)
+    paths = []
+    for length in [30, 20]:
+        path = dict(env_infos=dict(com=rng.uniform(-3, 3, size=(length, 3))))
+        if latents:
+            path['agent_infos'] = dict(latents=np.eye(6)[rng.randint(6, size=length)])
+        paths.append(path)
+    return paths
+
+
+def test_background_visitations():
+    from rllab.misc import background_diagnostics, logger
+    from sandbox.snn4hrl.envs.mujoco import visitations
+
+    log_dir = tempfile.mkdtemp()
+    for latents in [True, False]:
+        summary = visitations.visitation_summary(_paths(latents))
+        expected = visitations.log_visitations(summary, log_dir=log_dir)
+
+        background_diagnostics.init_worker(plot_every=2)
+        try:
+            for itr in range(2):
+                background_diagnostics.set_iteration(itr)
+                assert background_diagnostics.should_plot() == (itr == 0)
+                with logger.tabular_prefix('wrapped_'):
+                    background_diagnostics.submit(visitations.log_visitations, summary, log_dir=log_dir,
+                                                  plot=background_diagnostics.should_plot())
+                logger.record_tabular('Iteration', itr)
+                background_diagnostics.collect()
+                assert logger._tabular[-2:] == [('wrapped_' + key, str(val)) for key, val in expected]
+                del logger._tabular[:]
+        finally:
+            background_diagnostics.shutdown_worker()
+    assert background_diagnostics.should_plot()
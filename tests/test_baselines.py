@@ -24,3 +24,57 @@ def test_baseline(baseline_cls):
         n_itr=1, batch_size=1000, max_path_length=100
     )
     algo.train()
+
+
+def test_linear_feature_baseline_predict_observations():
+    import numpy as np
+    baseline = LinearFeatureBaseline(env_spec=None)
+    observations = np.random.randn(8, 3)
+    assert np.array_equal(baseline.predict_observations(observations), np.zeros(8))
+    baseline.set_param_values(np.random.randn(2 * 3 + 4))
+    expected = [baseline.predict(dict(observations=[obs], rewards=[0]))[0] for obs in observations]
+    assert np.allclose(baseline.predict_observations(observations), expected)
+
+
+def test_streaming_linear_feature_baseline():
+    import numpy as np
+    from rllab.baselines.streaming_linear_feature_baseline import StreamingLinearFeatureBaseline
+    paths = [dict(observations=np.random.randn(n, 3), rewards=np.zeros(n), returns=np.random.randn(n))
+             for n in [5, 12, 30]]
+    linear = LinearFeatureBaseline(env_spec=None)
+    streaming = StreamingLinearFeatureBaseline(env_spec=None)
+    linear.fit(paths)
+    streaming.fit(paths)
+    assert np.allclose(linear.get_param_values(), streaming.get_param_values())
+    for path in paths:
+        assert np.allclose(linear.predict(path), streaming.predict(path))
+
+    # the sums of the previous fit are kept with the forgetting weight
+    forgetting = StreamingLinearFeatureBaseline(env_spec=None, forget_factor=0.5)
+    forgetting.fit(paths[:2])
+    forgetting.fit(paths[2:])
+    features = [forgetting._features(path) for path in paths]
+    xtx = sum(0.5 * f.T.dot(f) for f in features[:2]) + features[2].T.dot(features[2])
+    xty = sum(0.5 * f.T.dot(p["returns"]) for f, p in zip(features[:2], paths[:2])) + \
+        features[2].T.dot(paths[2]["returns"])
+    expected = np.linalg.solve(xtx + 1e-5 * np.identity(len(xtx)), xty)
+    assert np.allclose(forgetting.get_param_values(), expected)
+
+    # the features cached by fit are not left in the paths
+    assert all("baseline_features" in path for path in paths)
+    StreamingLinearFeatureBaseline.clear_features(paths)
+    assert not any("baseline_features" in path for path in paths)
+
+
+def test_linear_feature_baseline_predict_n():
+    import numpy as np
+    from rllab.baselines.streaming_linear_feature_baseline import StreamingLinearFeatureBaseline
+    paths = [dict(observations=np.random.randn(n, 3), rewards=np.zeros(n), returns=np.random.randn(n))
+             for n in [1, 7, 20]]
+    for baseline_cls in [LinearFeatureBaseline, StreamingLinearFeatureBaseline]:
+        baseline = baseline_cls(env_spec=None)
+        assert [len(v) for v in baseline.predict_n(paths)] == [1, 7, 20]
+        baseline.fit(paths[1:])
+        predictions = baseline.predict_n(paths)
+        for path, prediction in zip(paths, predictions):
+            assert np.allclose(prediction, baseline.predict(path))
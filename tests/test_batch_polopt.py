@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+
+def _import_batch_polopt():
+    pytest.importorskip("theano")
+    try:
+        from rllab.algos import batch_polopt
+    except OSError:  # the MuJoCo library of the envs is not installed
+        pytest.skip("MuJoCo is not installed")
+    return batch_polopt
+
+
+class _Params(object):
+    def __init__(self, values):
+        self.values = values
+
+    def get_param_values(self):
+        return np.copy(self.values)
+
+
+def test_obtain_prefetched_samples():
+    import threading
+    batch_polopt = _import_batch_polopt()
+
+    collected = []
+    release = threading.Event()
+
+    class Sampler(batch_polopt.BatchSampler):
+        def sample_paths(self, policy_params, max_samples, max_path_length=np.inf, scope=None, show_prog_bar=True):
+            collected.append(policy_params)
+            release.wait()
+            return [dict(rewards=np.zeros(max_samples), params=policy_params)]
+
+    class Algo(object):
+        policy = _Params(np.zeros(2))
+        batch_size = 4
+        max_path_length = 10
+        scope = None
+        whole_paths = True
+        policy_version = 0
+
+    algo = Algo()
+    sampler = Sampler(algo)
+    sampler.start_obtain_samples(1)
+    # the policy is updated while the paths are collected with its previous params
+    algo.policy.values = np.ones(2)
+    algo.policy_version = 1
+    release.set()
+    paths = sampler.obtain_samples(1)
+    assert len(collected) == 1
+    assert np.array_equal(paths[0]["params"], np.zeros(2))
+    assert paths[0]["policy_version"] == 0
+    assert sampler._pending is None
+
+    # without prefetched paths (or with the ones of another iteration) they are collected with the current params
+    sampler.start_obtain_samples(3)
+    paths = sampler.obtain_samples(2)
+    assert len(collected) == 3
+    assert np.array_equal(paths[0]["params"], np.ones(2))
+    assert paths[0]["policy_version"] == 1
+
+
+def test_correct_stale_samples():
+    batch_polopt = _import_batch_polopt()
+    from rllab.distributions.diagonal_gaussian import DiagonalGaussian
+
+    class Policy(object):
+        recurrent = False
+        distribution = DiagonalGaussian(2)
+
+        def __init__(self, scale):
+            self.scale = scale
+
+        def dist_info(self, observations, state_infos):
+            return dict(mean=observations * self.scale, log_std=np.zeros_like(observations))
+
+    rng = np.random.RandomState(0)
+    observations = rng.randn(5, 2)
+    old_policy, policy = Policy(1.), Policy(2.)
+    actions = old_policy.dist_info(observations, None)["mean"] + rng.randn(5, 2)
+    agent_infos = old_policy.dist_info(observations, None)
+    samples_data = dict(observations=observations, actions=actions, advantages=rng.randn(5),
+                        agent_infos=dict(agent_infos))
+    advantages = samples_data["advantages"]
+
+    class Algo(object):
+        policy_version = 3
+
+    algo = Algo()
+    weights = batch_polopt.BatchPolopt.correct_stale_samples(algo, samples_data, policy, 2)
+    cur_infos = policy.dist_info(observations, None)
+    expected = np.exp(policy.distribution.log_likelihood(actions, cur_infos) -
+                      policy.distribution.log_likelihood(actions, agent_infos))
+    assert np.allclose(weights, expected)
+    assert np.allclose(samples_data["advantages"], advantages * expected)
+    # the reference dist infos are the ones of the current params
+    for k in policy.distribution.dist_info_keys:
+        assert np.allclose(samples_data["agent_infos"][k], cur_infos[k])
+
+    # nothing to correct for the samples of the current params
+    samples_data = dict(observations=observations, actions=actions, advantages=advantages,
+                        agent_infos=dict(agent_infos))
+    assert np.array_equal(batch_polopt.BatchPolopt.correct_stale_samples(algo, samples_data, policy, 3),
+                          np.ones(5))
+    assert samples_data["advantages"] is advantages
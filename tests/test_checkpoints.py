@@ -0,0 +1,54 @@
+import os
+import tempfile
+
+import joblib
+import numpy as np
+
+
+class _Param(object):
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def get_value(self):
+        return self.value
+
+
+class _Policy(object):
+    latent_dim = 6
+    latent_name = 'categorical'
+    bilinear_integration = True
+    resample = False
+    min_std = 1e-6
+    hidden_sizes = (64, 64)
+
+    def get_params_internal(self):
+        return [_Param('meanMLP_hidden_0.W', np.arange(6.).reshape(2, 3)), _Param('output_log_std.param', np.ones(3))]
+
+
+def test_export_policy():
+    from rllab.misc import checkpoints
+
+    folder = tempfile.mkdtemp()
+    pkl_path = os.path.join(folder, 'params.pkl')
+    joblib.dump(dict(policy=_Policy()), pkl_path)
+
+    npz_path, json_path = checkpoints.export_policy(pkl_path)
+    assert npz_path == os.path.join(folder, 'params_policy.npz')
+    assert json_path == os.path.join(folder, 'params_policy.json')
+
+    pkl_args = checkpoints.load_policy_args(pkl_path=pkl_path)
+    json_args = checkpoints.load_policy_args(json_path=json_path)
+    assert pkl_args['latent_dim'] == json_args['latent_dim'] == 6
+    assert list(pkl_args['hidden_sizes']) == json_args['hidden_sizes'] == [64, 64]
+    pkl_params = checkpoints.load_policy_params(pkl_path=pkl_path)
+    npz_params = checkpoints.load_policy_params(npz_path=npz_path)
+    assert sorted(pkl_params.keys()) == sorted(npz_params.keys())
+    for name in pkl_params:
+        assert np.array_equal(pkl_params[name], npz_params[name])
+
+    # cached until the file changes
+    assert checkpoints.load_policy_params(npz_path=npz_path) is npz_params
+    np.savez(npz_path, **dict((k, v + 1) for k, v in npz_params.items()))
+    os.utime(npz_path, (0, os.path.getmtime(npz_path) + 1))
+    assert np.array_equal(checkpoints.load_policy_params(npz_path=npz_path)['output_log_std.param'], 2 * np.ones(3))
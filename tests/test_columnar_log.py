@@ -0,0 +1,56 @@
+import os.path as osp
+import tempfile
+
+import numpy as np
+
+
+def test_columnar_log():
+    from rllab.misc import columnar_log
+
+    file_name = osp.join(tempfile.mkdtemp(), 'progress.npcol')
+    writer = columnar_log.ColumnarWriter(file_name)
+    writer.write_row([('Iteration', 0), ('AverageReturn', '1.5')])
+    writer.write_row([('Iteration', 1), ('AverageReturn', 2.5)])
+    # new keys, a missing key and a value that is not a number
+    writer.write_row([('Iteration', 2), ('VisitationTotal', 7), ('Env', 'maze')])
+    writer.write_row([('Iteration', 3), ('AverageReturn', 4.), ('VisitationTotal', 9)])
+    writer.close()
+
+    columns = columnar_log.read_columns(file_name)
+    assert set(columns.keys()) == {'Iteration', 'AverageReturn', 'VisitationTotal', 'Env'}
+    np.testing.assert_array_equal(columns['Iteration'], [0, 1, 2, 3])
+    np.testing.assert_array_equal(columns['AverageReturn'], [1.5, 2.5, np.nan, 4.])
+    np.testing.assert_array_equal(columns['VisitationTotal'], [np.nan, np.nan, 7, 9])
+    assert np.all(np.isnan(columns['Env']))
+
+    # a row cut by a crash is ignored
+    with open(file_name, 'ab') as f:
+        f.write(columnar_log._header(columnar_log.ROW_TAG, 4) + b'\0' * 12)
+    np.testing.assert_array_equal(columnar_log.read_columns(file_name)['Iteration'], [0, 1, 2, 3])
+
+
+def test_logger_columnar_output():
+    from rllab.misc import logger
+    from rllab.viskit import core
+
+    exp_dir = tempfile.mkdtemp()
+    csv_file = osp.join(exp_dir, 'progress.csv')
+    with open(osp.join(exp_dir, 'params.json'), 'w') as f:
+        f.write('{"exp_name": "exp", "seed": 1}')
+    logger.add_tabular_output(csv_file)
+    try:
+        for itr in range(3):
+            logger.record_tabular('Iteration', itr)
+            logger.record_tabular('AverageReturn', itr * 10.)
+            logger.dump_tabular(with_prefix=False, with_timestamp=False)
+    finally:
+        logger.remove_tabular_output(csv_file)
+
+    exp, = core.load_exps_data([exp_dir], disable_variant=True)
+    csv_progress = core.load_progress(csv_file)
+    assert set(exp.progress.keys()) == set(csv_progress.keys())
+    for key, values in csv_progress.items():
+        np.testing.assert_array_equal(exp.progress[key], values)
+    assert exp.params['seed'] == 1
+    # not read again until it changes
+    assert core.load_exps_data([exp_dir], disable_variant=True)[0] is exp
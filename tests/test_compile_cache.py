@@ -0,0 +1,36 @@
+import tempfile
+
+import numpy as np
+
+
+def test_compile_cache():
+    import theano
+    import theano.tensor as TT
+    from rllab import config
+    from rllab.misc import compile_cache
+    from rllab.misc.ext import compile_function
+
+    def build(value):
+        x = TT.vector('x')
+        w = theano.shared(np.asarray(value, dtype=theano.config.floatX), name='w')
+        return w, compile_function([x], TT.dot(x, w), log_name='f_test_dot')
+
+    cache_dir = config.THEANO_FUNCTION_CACHE_DIR
+    config.THEANO_FUNCTION_CACHE_DIR = tempfile.mkdtemp()
+    try:
+        w1, f1 = build([1., 2.])
+        w2, f2 = build([3., 4.])  # found in memory
+        compile_cache._functions.clear()
+        w3, f3 = build([5., 6.])  # loaded from disk, as in another process
+        w4, f4 = build([1., 2., 3.])  # another shape: compiled
+    finally:
+        config.THEANO_FUNCTION_CACHE_DIR = cache_dir
+    stats = compile_cache.compile_stats()['f_test_dot']
+    assert (stats['compiled'], stats['memory'], stats['disk']) == (2, 1, 1)
+
+    ones = np.ones(2, dtype=theano.config.floatX)
+    assert np.allclose([f1(ones), f2(ones), f3(ones)], [3., 7., 11.])
+    assert np.allclose(f4(np.ones(3, dtype=theano.config.floatX)), 6.)
+    # every function computes with its own shared variables
+    w2.set_value(np.zeros(2, dtype=theano.config.floatX))
+    assert np.allclose([f1(ones), f2(ones), f3(ones)], [3., 0., 11.])
@@ -0,0 +1,45 @@
+import json
+import os
+import os.path as osp
+import tempfile
+
+
+def _write_run(log_dir, seed, n_rows):
+    os.makedirs(osp.join(log_dir, "snapshots"))
+    with open(osp.join(log_dir, "params.json"), "w") as f:
+        json.dump(dict(exp_name=osp.basename(log_dir), seed=seed), f)
+    with open(osp.join(log_dir, "progress.csv"), "w") as f:
+        f.write("Iteration\n" + "".join("%d\n" % i for i in range(n_rows)))
+
+
+def test_incremental_load_exps_data():
+    from rllab.misc import experiment_index
+    from rllab.viskit import core
+
+    root = tempfile.mkdtemp()
+    for seed in range(3):
+        log_dir = osp.join(root, "exp_%d" % seed)
+        _write_run(log_dir, seed, n_rows=seed + 1)
+        experiment_index.record_run(log_dir, experiment_index.RUNNING)
+    experiment_index.record_run(osp.join(root, "exp_0"), experiment_index.FINISHED)
+    # a run without manifest entry, started before there was one
+    _write_run(osp.join(root, "old", "exp_3"), 3, n_rows=4)
+
+    index = experiment_index.read_index(root)
+    assert index["exp_0"]["status"] == experiment_index.FINISHED
+    assert index["exp_1"]["status"] == experiment_index.RUNNING
+    assert sorted(exp for exp, _ in core.find_exps(root)) == \
+        sorted([osp.join(root, "exp_%d" % seed) for seed in range(3)] + [osp.join(root, "old", "exp_3")])
+
+    exps_data = core.load_exps_data([root], disable_variant=True, n_workers=2)
+    assert sorted(exp.params["seed"] for exp in exps_data) == [0, 1, 2, 3]
+    assert all(len(exp.progress["Iteration"]) == exp.params["seed"] + 1 for exp in exps_data)
+
+    # the finished run is not read again, the running one is when it changes
+    os.remove(osp.join(root, "exp_0", "progress.csv"))
+    with open(osp.join(root, "exp_1", "progress.csv"), "a") as f:
+        f.write("2\n")
+    reloaded = dict((exp.params["seed"], exp) for exp in core.load_exps_data([root], disable_variant=True))
+    previous = dict((exp.params["seed"], exp) for exp in exps_data)
+    assert reloaded[0] is previous[0] and reloaded[2] is previous[2] and reloaded[3] is previous[3]
+    assert len(reloaded[1].progress["Iteration"]) == 3
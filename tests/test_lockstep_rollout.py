@@ -0,0 +1,159 @@
+import numpy as np
+
+from rllab import spaces
+
+
+class _PointEnv(object):
+    """
+    Point moving in 2D, done once it gets further than 1 from the origin
+    """
+
+    def __init__(self, seed=None):
+        self.observation_space = spaces.Box(-10, 10, shape=(2,))
+        self.action_space = spaces.Box(-1, 1, shape=(2,))
+        self._pos = np.random.RandomState(seed).uniform(-0.5, 0.5, size=2) if seed is not None else np.zeros(2)
+
+    def reset(self):
+        self._pos = np.random.uniform(-0.5, 0.5, size=2)
+        return self.get_current_obs()
+
+    def get_current_obs(self):
+        return np.copy(self._pos)
+
+    def step(self, action):
+        self._pos = self._pos + 0.1 * np.asarray(action)
+        return self.get_current_obs(), -np.linalg.norm(self._pos), np.linalg.norm(self._pos) > 1, \
+            dict(com=np.copy(self._pos))
+
+
+class _LowPolicy(object):
+    """
+    Deterministic low-level policy: moves in the direction of its latent
+    """
+    directions = np.array([[1., 0.], [0., 1.], [-1., -1.]])
+
+    def __init__(self):
+        self.pre_fix_latent = np.array([])
+
+    def reset(self):
+        pass
+
+    def get_action(self, observation):
+        actions, agent_infos = self.get_actions([observation], latents=self.pre_fix_latent)
+        return actions[0], dict((k, v[0]) for k, v in agent_infos.items())
+
+    def get_actions(self, observations, latents):
+        latents = np.asarray(latents)
+        if latents.ndim == 1:
+            latents = np.tile(latents, [len(observations), 1])
+        actions = latents.dot(self.directions) - 0.5 * np.asarray(observations)
+        return actions, dict(mean=actions, latents=latents)
+
+
+class _HighPolicy(object):
+    """
+    Deterministic high-level policy: the latent of the quadrant of the observation
+    """
+
+    def __init__(self):
+        self.params = np.zeros(1)
+
+    def reset(self):
+        pass
+
+    def set_param_values(self, params):
+        self.params = params
+
+    def terminate(self):
+        pass
+
+    def get_actions(self, observations):
+        observations = np.asarray(observations)
+        actions = (observations[:, 0] > 0).astype(int) + (observations[:, 1] > 0).astype(int)
+        return actions, dict(prob=np.eye(3)[actions])
+
+
+class _HierEnv(object):
+    """
+    The attributes of HierarchizedSnnEnv used by HierarchizedSnnVecEnvExecutor
+    """
+
+    def __init__(self, time_steps_agg=5):
+        self.wrapped_env = _PointEnv()
+        self.low_policy = _LowPolicy()
+        self.time_steps_agg = time_steps_agg
+        self.action_space = spaces.Discrete(3)
+        self.observation_space = self.wrapped_env.observation_space
+
+    @staticmethod
+    def get_fast_maze_env(env):
+        return None
+
+    def terminate(self):
+        pass
+
+    def lockstep_executor(self, n_envs):
+        from sandbox.snn4hrl.envs.hierarchized_snn_vec_env import HierarchizedSnnVecEnvExecutor
+        return HierarchizedSnnVecEnvExecutor(self, n_envs=n_envs, max_path_length=None)
+
+
+def test_rollout_lockstep():
+    from sandbox.snn4hrl.sampler.utils import rollout, rollout_lockstep
+    seeds = [0, 1, 2, 3, 4]
+    latents = np.eye(3)[[0, 1, 2, 0, 2]]
+    policy = _LowPolicy()
+    batch = rollout_lockstep([_PointEnv(seed) for seed in seeds], policy, latents, max_path_length=20)
+    for idx, (seed, latent) in enumerate(zip(seeds, latents)):
+        policy.pre_fix_latent = latent
+        path = rollout(_PointEnv(seed), policy, max_path_length=20, reset_start_rollout=False)
+        n = len(path["rewards"])
+        assert batch["path_lengths"][idx] == n
+        for key in ["observations", "actions", "rewards", "terminated"]:
+            assert np.allclose(batch[key][idx, :n], path[key])
+            assert not np.any(batch[key][idx, n:])
+        for key in ["mean", "latents"]:
+            assert np.allclose(batch["agent_infos"][key][idx, :n], path["agent_infos"][key])
+        assert np.allclose(batch["env_infos"]["com"][idx, :n], path["env_infos"]["com"])
+    # some paths end before the others
+    assert len(set(batch["path_lengths"])) > 1
+
+
+def test_rollout_lockstep_envs():
+    from rllab.sampler.utils import rollout_lockstep_envs
+    env = _HierEnv()
+    np.random.seed(0)
+    paths = rollout_lockstep_envs(env.lockstep_executor(4), _HighPolicy(), max_path_length=10)
+
+    # the same paths with the envs stepped one at a time
+    np.random.seed(0)
+    executor = env.lockstep_executor(4)
+    all_obs = executor.reset()
+    policy = _HighPolicy()
+    for idx, path in enumerate(paths):
+        obs, rewards = all_obs[idx], []
+        for t in range(10):
+            actions, _ = policy.get_actions([obs])
+            next_obs, step_rewards, dones, env_infos = executor.step_envs([idx], actions)
+            assert np.allclose(path["observations"][t], obs)
+            assert np.array_equal(path["actions"][t], env.action_space.flatten(actions[0]))
+            assert np.allclose(path["env_infos"]["full_path"]["observations"][t],
+                               env_infos[0]["full_path"]["observations"])
+            rewards.append(step_rewards[0])
+            if dones[0]:
+                break
+            obs = next_obs[0]
+        assert np.allclose(path["rewards"], rewards)
+
+
+def test_sample_lockstep_paths():
+    from rllab.sampler import parallel_sampler
+    parallel_sampler.initialize(n_parallel=1)
+    parallel_sampler.populate_task(_HierEnv(), _HighPolicy(), scope="lockstep")
+    try:
+        paths = parallel_sampler.sample_paths(np.ones(1), max_samples=30, max_path_length=10, scope="lockstep",
+                                              n_lockstep_envs=3, show_prog_bar=False)
+        assert len(paths) % 3 == 0
+        assert sum(len(path["rewards"]) for path in paths) >= 30
+        assert all(len(path["rewards"]) <= 10 for path in paths)
+    finally:
+        parallel_sampler.terminate_task(scope="lockstep")
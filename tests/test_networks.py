@@ -13,3 +13,38 @@ def test_gru_network():
         outputs=L.get_output(network.output_layer)
     )
     assert f_output(np.zeros((6, 8, 2, 3))).shape == (6, 8, 5)
+
+
+def test_numpy_forward():
+    from rllab.core.lasagne_layers import ParamLayer
+    from rllab.core.network import MLP
+    from rllab.misc import ext
+    from sandbox.snn4hrl.core.lasagne_layers import BilinearIntegrationLayer, CropLayer
+    from sandbox.snn4hrl.core.numpy_forward import NumpyForward
+    import lasagne.layers as L
+    import lasagne.nonlinearities as NL
+    import numpy as np
+    # same structure as GaussianMLPPolicy_snn_hier: a softmax selector integrated with the robot part of the obs
+    selector = MLP(input_shape=(7,), output_dim=3, hidden_sizes=(8,), hidden_nonlinearity=NL.tanh,
+                   output_nonlinearity=NL.softmax)
+    l_obs_robot = CropLayer(selector.input_layer, end_index=5)
+    l_obs_snn = BilinearIntegrationLayer([l_obs_robot, selector.output_layer])
+    mean_network = MLP(input_layer=l_obs_snn, output_dim=2, hidden_sizes=(8, 8), hidden_nonlinearity=NL.tanh,
+                       output_nonlinearity=None)
+    l_log_std = ParamLayer(l_obs_snn, num_units=2)
+    output_layers = [selector.output_layer, mean_network.output_layer, l_log_std]
+    f_output = ext.compile_function(
+        inputs=[selector.input_layer.input_var],
+        outputs=L.get_output(output_layers),
+    )
+    forward = NumpyForward(output_layers)
+    obs = np.random.randn(4, 7)
+    for n in [1, 4, 1]:
+        for numpy_output, theano_output in zip(forward(obs[:n]), f_output(obs[:n])):
+            assert np.allclose(numpy_output, theano_output, atol=1e-6)
+
+    # the params are only read again on refresh
+    mean_network.output_layer.b.set_value(np.ones(2, dtype=mean_network.output_layer.b.dtype))
+    assert not np.allclose(forward(obs)[1], f_output(obs)[1])
+    forward.refresh()
+    assert np.allclose(forward(obs)[1], f_output(obs)[1], atol=1e-6)
@@ -0,0 +1,38 @@
+import numpy as np
+
+
+def test_conjugate_gradient_hvp_subsample_factor():
+    from rllab.optimizers.conjugate_gradient_optimizer import ConjugateGradientOptimizer
+    assert ConjugateGradientOptimizer()._hvp_subsample_factor(1000) == 1.
+    assert ConjugateGradientOptimizer(subsample_factor=0.5)._hvp_subsample_factor(1000) == 0.5
+    optimizer = ConjugateGradientOptimizer(subsample_factor=0.5, hvp_samples=100, cg_time_budget=1., cg_iters=9)
+    assert optimizer._hvp_subsample_factor(1000) == 0.1
+    assert optimizer._hvp_subsample_factor(50) == 0.5
+    # 10 products of 1ms per sample in one second
+    optimizer._hvp_time_per_sample = 1e-3
+    assert optimizer._hvp_subsample_factor(1000) == 0.1
+    optimizer._hvp_time_per_sample = 1e-2
+    assert optimizer._hvp_subsample_factor(1000) == 0.01
+
+
+def test_peak_memory():
+    from rllab.optimizers.conjugate_gradient_optimizer import _peak_memory
+    peak = _peak_memory(lambda n: np.ones(n).sum(), 10 ** 6)
+    assert 8 * 10 ** 6 <= peak < 2 * 8 * 10 ** 6
+
+
+def test_sample_footprint_measured_once():
+    from rllab.optimizers.conjugate_gradient_optimizer import ConjugateGradientOptimizer
+    for footprint in [None, 1e3]:
+        optimizer = ConjugateGradientOptimizer(adaptive_slices=True)
+        n_measures = [0]
+
+        def measure(inputs, extra_inputs):
+            n_measures[0] += 1
+            return footprint
+
+        optimizer._measure_sample_footprint = measure
+        for _ in range(3):
+            optimizer._choose_num_slices([np.zeros((100, 2))], [])
+        assert n_measures[0] == 1
+        assert optimizer._num_slices == 1
@@ -30,3 +30,114 @@ def test_truncate_paths():
     # make sure not to change the original one
     assert len(paths) == 2
     assert len(paths[-1]["observations"]) == 50
+
+
+def test_path_buffer():
+    from rllab.envs.env_spec import EnvSpec
+    from rllab.sampler.path_buffer import PathBuffer
+    from rllab.spaces.box import Box
+
+    spec = EnvSpec(observation_space=Box(-1, 1, (2,)), action_space=Box(-1, 1, (1,)))
+    buffer = PathBuffer(spec, capacity=3)
+    for t in range(2):
+        buffer.append(np.ones(2) * t, np.ones(1) * t, t, dict(mean=np.ones(1) * t), dict(pos=(t, t)))
+    first = buffer.get_path()
+    # the next path does not fit in the block: it is moved to a new one, the first path must not change
+    for t in range(4):
+        buffer.append(np.ones(2) * -t, np.ones(1) * -t, -t, dict(mean=np.ones(1) * -t), dict(pos=(-t, -t)))
+    second = buffer.get_path()
+
+    assert first["observations"].shape == (2, 2)
+    assert np.array_equal(first["rewards"], [0, 1])
+    assert np.array_equal(first["env_infos"]["pos"], [[0, 0], [1, 1]])
+    assert second["agent_infos"]["mean"].shape == (4, 1)
+    assert np.array_equal(second["rewards"], [0, -1, -2, -3])
+    assert np.array_equal(second["observations"][:, 0], [0, -1, -2, -3])
+
+
+def test_shared_paths():
+    import os
+    import pickle
+    from rllab.sampler import shared_paths
+
+    full_path = np.empty(2, dtype=object)
+    full_path[0], full_path[1] = np.zeros(3), np.ones(2)
+    path = dict(
+        observations=np.arange(12.).reshape((4, 3)),
+        rewards=np.arange(4, dtype='float32'),
+        agent_infos=dict(latents=np.eye(4, dtype='int64')),
+        env_infos=dict(full_path=dict(actions=np.ones((4, 5, 2))), ragged=full_path, empty=np.zeros((4, 0))),
+    )
+    exported = pickle.loads(pickle.dumps(shared_paths.export_path(path)))
+    assert isinstance(exported, shared_paths.SharedPath)
+    loaded = shared_paths.load_path(exported)
+    assert not os.path.exists(exported.filename)
+    for k in ["observations", "rewards"]:
+        assert loaded[k].dtype == path[k].dtype
+        assert np.array_equal(loaded[k], path[k])
+    assert np.array_equal(loaded["agent_infos"]["latents"], path["agent_infos"]["latents"])
+    assert np.array_equal(loaded["env_infos"]["full_path"]["actions"], path["env_infos"]["full_path"]["actions"])
+    assert loaded["env_infos"]["ragged"][1].shape == (2,)
+    assert loaded["env_infos"]["empty"].shape == (4, 0)
+
+
+def test_gae_n():
+    from rllab.misc import special
+    lengths = [1, 17, 5, 30]
+    rewards = [np.random.randn(n) for n in lengths]
+    baselines = [np.random.randn(n) for n in lengths]
+    advantages, returns = special.gae_n(np.concatenate(rewards), np.concatenate(baselines), lengths, 0.99, 0.95)
+    offset = 0
+    for path_rewards, path_baselines in zip(rewards, baselines):
+        n = len(path_rewards)
+        next_baselines = np.append(path_baselines, 0)[1:]
+        deltas = path_rewards + 0.99 * next_baselines - path_baselines
+        assert np.allclose(advantages[offset:offset + n], special.discount_cumsum(deltas, 0.99 * 0.95))
+        assert np.allclose(returns[offset:offset + n], special.discount_cumsum(path_rewards, 0.99))
+        offset += n
+
+    # the paths of length 0 are dropped
+    advantages_with_empty, returns_with_empty = special.gae_n(
+        np.concatenate(rewards), np.concatenate(baselines), [0, 1, 17, 0, 5, 30, 0], 0.99, 0.95)
+    assert np.array_equal(advantages_with_empty, advantages)
+    assert np.array_equal(returns_with_empty, returns)
+    advantages, returns = special.gae_n(np.zeros(0), np.zeros(0), [], 0.99, 0.95)
+    assert advantages.shape == returns.shape == (0,)
+    assert special.discount_cumsum_n(np.zeros(0), 0.99, [0, 0]).shape == (0,)
+
+
+def test_async_sample_paths():
+    import threading
+    from rllab.sampler import parallel_sampler
+
+    started, release = threading.Event(), threading.Event()
+    sample_paths = parallel_sampler.sample_paths
+
+    def fake_sample_paths(policy_params, max_samples, show_prog_bar=True):
+        assert not show_prog_bar
+        started.set()
+        release.wait()
+        if max_samples < 0:
+            raise ValueError(max_samples)
+        return [dict(rewards=np.zeros(max_samples), params=policy_params)]
+
+    parallel_sampler.sample_paths = fake_sample_paths
+    try:
+        params = np.ones(3)
+        async_paths = parallel_sampler.AsyncSamplePaths(policy_params=params, max_samples=5)
+        started.wait()
+        assert parallel_sampler.is_collecting()
+        release.set()
+        paths = async_paths.result()
+        assert not parallel_sampler.is_collecting()
+        assert len(paths[0]["rewards"]) == 5 and paths[0]["params"] is params
+
+        async_paths = parallel_sampler.AsyncSamplePaths(policy_params=params, max_samples=-1)
+        try:
+            async_paths.result()
+            assert False
+        except ValueError:
+            pass
+        assert not parallel_sampler.is_collecting()
+    finally:
+        parallel_sampler.sample_paths = sample_paths
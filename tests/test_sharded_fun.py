@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class _SharedVariable(object):
+    def __init__(self, value):
+        self.value = value
+
+    def get_value(self, borrow=False):
+        return self.value
+
+    def set_value(self, value):
+        self.value = value
+
+
+class _In(object):
+    def __init__(self, variable, shared):
+        self.variable = variable
+        self.shared = shared
+
+
+class _Maker(object):
+    def __init__(self, inputs):
+        self.inputs = inputs
+
+
+class _Function(object):
+    """
+    Stands for a compiled function of a sliced input, a non-sliced input and a shared variable: mean(x) * w + y
+    """
+
+    def __init__(self):
+        self.w = _SharedVariable(np.ones(2))
+        self.maker = _Maker([_In(None, False), _In(None, False), _In(self.w, True)])
+
+    def __call__(self, x, y):
+        return np.mean(x, axis=0) * self.w.get_value() + y, np.mean(x)
+
+
+def test_sharded_function():
+    from rllab.misc.ext import sliced_fun
+    from rllab.optimizers import sharded_fun
+    from rllab.sampler import stateful_pool
+    stateful_pool.singleton_pool.initialize(n_parallel=3)
+    f = _Function()
+    x = np.random.randn(20, 2)
+    y = np.random.randn(2)
+    sharded = sharded_fun.ShardedFunction("f", f)
+    key = sharded_fun.unique_key("x")
+    sharded_fun.scatter(key, [x])
+    for w in [np.ones(2), np.array([2., -1.])]:
+        f.w.set_value(w)  # sent to the workers with every call
+        expected = sliced_fun(f, 4)([x], [y])
+        ret = sharded.sliced(key, 4)([y])
+        assert isinstance(ret, tuple)
+        assert np.allclose(ret[0], expected[0]) and np.allclose(ret[1], expected[1])
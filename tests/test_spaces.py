@@ -25,3 +25,12 @@ def test_box():
     np.testing.assert_array_equal(space.flatten_n([[[1, 2], [3, 4]]]), [[1, 2, 3, 4]])
     np.testing.assert_array_equal(space.unflatten([1, 2, 3, 4]), [[1, 2], [3, 4]])
     np.testing.assert_array_equal(space.unflatten_n([[1, 2, 3, 4]]), [[[1, 2], [3, 4]]])
+
+
+def test_discrete_weighted_sample_n():
+    space = Discrete(4)
+    weights = np.random.dirichlet(np.ones(4), size=100)
+    np.random.seed(0)
+    samples = [space.weighted_sample(w) for w in weights]
+    np.random.seed(0)
+    np.testing.assert_array_equal(space.weighted_sample_n(weights), samples)
@@ -18,3 +18,39 @@ def test_stateful_pool_over_capacity():
     stateful_pool.singleton_pool.initialize(n_parallel=4)
     results = stateful_pool.singleton_pool.run_collect(_worker_collect_once, 3, show_prog_bar=False)
     assert len(results) >= 3
+
+
+def _worker_pull_channel(G, channel):
+    return channel.pull()
+
+
+def test_shared_param_channel():
+    import numpy as np
+    from rllab.sampler import stateful_pool
+    channel = stateful_pool.SharedParamChannel([("policy", 3), ("env", 1)])
+    assert channel.pull() == (None, None)
+    channel.publish(dict(policy=np.arange(3), env=np.array([7])))
+    stateful_pool.singleton_pool.initialize(n_parallel=2)
+    results = stateful_pool.singleton_pool.run_each(_worker_pull_channel, [(channel,)] * 2)
+    for version, params in results:
+        assert version == channel.version
+        assert np.array_equal(params["policy"], [0, 1, 2])
+        assert np.array_equal(params["env"], [7])
+    assert channel.pull(channel.version)[1] is None
+    channel.close()
+
+
+def _worker_collect_fail(_):
+    raise ValueError("collect failed")
+
+
+def test_stateful_pool_collect_error():
+    from rllab.sampler import stateful_pool
+    stateful_pool.singleton_pool.initialize(n_parallel=2)
+    try:
+        stateful_pool.singleton_pool.run_collect(_worker_collect_fail, 3, show_prog_bar=False)
+        assert False, "the error of the workers should be raised"
+    except Exception as e:
+        assert "collect failed" in str(e)
+    results = stateful_pool.singleton_pool.run_collect(_worker_collect_once, 3, show_prog_bar=False)
+    assert len(results) >= 3
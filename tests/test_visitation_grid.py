@@ -0,0 +1,39 @@
+import numpy as np
+
+
+def test_visitation_grid():
+    from sandbox.snn4hrl.core.visitation_grid import VisitationGrid
+
+    rng = np.random.RandomState(0)
+    coms = rng.uniform(-2, 2, size=(200, 2))
+    lats = rng.randint(3, size=200)
+    expected = np.zeros((3, 41, 41), dtype=int)
+    for lat, xy in zip(lats, np.ceil((coms + 2) * 10).astype(int)):
+        expected[lat, xy[0], xy[1]] += 1
+
+    for sparse in [False, True]:
+        grid = VisitationGrid(2, 10, num_latents=3, sparse=sparse)
+        grid.add(coms[:120], lats[:120])
+        grid.add(coms[120:], lats[120:])
+        assert grid.sparse == sparse
+        assert all(np.array_equal(grid.counts(i), expected[i]) for i in range(3))
+        assert np.array_equal(grid.counts(), expected.sum(axis=0))
+        assert grid.num_visited() == np.count_nonzero(expected.sum(axis=0))
+        cells = grid.cells(coms)
+        assert np.array_equal(grid.count(coms, lats), expected[lats, cells[:, 0], cells[:, 1]])
+        assert np.array_equal(grid.count(coms), expected.sum(axis=0)[cells[:, 0], cells[:, 1]])
+        assert np.array_equal(grid.count(np.array([[5., 0.]])), [0])  # out of the grid
+
+        # accumulated on a larger grid: the previous counts are moved to the same positions
+        far = np.array([[3.5, -3.5]])
+        try:
+            grid.add(far)
+            assert False
+        except ValueError:
+            pass
+        grid.extend(4)
+        grid.add(far, [1])
+        assert grid.size == 81
+        assert np.array_equal(grid.count(coms, lats), expected[lats, cells[:, 0], cells[:, 1]])
+        assert np.array_equal(grid.count(far, [1]), [1])
+        assert grid.counts().sum() == 201